@@ -1,5 +1,15 @@
 from opentrons import protocol_api
 
+from protocol_lib.checkpoint import Checkpoint
+from protocol_lib.deck import resolve_layout
+from protocol_lib.liquid import LiquidLevels
+from protocol_lib.manifest import read_manifest
+from protocol_lib.reagents import ReagentPlan
+from protocol_lib.schedule import Task
+from protocol_lib.tipracks import TipInventory
+from protocol_lib.tubes import (add_to_tubes, addition_seconds, normalization_seconds, normalization_tips,
+                                normalize_protein, reduce_and_alkylate, staggered_schedule)
+
 metadata = {
     'protocolName': 'Digestion Protocol 2mL Tubes',
     'author': 'Cody',
@@ -18,150 +28,182 @@ def run(protocol: protocol_api.ProtocolContext):
     volume_of_trypsin: float = 10.0  # manually prepare to a concentration of 0.2ug/uL
     incubation_time_DTT = 30  # in minutes
     incubation_time_IAA = 30  # in minutes
-    starting_tip_p50 = 'A1'  # change if full tip rack will not be used
-    starting_tip_p300 = 'A1'  # change if full tip rack will not be used
+    temp_equilibration_min = 2  # minutes the tubes are held once the temp block reads its target, before an incubation or the next step
+    stagger_batch_size = 0  # 1 to 12 runs the digests in batches of that many tubes on the two halves of the aluminum block in turn: each batch is normalized and gets its DTT while the one before it incubates with IAA, so more than 24 digests fit in one run; 0 runs them all together
+    starting_tip_p50 = 'A1'  # change if full tip rack will not be used; not needed with tip_inventory_file
+    starting_tip_p300 = 'A1'  # change if full tip rack will not be used; not needed with tip_inventory_file
+    sample_manifest = ''  # optional CSV/TSV of the samples, pasted here or the path of the file on the robot; one row per sample with columns sample, concentration, replicates and optionally position (its tube in the 2ml tube rack). Replaces number_of_samples, sample_concentrations and replicates above
+    checkpoint_file = ''  # optional path on the robot the run saves its progress to after every stage and tube, e.g. '/data/NoSP3_checkpoint.json'
+    resume = False  # True starts an aborted run again after its last completed step, from checkpoint_file; leave the other settings as they were
+    tip_inventory_file = ''  # optional path on the robot where the tips left in the p50 and p300 racks are kept between runs, e.g. '/data/tips.json'; the next run starts with the partial racks this one leaves. Delete it when placing full racks
+    reagent_volumes = {}  # optional mL loaded into the bulk reagent tubes of the 15mL_50mL tube rack, e.g. {'ABC': 20}; the pipettes then draw them from just below the falling liquid level instead of the tube bottom, and the run pauses for a top-up before a tube runs low
+    preload_reagents = False  # True asks for the ABC and DTT, with the volume to load, in one pause before the run starts instead of a pause before each stage; the IAA, made just before use and kept from the light, and the trypsin are still asked for when they are added
+    deck_layout = {}  # optional slots of labware and 15mL_50mL rack positions of tubes, overriding the layout below (e.g. {'temp_mod': 7, 'ABC': 'B3'}); python -m protocol_tools.deck proposes one that shortens head travel
 
     # | ---------------------------- ^^^^^^^^^^^^^^^^^^^ ---------------------------- |
     # ---------------------------- DO NOT EDIT BELOW THIS LINE ---------------------------- #
-    # Check for valid inputs
-    if len(sample_concentrations) != number_of_samples:
-        raise ValueError('Length of sample_concentrations must match the integer specified for number_of_samples.')
-    if number_of_samples * replicates > 24:
-        raise ValueError('Total digests (including replicates) cannot exceed the number of slots available on the aluminum block (24).')
-   
+    # | --------- samples --------- |
+    # One row per sample from sample_manifest, or the settings above when there is none. Every problem with the
+    # inputs is collected in input_errors and reported together before anything moves.
+    input_errors = []
+    rack_positions = [row + str(col) for col in range(1, 6) for row in 'ABCD']  # 2ml tube rack; column 6 holds the reagents
+
+    if sample_manifest:
+        # 100 ug of protein has to fit in the 100 uL digest
+        manifest, input_errors = read_manifest(sample_manifest, {'concentration': (float, 1.0, 20.0), 'replicates': (int, 1, 24)},
+                                               rack_positions)
+        sample_names = manifest['sample']
+        sample_concentrations = manifest['concentration']
+        sample_replicates = manifest['replicates']
+        sample_positions = manifest['position']
+        number_of_samples = len(sample_names)
+    else:
+        sample_names = ['sample {}'.format(i + 1) for i in range(number_of_samples)]
+        sample_replicates = [replicates] * number_of_samples
+        sample_positions = rack_positions[:number_of_samples]
+        if len(sample_concentrations) != number_of_samples:
+            input_errors.append('Length of sample_concentrations must match the integer specified for number_of_samples.')
+    if number_of_samples > len(rack_positions):
+        input_errors.append('The 2ml tube rack holds at most {} samples next to the reagents.'.format(len(rack_positions)))
+    total_digests = sum(reps for reps in sample_replicates if reps)
+    if stagger_batch_size and not 1 <= stagger_batch_size <= 12:
+        input_errors.append('stagger_batch_size takes 1 to 12 tubes, half of the aluminum block.')
+    elif total_digests > 24 and not stagger_batch_size:
+        input_errors.append('Total digests (including replicates) cannot exceed the number of slots available on the aluminum block (24); '
+                            'set stagger_batch_size to run them in batches.')
+    unknown_reagents = [name for name in reagent_volumes if name != 'ABC']
+    if unknown_reagents:
+        input_errors.append('reagent_volumes names {}; it takes ABC.'.format(', '.join(unknown_reagents)))
+
+    # | --------- deck layout --------- |
+    # Slot of every labware and 15mL_50mL rack position of every bulk tube; deck_layout overrides any of them
+    layout, layout_errors = resolve_layout({'tiprack_50': 1, 'tiprack_300': 2, 'tuberack_2mL': 4, 'tuberack_15ml_50ml': 5,
+                                            'temp_mod': 10, 'ABC': 'A3'}, deck_layout, modules=('temp_mod',))
+    input_errors.extend(layout_errors)
+    if input_errors:
+        raise ValueError('\n'.join(input_errors))
+
 
     # | ---------  tip racks --------- |
-    tiprack_300 = protocol.load_labware('opentrons_96_tiprack_300ul', 2)
-    tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', 1)
+    tiprack_300 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_300'])
+    tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_50'])
 
     # | ---------  pipettes --------- |
     p300 = protocol.load_instrument('p300_single', 'right', tip_racks=[tiprack_300])
     p50 = protocol.load_instrument('p50_single', 'left', tip_racks=[tiprack_50]) ##change p50 to p20 if p20 will be used here and throughout the script following OT-2 API; this script has not been tested with p20 therefore testing is required.”
     p50.starting_tip = tiprack_50.well(starting_tip_p50)
     p300.starting_tip = tiprack_300.well(starting_tip_p300)
+    # Tip racks are refilled between stages, in the pause a stage starts with, before a stage would run out
+    tips = TipInventory(protocol, [p50, p300], tip_inventory_file)
 
     # | ---------  tube racks/plates/containers --------- |
-    temp_mod = protocol.load_module('Temperature Module', 10)
+    temp_mod = protocol.load_module('Temperature Module', layout['temp_mod'])
     temp_plate = temp_mod.load_labware('opentrons_24_aluminumblock_nest_2ml_snapcap')
-    tuberack_2mL = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', 4)
-    tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', 5)
+    tuberack_2mL = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', layout['tuberack_2mL'])
+    tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', layout['tuberack_15ml_50ml'])
 
     # | --------- reagents --------- |
     DTT = tuberack_2mL['A6']
     IAA = tuberack_2mL['B6']
     trypsin = tuberack_2mL['C6']
-    ABC = tuberack_15ml_50ml['A3']
-    samples = tuberack_2mL.wells()[:number_of_samples]
+    ABC = tuberack_15ml_50ml[layout['ABC']]
+    samples = [tuberack_2mL[position] for position in sample_positions]
+
+    # | --------- batches --------- |
+    # The replicate tubes of every sample on the temp block, next to each other in sample order. With
+    # stagger_batch_size they are split into batches on columns 1-3 and 4-6 of the block in turn, so that a batch can
+    # be normalized and get its DTT next to the one before it; otherwise all of them are one batch.
+    sample_of = [i for i in range(number_of_samples) for _ in range(sample_replicates[i])]  # sample of every digest
+    batch_size = stagger_batch_size or max(total_digests, 1)
+    batches = []  # (sample, its tubes) of every batch
+    for first in range(0, total_digests, batch_size):
+        wells = temp_plate.wells()[(first // batch_size) % 2 * 12:] if stagger_batch_size else temp_plate.wells()
+        batch = []
+        for k in range(first, min(first + batch_size, total_digests)):
+            if not batch or batch[-1][0] != sample_of[k]:
+                batch.append((sample_of[k], []))
+            batch[-1][1].append(wells[k - first])
+        batches.append(batch)
+    batch_tubes = [[tube for _, tubes in batch for tube in tubes] for batch in batches]
+
+    # Progress is saved after every stage and tube, so that a run can be resumed where it stopped
+    checkpoint = Checkpoint(protocol, checkpoint_file, resume, modules=[temp_mod])
+    # The liquid level of the ABC tube is followed down as it is drawn from, if reagent_volumes has it
+    levels = LiquidLevels(protocol, [(ABC, ml, 'ABC') for ml in reagent_volumes.values()], layout['tuberack_15ml_50ml'], checkpoint)
+    # What every stage draws from the reagent tubes, asked for up front with preload_reagents
+    reagents = ReagentPlan(protocol, preload_reagents)
+    rack_2mL = 'the 2ml tube rack located in slot {}'.format(layout['tuberack_2mL'])
+    reagents.add('ABC', ABC, sum((100 - 100 / concentration) * reps
+                                 for concentration, reps in zip(sample_concentrations, sample_replicates)),
+                 'the 15mL_50mL tube rack located in slot {}'.format(layout['tuberack_15ml_50ml']))
+    reagents.add('DTT', DTT, volume_of_DTT * total_digests, rack_2mL)
+    reagents.add('IAA', IAA, volume_of_IAA * total_digests, rack_2mL, fresh=True)
+    reagents.add('trypsin', trypsin, volume_of_trypsin * total_digests, rack_2mL, fresh=True)
 
     # ---------------------------- COMMANDS ---------------------------- #
 
     # | --------- transfer samples to plate --------- |
-    protocol.pause('Ensure to change starting tip position for p50 and p300.')
-
-    for i in range(number_of_samples):
-        # transfer ABC; change 50 to 20 if p20 will be used.
-            if (100 - (100 / sample_concentrations[i])) > 50:
-                p300.transfer(
-                    100 - (100 / sample_concentrations[i]),
-                    ABC,
-                    temp_plate.wells()[i * replicates: i * replicates + replicates],
-                    new_tip='once',
-                    touch_tip=True
-                )
-            else:
-                p50.transfer(
-                    100 - (100 / sample_concentrations[i]),
-                    ABC,
-                    temp_plate.wells()[i * replicates: i * replicates + replicates],
-                    new_tip='once',
-                    touch_tip=True
-                )
-
-        # transfer 100ug of protein and mix 3 times with 50 uL volume; change 50 to 20 if p20 will be used.
-            if (100 / sample_concentrations[i]) > 50:
-                p300.transfer(
-                100 / sample_concentrations[i],
-                samples[i],
-                temp_plate.wells()[i * replicates: i * replicates + replicates],
-                mix_after=(3, 50),
-                new_tip='always',
-                touch_tip=True,
-                blow_out=True,
-                blowout_location='destination well'
-                )
-            else:
-                p50.transfer(
-                100 / sample_concentrations[i],
-                samples[i],
-                temp_plate.wells()[i * replicates: i * replicates + replicates],
-                mix_after=(3, 50),
-                new_tip='always',
-                touch_tip=True,
-                blow_out=True,
-                blowout_location='destination well'
-            )
-
-
-
-    # | --------- transfer DTT to plate --------- |
-    # change the change the mix volume from 50 to 20 if p20 will be used.
-    protocol.pause('Ensure DTT has been loaded into A6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-    p50.transfer(
-        volume_of_DTT,
-        DTT,
-        temp_plate.wells()[:number_of_samples * replicates],
-        mix_after=(5, 50),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blowout_location='destination well'
-    )
-    protocol.pause('Ensure to close caps on sample tubes.')
-
-    # | --------- first incubation --------- |
-    temp_mod.set_temperature(55)
-    protocol.delay(minutes=5, msg='Pausing for 5 minutes to allow samples to reach tempeature.')
-    protocol.delay(minutes=incubation_time_DTT, msg=f'Incubating at 55 degrees for {incubation_time_DTT} minutes.')
-
-    # | --------- set block to room temp before adding IAA --------- |
-    protocol.comment('Cooling down temp block.')
-    temp_mod.set_temperature(22)
-    protocol.delay(minutes=5, msg='Pausing for 5 minutes to allow tubes to cool down.')
-    protocol.pause('Ensure to open caps on sample tubes.')
-
-    # | --------- transfer IAA to samples on plate --------- |
-    protocol.pause('Ensure IAA has been loaded into B6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-     # change the change the mix volume from 50 to 20 if p20 will be used.
-    p50.transfer(
-        volume_of_IAA,
-        IAA,
-        temp_plate.wells()[:number_of_samples * replicates],
-        mix_after=(5, 50),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blowout_location='destination well'
-    )
-    protocol.pause('Close caps on sample tubes and cover tubes with foil')
-
-    # | --------- second incubation --------- |
-    temp_mod.set_temperature(22)
-    protocol.delay(minutes=incubation_time_IAA, msg=f'Protect tubes from light. Incubating at 22 degrees for {incubation_time_IAA} minutes.')
-    protocol.comment('Temp block will now be deactivated.')
-    temp_mod.deactivate()
- 
-
-    # | --------- transfer trypsin to samples on plate --------- |
-    # change the change the mix volume from 50 to 20 if p20 will be used.
-    protocol.pause('Ensure trypsin has been loaded into C6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-    protocol.pause('Open caps on sample tubes on the temperature module')
-    p50.transfer(
-        volume_of_trypsin,
-        trypsin,
-        temp_plate.wells()[:number_of_samples * replicates],
-        mix_after=(5, 50),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blowout_location='destination well')
+    reagents.start([
+        'Ensure to change starting tip position for p50 and p300.' if not tip_inventory_file else None,
+        'Place the batch 2 tubes, empty and with caps open, in {} to {} of the temperature module; each later batch '
+        'takes the place of the batch two before it.'.format(batch_tubes[1][0].well_name, batch_tubes[1][-1].well_name)
+        if len(batches) > 1 else None,
+        'Ensure the sample tubes are in {}: {}.'.format(rack_2mL, ', '.join(
+            '{} in {}'.format(name, position) for name, position in zip(sample_names, sample_positions)))
+        if sample_manifest else None,
+    ])
+
+    # | --------- normalize samples --------- |
+    # 100 ug of protein made up to 100 uL with ABC in every digest tube
+    def batch_samples(b):
+        """Sample tubes, the digest tubes of each and their concentrations in batch b."""
+        return ([samples[i] for i, _ in batches[b]], [tubes for _, tubes in batches[b]],
+                [sample_concentrations[i] for i, _ in batches[b]])
+
+    def normalize(b):
+        if checkpoint.pending('protein normalization'):
+            if b == 0:
+                protocol.comment('Stage: protein normalization')
+                tips.ensure(normalization_tips(p50, p300, *batch_samples(0)[1:]), 'protein normalization')
+            normalize_protein(p50, p300, ABC, *batch_samples(b), checkpoint=checkpoint, levels=levels)
+            checkpoint.complete()
+
+    if stagger_batch_size:
+        protocol.comment(staggered_schedule(batch_tubes, incubation_time_DTT, incubation_time_IAA))
+    normalize(0)
+
+    for b, tubes in enumerate(batch_tubes):
+        where = 'the batch {} tubes ({} to {})'.format(b + 1, tubes[0].well_name, tubes[-1].well_name) if stagger_batch_size else 'sample tubes'
+        # | --------- reduction and alkylation --------- |
+        # the next batch is normalized and gets its DTT while this one incubates with IAA
+        during_iaa, during_iaa_tips = [], {}
+        if b + 1 < len(batches):
+            normalized = Task('batch {} normalization'.format(b + 2), lambda b=b: normalize(b + 1),
+                              normalization_seconds(p50, p300, *batch_samples(b + 1)[1:]))
+            during_iaa = [normalized, Task('batch {} DTT addition'.format(b + 2), after=[normalized],
+                                           action=lambda tubes=batch_tubes[b + 1]: add_to_tubes(p50, volume_of_DTT, DTT, tubes, checkpoint),
+                                           duration=addition_seconds(p50, volume_of_DTT, batch_tubes[b + 1]))]
+            during_iaa_tips = normalization_tips(p50, p300, *batch_samples(b + 1)[1:])
+            during_iaa_tips[p50] += len(batch_tubes[b + 1])
+        # the block heats for this batch once the one before it has gone to the shaker
+        done = batch_tubes[b - 1] if b > 0 else None
+        before_heating = 'Move the batch {} tubes ({} to {}) to the shaker for overnight digestion{}.'.format(
+            b, done[0].well_name, done[-1].well_name,
+            ' and put {} empty tubes, caps open, in their place for batch {}'.format(len(batch_tubes[b + 1]), b + 2)
+            if b + 1 < len(batches) else '') if done else None
+        reduce_and_alkylate(protocol, temp_mod, p50, DTT, IAA, tubes, volume_of_DTT, volume_of_IAA,
+                            incubation_time_DTT, incubation_time_IAA, temp_equilibration_min, rack_slot=layout['tuberack_2mL'],
+                            during_iaa=during_iaa, during_iaa_tips=during_iaa_tips, checkpoint=checkpoint, tips=tips,
+                            reagents=reagents, dtt_added=b > 0, tubes_name=where, before_heating=before_heating)
+
+        # | --------- transfer trypsin to samples on plate --------- |
+        if checkpoint.pending('trypsin addition'):
+            protocol.comment('Stage: trypsin addition')
+            # one pause for loading the trypsin and opening the caps
+            tips.ensure({p50: len(tubes)}, 'trypsin addition', ' '.join(filter(None, [reagents.prompt('trypsin',
+                        'Ensure trypsin has been loaded into C6 of {} prior to resuming protocol.'.format(rack_2mL)),
+                        'Open caps on {} on the temperature module.'.format(where)])))
+            add_to_tubes(p50, volume_of_trypsin, trypsin, tubes, checkpoint)
+            checkpoint.complete()
+    tips.save()
     protocol.comment('Transfer to tubes to shaker for overnight digestion.')
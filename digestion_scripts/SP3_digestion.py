@@ -1,5 +1,15 @@
 from opentrons import protocol_api
 
+from protocol_lib.beads import BeadWorkflow
+from protocol_lib.checkpoint import Checkpoint
+from protocol_lib.deck import resolve_layout
+from protocol_lib.liquid import LiquidLevels
+from protocol_lib.manifest import read_manifest
+from protocol_lib.reagents import ReagentPlan
+from protocol_lib.schedule import Task, transfer_seconds
+from protocol_lib.tipracks import TipInventory
+from protocol_lib.tubes import add_to_tubes, normalization_tips, normalize_protein, reduce_and_alkylate
+
 
 metadata = {
     'protocolName': 'SP3 Protein Cleanup and Digestion',
@@ -20,317 +30,291 @@ def run(protocol: protocol_api.ProtocolContext):
     volume_of_trypsin: float = 10.0  # manually prepare to a concentration of 0.2ug/uL
     incubation_time_DTT = 30  # in minutes
     incubation_time_IAA = 30  # in minutes
+    temp_equilibration_min = 2  # minutes the tubes are held once the temp block reads its target, before an incubation or the next step
     volume_of_beads: float = 20.0  # Manually prepare beads for peptide binding prior to loading
     volume_of_ethanol100: float = 140.0  # Volume of 100% ethanol to be used during protein binding phase
     volume_of_ethanol80: float = 1000.0  # Volume of 80% ethanol to be used for washes
     total_samples = number_of_samples * replicates  # Total number of samples (including replicates) cannot exceed 24
-    starting_tip_p50 = 'A1'  # change if full tip rack will not be used
-    starting_tip_p300 = 'A1'  # change if full tip rack will not be used
+    starting_tip_p50 = 'A1'  # change if full tip rack will not be used; not needed with tip_inventory_file
+    starting_tip_p300 = 'A1'  # change if full tip rack will not be used; not needed with tip_inventory_file
     starting_mag_well = 0  # 0 corresponds to 'A1' up to 95 corresponding to 'H12'
+    bead_mix_interval_min = 0  # minimum minutes between repeated mixes of the same well while beads bind; 0 mixes back-to-back
+    batch_reagent_additions = False  # True adds ethanol/ABC to all wells with one tip (dispensed at the top of the wells), then mixes each well with a fresh tip
+    use_p300_multi = False  # True processes full mag-plate columns with a p300 8-channel on the left mount in place of the p50 for the whole run; the p300 then adds the DTT, IAA, beads and trypsin, which have to be at least 30 uL, and moves protein and ABC volumes of at least 30 uL
+    use_p1000 = False  # True moves volumes larger than one p300 tip-full (washes and their supernatants) with a p1000 single-channel on the left mount in place of the p50 for the whole run; the small volumes then go to the p300 as with use_p300_multi
+    reuse_tips = False  # True follows the tip policy below: a tip goes back into its rack slot and is reused, but only in the well it came from
+    sample_manifest = ''  # optional CSV/TSV of the samples, pasted here or the path of the file on the robot; one row per sample with columns sample, concentration, replicates and optionally position (its tube in the 2ml tube rack). Replaces number_of_samples, sample_concentrations and replicates above
+    checkpoint_file = ''  # optional path on the robot the run saves its progress to after every stage and well, e.g. '/data/SP3_checkpoint.json'
+    resume = False  # True starts an aborted run again after its last completed step, from checkpoint_file; leave the other settings as they were
+    tip_inventory_file = ''  # optional path on the robot where the tips left in the p50 and p300 racks are kept between runs, e.g. '/data/tips.json'; the next run starts with the partial racks this one leaves. Delete it when placing full racks
+    reagent_volumes = {}  # optional mL loaded into the bulk reagent tubes of the 15mL_50mL tube rack, e.g. {'ABC': 14, 'ethanol80': 45}; the pipettes then draw them from just below the falling liquid level instead of the tube bottom, and the run pauses for a top-up before a tube runs low
+    beads_during_iaa = False  # True adds the beads to the empty deep-well plate while the IAA incubates and loads the samples onto them, taking bead addition off the critical path (about 5 min for 12 digests); the beads then sit undiluted for the incubation and may dry, and binding starts from the sample loaded onto the beads rather than from beads added to the sample, so validate it for your samples first
+    preload_reagents = False  # True asks for every reagent but the IAA (made just before use and kept from the light) and the trypsin, with the volume to load, in one pause before the run starts instead of a pause before each stage, so the run only stops where tubes, tips or pipettes have to be handled
+    deck_layout = {}  # optional slots of labware and 15mL_50mL rack positions of tubes, overriding the layout below (e.g. {'mag_deck': 4, 'waste_1': 'A4'}); python -m protocol_tools.deck proposes one that shortens head travel
+
+    # | --------- samples --------- |
+    # One row per sample from sample_manifest, or the settings above when there is none. Every problem with the
+    # inputs is collected in input_errors and reported together before anything moves.
+    input_errors = []
+    rack_positions = [row + str(col) for col in range(1, 6) for row in 'ABCD']  # 2ml tube rack; column 6 holds the reagents
+
+    if sample_manifest:
+        # 100 ug of protein has to fit in the 100 uL digest
+        manifest, input_errors = read_manifest(sample_manifest, {'concentration': (float, 1.0, 20.0), 'replicates': (int, 1, 24)},
+                                               rack_positions)
+        sample_names = manifest['sample']
+        sample_concentrations = manifest['concentration']
+        sample_replicates = manifest['replicates']
+        sample_positions = manifest['position']
+        number_of_samples = len(sample_names)
+    else:
+        sample_names = ['sample {}'.format(i + 1) for i in range(number_of_samples)]
+        sample_replicates = [replicates] * number_of_samples
+        sample_positions = rack_positions[:number_of_samples]
+        if len(sample_concentrations) != number_of_samples:
+            input_errors.append('Length of sample_concentrations must match the integer specified for number_of_samples.')
+    if number_of_samples > len(rack_positions):
+        input_errors.append('The 2ml tube rack holds at most {} samples next to the reagents.'.format(len(rack_positions)))
+    total_samples = sum(reps for reps in sample_replicates if reps)
+    if total_samples > 24:
+        input_errors.append('Total digests (including replicates) cannot exceed the number of slots available on the aluminum block (24).')
+    unknown_reagents = [name for name in reagent_volumes if name not in ('ABC', 'ethanol100', 'ethanol80')]
+    if unknown_reagents:
+        input_errors.append('reagent_volumes names {}; it takes ABC, ethanol100 and ethanol80.'.format(', '.join(unknown_reagents)))
+    left_pipette = 'use_p300_multi' if use_p300_multi else 'use_p1000' if use_p1000 else None
+    if left_pipette:
+        # without the p50 its volumes go to the p300, which cannot measure less than 30 uL
+        too_small = ['{} is {:g} uL'.format(name, vol) for name, vol in (('volume_of_DTT', volume_of_DTT), ('volume_of_IAA', volume_of_IAA),
+                     ('volume_of_beads', volume_of_beads), ('volume_of_trypsin', volume_of_trypsin)) if vol < 30]
+        too_small += ['{} at {:g} ug/uL takes {:.1f} uL protein and {:.1f} uL ABC'.format(name, concentration, 100 / concentration, 100 - 100 / concentration)
+                      for name, concentration in zip(sample_names, sample_concentrations)
+                      if concentration and (100 / concentration < 30 or 0 < 100 - 100 / concentration < 30)]
+        if too_small:
+            input_errors.append('With {} the left mount has no p50 and the p300 cannot measure less than 30 uL: {}.'.format(
+                left_pipette, '; '.join(too_small)))
+    # Check well plate for adequate number of wells available after the starting well
+    if starting_mag_well + total_samples > 95:
+        input_errors.append('Well plate does not have the required number of wells to hold all replicates at that starting position.')
+
+    # | --------- deck layout --------- |
+    # Slot of every labware and 15mL_50mL rack position of every bulk tube; deck_layout overrides any of them. The
+    # reservoirs are only loaded with use_p300_multi, tiprack_left in place of the p50 racks with use_p300_multi or
+    # use_p1000.
+    layout, layout_errors = resolve_layout({'tiprack_50': 1, 'tiprack_50_2': 2, 'tiprack_300': 3, 'tuberack_2mL': 4,
+                                            'tuberack_15ml_50ml': 5, 'tiprack_300_2': 6, 'mag_deck': 7, 'reservoir': 8,
+                                            'waste_reservoir': 9, 'temp_mod': 10, 'tiprack_left': 11, 'ABC': 'A1',
+                                            'ethanol100': 'A3', 'ethanol80': 'A4', 'waste_1': 'B3', 'waste_2': 'B4'},
+                                           deck_layout, modules=('temp_mod', 'mag_deck'))
+    input_errors.extend(layout_errors)
+    if input_errors:
+        raise Exception('\n'.join(input_errors))
 
     # | ---------  tip racks --------- |
-    tiprack_300 = protocol.load_labware('opentrons_96_tiprack_300ul', 3)
-    tiprack_300_2 = protocol.load_labware('opentrons_96_tiprack_300ul', 6)
-    tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', 1)
-    tiprack_50_2 = protocol.load_labware('opentrons_96_tiprack_300ul', 2)
+    tiprack_300 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_300'])
+    tiprack_300_2 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_300_2'])
 
     # | ---------  pipettes --------- |
     #p300 = protocol.load_instrument('p300_single', 'right', tip_racks=[tiprack_300])
     p300 = protocol.load_instrument('p300_single', 'right', tip_racks=[tiprack_300, tiprack_300_2])
-    p50 = protocol.load_instrument('p50_single', 'left', tip_racks=[tiprack_50, tiprack_50_2]) #change p50 to p20 if p20 will be used here and throughout the script following OT-2 API; this script has not been tested with p20 therefore testing is required”
-    p50.starting_tip = tiprack_50.well(starting_tip_p50)
     p300.starting_tip = tiprack_300.well(starting_tip_p300)
-    p300_aspirate_slow = 25  # Aspiration speed when removing supernatant
+    # With use_p300_multi or use_p1000 the 8-channel or the p1000 has the left mount for the whole run (it is loaded
+    # with the SP3 bead steps below), so there is no p50 and the p300 adds the small volumes
+    p50 = None
+    if not use_p300_multi and not use_p1000:
+        tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_50'])
+        tiprack_50_2 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_50_2'])
+        p50 = protocol.load_instrument('p50_single', 'left', tip_racks=[tiprack_50, tiprack_50_2]) #change p50 to p20 if p20 will be used here and throughout the script following OT-2 API; this script has not been tested with p20 therefore testing is required”
+        p50.starting_tip = tiprack_50.well(starting_tip_p50)
+    p_small = p50 or p300  # adds the DTT, IAA, beads and trypsin
+    # Tip racks are refilled between stages, in the pause a stage starts with, before a stage would run out
+    tips = TipInventory(protocol, [pipette for pipette in (p50, p300) if pipette], tip_inventory_file)
+    p300_aspirate_slow = 25  # Aspiration speed when removing supernatant near the bead pellet
     p300_aspirate_default = 150  # Normal aspiration speed by default
+    p300_aspirate_fast = 200  # Aspiration speed for the bulk of the supernatant, well above the beads
 
 
     # | ---------  tube racks/plates/containers --------- |
-    temp_mod = protocol.load_module('Temperature Module', 10)
+    temp_mod = protocol.load_module('Temperature Module', layout['temp_mod'])
     temp_plate = temp_mod.load_labware('opentrons_24_aluminumblock_nest_2ml_snapcap')
-    tuberack_2mL = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', 4)
-    tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', 5)
-    mag_deck = protocol.load_module('magdeck', 7)
+    # the replicate tubes of every sample on the temp block, next to each other in sample order
+    digests = [temp_plate.wells()[sum(sample_replicates[:i]):sum(sample_replicates[:i + 1])] for i in range(number_of_samples)]
+    tuberack_2mL = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', layout['tuberack_2mL'])
+    tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', layout['tuberack_15ml_50ml'])
+    mag_deck = protocol.load_module('magdeck', layout['mag_deck'])
     if mag_deck.status == 'engaged':
         mag_deck.disengage()
     mag_plate = mag_deck.load_labware('nest_96_wellplate_2ml_deep')
 
     # | --------- reagents --------- |
-    samples = tuberack_2mL.wells()[:number_of_samples]
+    samples = [tuberack_2mL[position] for position in sample_positions]
     DTT = tuberack_2mL['A6']
     IAA = tuberack_2mL['B6']
     trypsin = tuberack_2mL['C6']
     beads = tuberack_2mL['D6']
-    ABC = tuberack_15ml_50ml['A1']
-    ethanol100 = tuberack_15ml_50ml['A3']
-    ethanol80 = tuberack_15ml_50ml['A4']
-    waste = tuberack_15ml_50ml['B3']
+    ABC = tuberack_15ml_50ml[layout['ABC']]
+    ethanol100 = tuberack_15ml_50ml[layout['ethanol100']]
+    ethanol80 = tuberack_15ml_50ml[layout['ethanol80']]
+    waste_tubes = [tuberack_15ml_50ml[layout[name]] for name in ('waste_1', 'waste_2')]  # 50 mL supernatant waste tubes, filled in this order
+
+    # Progress is saved after every stage and well, so that a run can be resumed where it stopped
+    checkpoint = Checkpoint(protocol, checkpoint_file, resume, modules=[temp_mod, mag_deck])
+    # The liquid level of the bulk tubes in reagent_volumes is followed down as they are drawn from
+    bulk_reagents = {'ABC': (ABC, 'ABC'), 'ethanol100': (ethanol100, '100% ethanol'), 'ethanol80': (ethanol80, '80% ethanol')}
+    levels = LiquidLevels(protocol, [(bulk_reagents[name][0], ml, bulk_reagents[name][1]) for name, ml in reagent_volumes.items()],
+                          layout['tuberack_15ml_50ml'], checkpoint)
+
+    # | --------- SP3 bead steps --------- |
+    # Full mag-plate columns can go to a p300 8-channel, and volumes larger than one p300 tip-full to a p1000; either
+    # holds the left mount for the whole run.
+    mag_wells = mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]
+    beads_sp3 = BeadWorkflow(protocol, p300, mag_deck, mag_plate, waste_tubes, p300_aspirate_slow, p300_aspirate_default,
+                             p300_aspirate_fast, reuse_tips=reuse_tips, batch_reagent_additions=batch_reagent_additions,
+                             use_p300_multi=use_p300_multi, checkpoint=checkpoint, tips=tips, levels=levels)
+    beads_sp3.full_columns = beads_sp3.columns_of(starting_mag_well, total_samples)
+    multi_reagents = ((ethanol100, '100% ethanol', volume_of_ethanol100), (ethanol80, '80% ethanol', volume_of_ethanol80 * 3),
+                      (ABC, 'ABC', 250 + 100))
+    if use_p300_multi:
+        beads_sp3.load_multi((layout['tiprack_left'],), layout['reservoir'], layout['waste_reservoir'])
+        beads_sp3.plan_reservoir(multi_reagents, beads_sp3.full_columns)
+    if use_p1000:
+        if use_p300_multi:
+            raise Exception("use_p300_multi and use_p1000 both need the left mount; set only one of them.")
+        beads_sp3.load_p1000(layout['tiprack_left'])
+
+    # What every stage draws from the reagent tubes, asked for up front with preload_reagents; the wells of the full
+    # columns draw their bulk reagents from the reservoir of the 8-channel instead
+    reagents = ReagentPlan(protocol, preload_reagents)
+    rack_2mL = 'the 2ml tube rack located in slot {}'.format(layout['tuberack_2mL'])
+    rack_bulk = 'the 15mL_50mL tube rack located in slot {}'.format(layout['tuberack_15ml_50ml'])
+    tube_wells = total_samples - 8 * len(beads_sp3.full_columns)
+    reagents.add('ABC', ABC, sum((100 - 100 / concentration) * reps
+                                 for concentration, reps in zip(sample_concentrations, sample_replicates))
+                 + (250 + 100) * tube_wells, rack_bulk)
+    reagents.add('DTT', DTT, volume_of_DTT * total_samples, rack_2mL)
+    reagents.add('IAA', IAA, volume_of_IAA * total_samples, rack_2mL, fresh=True)
+    reagents.add('beads', beads, volume_of_beads * total_samples, rack_2mL)
+    reagents.add('100% ethanol', ethanol100, volume_of_ethanol100 * tube_wells, rack_bulk)
+    reagents.add('80% ethanol', ethanol80, volume_of_ethanol80 * 3 * tube_wells, rack_bulk)
+    reagents.add('trypsin', trypsin, volume_of_trypsin * total_samples, rack_2mL, fresh=True)
 
     # ---------------------------- COMMANDS ---------------------------- #
-    # Check well plate for adequate number of wells available after the starting well
-    if (starting_mag_well + total_samples > 95):
-        raise Exception("Well plate does not have the required number of wells to hold all replicates at that starting position.")
+    # Every supernatant removal of a single-channel well goes into the waste tubes; the 8-channel has its own reservoir
+    beads_sp3.use_waste_tubes(volume_of_ethanol100 + volume_of_ethanol80 * 3 + 250, total_samples, layout['tuberack_15ml_50ml'])
 
-    # Function for resuspending beads in a given volume of a specified reagent
-    def reagentTransfer(vol, reagent, wells=mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]):
-        for well in wells:
-            p300.pick_up_tip()
-            p300.transfer(
-                vol,
-                reagent,
-                well.top() if reagent == ethanol80 else well,
-                air_gap=10,
-                new_tip='never',
-                blow_out=True,
-                blowout_location='destination well',
-            )
-            p300.mix(10, vol if vol < 300 else 300, well.bottom(1))
-            p300.blow_out()
-            p300.drop_tip()
-
-    #  Function for mixing resuspended beads to mimic mixing on a plate shaker
-    def mixWells(mix_vol, num_mixes, delay_min, wells=mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]):
-        curr_mix = 0
-        while curr_mix < num_mixes:
-            protocol.delay(minutes=delay_min)
-            for well in wells:
-                p300.pick_up_tip()
-                p300.mix(5, mix_vol if mix_vol < 300 else 300, well.bottom(1))
-                p300.touch_tip()
-                p300.blow_out()
-                p300.drop_tip()
-            curr_mix += 1
+    reagents.start([
+        'Ensure the sample tubes are in {}: {}.'.format(rack_2mL, ', '.join(
+            '{} in {}'.format(name, position) for name, position in zip(sample_names, sample_positions)))
+        if sample_manifest else None,
+    ])
 
     # Transfer 100mM ABC then 100ug of protein from samples to tubes on temp plate. Concentration in tubes will be 1 ug/uL
-    mass_of_protein = 100.0
-    for i in range(number_of_samples):
-        # transfer ABC; change 50 to 20 if p20 will be used
-        if (mass_of_protein - (mass_of_protein / sample_concentrations[i])) > 50:
-            p300.transfer(
-                100 - (mass_of_protein / sample_concentrations[i]),
-                ABC,
-                temp_plate.wells()[i * replicates: i * replicates + replicates],
-                new_tip='once',
-                touch_tip=True,
+    if checkpoint.pending('protein normalization'):
+        protocol.comment('Stage: protein normalization')
+        tips.ensure(normalization_tips(p50, p300, digests, sample_concentrations), 'protein normalization')
+        normalize_protein(p50, p300, ABC, samples, digests, sample_concentrations, checkpoint=checkpoint, levels=levels)
+        checkpoint.complete()
+
+    # DTT reduction, then IAA alkylation. With beads_during_iaa the p50 (the p300 with use_p300_multi or use_p1000),
+    # idle while the IAA incubates, puts the beads into the still-empty wells of the deep-well plate then, and the
+    # samples are loaded onto them; otherwise the beads go into the loaded samples and are mixed in, as the SP3 method
+    # has it.
+    def add_beads(well):
+        if checkpoint.pending('bead addition ' + well.well_name):
+            p_small.transfer(
+                volume_of_beads,
+                beads,
+                well,
+                mix_before=(5, volume_of_beads),
+                mix_after=None if beads_during_iaa else (5, volume_of_beads),
+                new_tip='always',
                 blow_out=True,
                 blowout_location='destination well'
             )
-        else:
-            p50.transfer(
-                100 - (mass_of_protein / sample_concentrations[i]),
-                ABC,
-                temp_plate.wells()[i * replicates: i * replicates + replicates],
-                new_tip='once',
+            checkpoint.complete()
+    beads_prompt = 'Ensure prepared beads have been loaded into D6 of {} prior to resuming protocol.'.format(rack_2mL)
+    bead_additions = []
+    if beads_during_iaa:
+        reagents.pause('beads', beads_prompt)
+        bead_additions = [Task('bead addition {}'.format(well.well_name), lambda well=well: add_beads(well),
+                               transfer_seconds(p_small, volume_of_beads, mix=(5, volume_of_beads))) for well in mag_wells]
+    reduce_and_alkylate(protocol, temp_mod, p_small, DTT, IAA, temp_plate.wells()[:total_samples], volume_of_DTT, volume_of_IAA,
+                        incubation_time_DTT, incubation_time_IAA, temp_equilibration_min, rack_slot=layout['tuberack_2mL'],
+                        during_iaa=bead_additions, during_iaa_tips={p_small: len(bead_additions)}, checkpoint=checkpoint,
+                        tips=tips, reagents=reagents)
+
+
+    #Transfer protein samples from tubes to the deep-well plate on magnetic module, onto the beads with beads_during_iaa
+    if checkpoint.pending('sample loading'):
+        protocol.comment('Stage: sample loading')
+        tips.ensure({p300: len(mag_wells)}, 'sample loading', 'open tube caps')
+        # every digest tube goes to its own well, in sample order
+        for tube, well in checkpoint.each('sample', list(zip([tube for tubes in digests for tube in tubes], mag_wells)),
+                                          name=lambda pair: pair[1].well_name):
+            p300.transfer(
+                120 * 1.1,
+                tube,
+                well,
+                new_tip='always',
+                mix_after=(5, 100) if beads_during_iaa else None,
                 touch_tip=True,
                 blow_out=True,
                 blowout_location='destination well'
             )
+        checkpoint.complete()
 
+    # add beads to samples
+    if not beads_during_iaa and checkpoint.pending('bead addition'):
+        protocol.comment('Stage: bead addition')
+        tips.ensure({p_small: len(mag_wells)}, 'bead addition', reagents.prompt('beads', beads_prompt))
+        for well in mag_wells:
+            add_beads(well)
+        checkpoint.complete()
 
-        # transfer 100ug of protein and mix 3 times with 50 uL volume; change 50 to 20 if p20 will be used
-        if (mass_of_protein / sample_concentrations[i]) > 50:
-            p300.transfer(
-            mass_of_protein / sample_concentrations[i],
-            samples[i],
-            temp_plate.wells()[i * replicates: i * replicates + replicates],
-            mix_after=(3, 50),
-            new_tip='always',
-            touch_tip=True,
-            blow_out=True,
-            blowout_location='destination well'
-            )
-        else:
-            p50.transfer(
-            mass_of_protein / sample_concentrations[i],
-            samples[i],
-            temp_plate.wells()[i * replicates: i * replicates + replicates],
-            mix_after=(3, 50),
-            new_tip='always',
-            touch_tip=True,
-            blow_out=True,
-            blowout_location='destination well'
-            )
-
-    # transfer DTT to tubes on temp plate and change the mix volume from 50 to 20 if p20 will be used.
-    protocol.pause('Ensure DTT has been loaded into A6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-    p50.transfer(
-        volume_of_DTT,
-        DTT,
-        temp_plate.wells()[:number_of_samples * replicates],
-        mix_after=(5, 50),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blowout_location='destination well'
-    )
-    protocol.pause('Ensure to close caps on sample tubes.')
-
-    # DTT incubation
-    temp_mod.set_temperature(55)
-    protocol.delay(minutes=5, msg='Pausing for 5 minutes to allow samples to reach tempeature.')
-    protocol.delay(minutes=incubation_time_DTT, msg=f'Incubating at 55 degrees for {incubation_time_DTT} minutes.')
-
-    # cool temp block and tubes to room temp prior to adding IAA to samples
-    protocol.comment('Cooling down temp block.')
-    temp_mod.set_temperature(22)
-    protocol.delay(minutes=5, msg='Pausing for 5 minutes to allow tubes to cool down.')
-    protocol.pause('Ensure to open caps on sample tubes.')
-
-    # transfer IAA to tubes on temp plate and change the mix volume from 50 to 20 if p20 will be used.
-    protocol.pause('Ensure IAA has been loaded into B6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-    p50.transfer(
-        volume_of_IAA,
-        IAA,
-        temp_plate.wells()[:number_of_samples * replicates],
-        mix_after=(5, 50),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blowout_location='destination well'
-    )
-    protocol.pause('Close caps on sample tubes and cover tubes with foil')
-
-    # IAA incubation
-    temp_mod.set_temperature(22)
-    protocol.delay(minutes=incubation_time_IAA,
-                   msg=f'Protect tubes from light. Incubating at 22 degrees for {incubation_time_IAA} minutes.')
-    protocol.comment('Temp block will now be deactivated.')
-    temp_mod.deactivate()
-    protocol.pause('open tube caps')
+    if beads_sp3.full_columns:
+        beads_sp3.load_reservoir(multi_reagents)
 
-
-    #Transfer protein samples from tubes to the deep-well plate on magnetic module
-    for i in range(total_samples):
-        p300.transfer(
-            120 * 1.1,
-            temp_plate.wells()[i * replicates: i * replicates + replicates],
-        
-            mag_plate.wells()[(starting_mag_well + i * replicates) : (starting_mag_well + i * replicates + replicates)],
-            new_tip='always',
-            touch_tip=True,
-            blow_out=True,
-            blowout_location='destination well'
-        )
-
-    # add beads to samples 
-    protocol.pause('Ensure prepared beads have been loaded into D6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-    p50.transfer(
-        volume_of_beads,
-        beads,
-        mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well],
-        mix_before=(5, volume_of_beads),
-        mix_after=(5, volume_of_beads),
-        new_tip='always',
-        blow_out=True,
-        blowout_location='destination well'
-    )
-    
-    protocol.pause('Ensure 100 percent ethanol has been loaded into A3 of the 15mL_50mL tube rack located in slot 5 prior to resuming protocol.')
-    reagentTransfer(volume_of_ethanol100, ethanol100)
-    mixWells(mix_vol=volume_of_ethanol100, num_mixes=5, delay_min=0)
-    mag_deck.engage()
-    protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes.')
-
-    # Remove supernatant after initial incubation
-    # Reduce aspiration speed prior to removing supernatant
-    p300.flow_rate.aspirate = p300_aspirate_slow
-    # for mag_well in mag_plate.wells()[:total_samples]:
-    for mag_well in mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]:
-        p300.pick_up_tip()
-        p300.transfer(
-            volume_of_ethanol100 * 1.1,
-            mag_well.bottom(1),
-            waste.top(),
-            air_gap=10,
-            new_tip='never'
-        )
-        p300.touch_tip()
-        p300.blow_out(waste)
-        p300.drop_tip()
-    # Return aspiration speed back to default before moving on in the protocol execution
-    p300.flow_rate.aspirate = p300_aspirate_default
-    mag_deck.disengage()
+    beads_sp3.wash(volume_of_ethanol100, ethanol100, mag_wells, '100% ethanol binding', mixes=5,
+                   interval_min=bead_mix_interval_min, touch_tip=True,
+                   pause=reagents.prompt('100% ethanol', 'Ensure 100 percent ethanol has been loaded into {} of {} prior to resuming protocol.'.format(
+                       layout['ethanol100'], rack_bulk)))
 
     # Wash beads with 80% ethanol (3 washes in total)
-    protocol.pause('Ensure 80 percent ethanol has been loaded into A4 of the 15mL_50mL tube rack located in slot 5 prior to resuming protocol.')
     for i in range(3):
-        if mag_deck.status == 'engaged':
-            mag_deck.disengage()
-        reagentTransfer(volume_of_ethanol80, ethanol80) 
-        mag_deck.engage()
-        protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes.')
-
-        # Remove supernatant after wash incubation
-        # Reduce aspiration speed prior to removing supernatant
-        p300.flow_rate.aspirate = p300_aspirate_slow
-        # for mag_well in mag_plate.wells()[:total_samples]:
-        for mag_well in mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]:
-            p300.pick_up_tip()
-            p300.transfer(
-                volume_of_ethanol80 * 1.1,
-                mag_well.bottom(1),
-                waste.top(),
-                air_gap=10,
-                new_tip='never'
-            )
-            p300.blow_out(waste)
-            p300.drop_tip()
-        p300.flow_rate.aspirate = p300_aspirate_default
-
-
+        beads_sp3.wash(volume_of_ethanol80, ethanol80, mag_wells, '80% ethanol wash', top_dispense=True,
+                       pause=None if i else reagents.prompt('80% ethanol', 'Ensure 80 percent ethanol has been loaded into {} of {} prior to resuming protocol.'.format(
+                           layout['ethanol80'], rack_bulk)))
 
     # Wash beads with 250 uL ABC
-    protocol.pause('Open cap on ABC tube.')
-    if mag_deck.status == 'engaged':
-        mag_deck.disengage()
-    reagentTransfer(250, ABC) 
-    mixWells(mix_vol=250, num_mixes=0, delay_min=0)
-    mag_deck.engage()
-    protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes.')
-
-    # Remove supernatant after wash incubation
-    # Reduce aspiration speed prior to removing supernatant
-    p300.flow_rate.aspirate = p300_aspirate_slow
-    # for mag_well in mag_plate.wells()[:total_samples]:
-    for mag_well in mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]:
-        p300.pick_up_tip()
-        p300.transfer(
-            250 * 1.1,
-            mag_well.bottom(1),
-            waste.top(),
-            air_gap=10,
-            new_tip='never'
-        )
-        p300.blow_out(waste)
-        p300.drop_tip()
-    # Return aspiration speed back to default before moving on in the protocol execution
-    p300.flow_rate.aspirate = p300_aspirate_default
-
-    mag_deck.disengage()
+    beads_sp3.wash(250, ABC, mag_wells, 'ABC wash', pause=reagents.prompt('ABC', 'Open cap on ABC tube.', volume=False))
 
     # resuspend proteins and beads in 100uL of 100mM ABC and move to 2mL tubes for incubation
-    reagentTransfer(100, ABC)
-    protocol.pause('Ensure new collection tubes have been placed in 2.0 mL aluminum block prior to resuming protocol.')
-    p300.transfer(
-        100 * 1.5,
-        # mag_plate.wells()[:total_samples],
-        mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well],
-        temp_plate.wells()[number_of_samples:number_of_samples + total_samples],
-        mix_before=(10, 100),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blow_out_location='destination well'
-    )
+    if checkpoint.pending('ABC resuspension'):
+        protocol.comment('Stage: ABC resuspension')
+        beads_sp3.ensure_tips({p300: beads_sp3.tips_needed(100, mag_wells, removal=False) + len(mag_wells)}, 'ABC resuspension', None)
+        beads_sp3.reagent_transfer(100, ABC, mag_wells, 'ABC resuspension')
+        protocol.pause('Ensure new collection tubes have been placed in 2.0 mL aluminum block prior to resuming protocol.')
+        if checkpoint.pending('collection'):
+            # the collection tubes take the places of the digest tubes, which is where the trypsin goes
+            p300.transfer(
+                100 * 1.5,
+                mag_wells,
+                temp_plate.wells()[:total_samples],
+                mix_before=(10, 100),
+                new_tip='always',
+                touch_tip=True,
+                blow_out=True,
+                blowout_location='destination well'
+            )
+            checkpoint.complete()
+        checkpoint.complete()
 
     # transfer trypsin to each sample and change the mix volume from 50 to 20 if p20 will be used
-    protocol.pause('Ensure trypsin (0.2ug/uL) has been loaded into C6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-    p50.transfer(
-        volume_of_trypsin,
-        trypsin,
-        temp_plate.wells()[:total_samples],
-        mix_after=(5, 50),
-        new_tip='always',
-        touch_tip=True,
-        blow_out=True,
-        blowout_location='destination well')
+    if checkpoint.pending('trypsin addition'):
+        protocol.comment('Stage: trypsin addition')
+        tips.ensure({p_small: total_samples}, 'trypsin addition', reagents.prompt('trypsin',
+                    'Ensure trypsin (0.2ug/uL) has been loaded into C6 of {} prior to resuming protocol.'.format(rack_2mL)))
+        add_to_tubes(p_small, volume_of_trypsin, trypsin, temp_plate.wells()[:total_samples], checkpoint)
+        checkpoint.complete()
+    beads_sp3.report_trips()
+    tips.save()
     protocol.comment('Transfer digest tubes to plate shaker for overnight digestion.')
@@ -1,5 +1,13 @@
 from opentrons import protocol_api
 
+from protocol_lib.beads import BeadWorkflow
+from protocol_lib.checkpoint import Checkpoint
+from protocol_lib.deck import resolve_layout
+from protocol_lib.liquid import LiquidLevels
+from protocol_lib.manifest import read_manifest
+from protocol_lib.reagents import ReagentPlan
+from protocol_lib.tipracks import TipInventory
+
 metadata = {
     'protocolName': 'SP3 Peptide Cleanup',
     'author': 'Cody',
@@ -16,217 +24,277 @@ def run(protocol: protocol_api.ProtocolContext):
     volume_of_beads: float = 10.0  # Manually prepare beads for peptide binding prior to loading
     volume_of_ACN: float = 1292.0  # Volume of 100% ACN to be used during peptide binding phase; cannot exceed 1500uL
     volume_of_DMSO: float = 80.0  # Manually prepare 2% DMSO in MS water.
-    total_samples = number_of_samples * replicates  # Total number of samples (including replicates) cannot exceed 48
-    starting_tip_p50 = 'A1'  # change if full tip rack will not be used
-    starting_tip_p300 = 'A1'  # change if full tip rack will not be used
+    total_samples = number_of_samples * replicates  # Total number of samples (including replicates); runs that do not fit on one mag plate or tube rack are split into batches run back to back
+    starting_tip_p50 = 'A1'  # change if full tip rack will not be used; not needed with tip_inventory_file
+    starting_tip_p300 = 'A1'  # change if full tip rack will not be used; not needed with tip_inventory_file
     starting_mag_well = 0  # 0 corresponds to 'A1' up to 95 corresponding to 'H12'
+    bead_mix_interval_min = 0  # minimum minutes between repeated mixes of the same well while beads bind or elute; 0 mixes back-to-back
+    batch_reagent_additions = False  # True adds ACN/DMSO to all wells with one tip (dispensed at the top of the wells), then mixes each well with a fresh tip
+    use_p300_multi = False  # True processes full mag-plate columns with a p300 8-channel on the left mount in place of the p50 for the whole run; the p300 then adds the beads, which have to be at least 30 uL
+    use_p1000 = False  # True moves volumes larger than one p300 tip-full (washes and their supernatants) with a p1000 single-channel on the left mount in place of the p50 for the whole run; the p300 then adds the beads, which have to be at least 30 uL
+    reuse_tips = False  # True follows the tip policy below: a tip goes back into its rack slot and is reused, but only in the well it came from
+    elution_plate = False  # True collects the final eluates in a 96-well deep-well plate in slot 6 instead of 2 mL tubes, so more samples fit in each batch
+    sample_manifest = ''  # optional CSV/TSV of the digests, pasted here or the path of the file on the robot; one row per digest with columns sample and replicates. Replaces number_of_samples and replicates above; the tubes are assigned to rack positions batch by batch
+    checkpoint_file = ''  # optional path on the robot the run saves its progress to after every stage and well, e.g. '/data/SP3_cleanup_checkpoint.json'
+    resume = False  # True starts an aborted run again after its last completed step, from checkpoint_file; leave the other settings as they were
+    tip_inventory_file = ''  # optional path on the robot where the tips left in the p50 and p300 racks are kept between runs, e.g. '/data/tips.json'; the next run starts with the partial racks this one leaves. Delete it when placing full racks
+    reagent_volumes = {}  # optional mL loaded into the bulk reagent tubes of the 15mL_50mL tube rack, e.g. {'ACN': 45, 'DMSO': 10}; the pipettes then draw them from just below the falling liquid level instead of the tube bottom, and the run pauses for a top-up before a tube runs low
+    single_hop_elution = False  # True moves each eluate straight off the beads into its tube or collection-plate well with one tip, so an elution takes half the tips and a batch can use the whole mag plate; False keeps the two hops through spare mag-plate wells, for bead-sensitive samples
+    elution_bottom_mm = 1.0  # with single_hop_elution, height above the bottom of the mag-plate well the eluate is drawn down to, clear of the bead pellet
+    elution_settle_min = 3  # with single_hop_elution, minutes on the magnet before the eluate is drawn
+    preload_reagents = False  # True asks for the beads, ACN and DMSO, with the volume to load, in one pause before the run starts instead of a pause before each stage, so the first batch runs unattended once the samples are loaded
+    deck_layout = {}  # optional slots of labware and 15mL_50mL rack positions of tubes, overriding the layout below (e.g. {'mag_deck': 4, 'waste_1': 'A4'}); python -m protocol_tools.deck proposes one that shortens head travel
 
     # | ---------------------------- ^^^^^^^^^^^^^^^^^^^ ---------------------------- |
     # ---------------------------- DO NOT EDIT BELOW THIS LINE ---------------------------- #
+    # | --------- samples --------- |
+    # One row per digest from sample_manifest, or the settings above when there is none. Every problem with the
+    # inputs is collected in input_errors and reported together before anything moves.
+    input_errors = []
+
+    # A batch has to hold all replicates of a sample: two mag-plate wells per replicate (digest and first eluate), or
+    # one with single_hop_elution, and, unless elution_plate is set, an eluate tube per replicate next to the sample
+    # tube in the 2ml tube rack
+    mag_wells_per_digest = 1 if single_hop_elution else 2
+    max_replicates = min((96 - starting_mag_well) // mag_wells_per_digest, 96 if elution_plate else 20 - 1)
+    if sample_manifest:
+        manifest, input_errors = read_manifest(sample_manifest, {'replicates': (int, 1, max(1, max_replicates))})
+        sample_names = manifest['sample']
+        sample_replicates = manifest['replicates']
+        number_of_samples = len(sample_names)
+    else:
+        sample_names = ['sample {}'.format(i + 1) for i in range(number_of_samples)]
+        sample_replicates = [replicates] * number_of_samples
+    if max_replicates < 1 or any(reps and reps > max_replicates for reps in sample_replicates):
+        input_errors.append("Well plate does not have the required number of wells to hold all replicates at that starting position.")
+    # the supernatants of a batch go to the three 50 mL waste tubes, so they also cap the replicates of a sample
+    waste_digests = int(3 * BeadWorkflow.waste_tube_capacity / ((volume_of_ACN + 1000) * 1.1))
+    if any(reps and reps > waste_digests for reps in sample_replicates):
+        input_errors.append('The supernatants of one sample take more than the three 50 mL waste tubes hold; with {} uL ACN '
+                            'a sample can have at most {} replicates.'.format(volume_of_ACN, waste_digests))
+    unknown_reagents = [name for name in reagent_volumes if name not in ('ACN', 'DMSO')]
+    if unknown_reagents:
+        input_errors.append('reagent_volumes names {}; it takes ACN and DMSO.'.format(', '.join(unknown_reagents)))
+    left_pipette = 'use_p300_multi' if use_p300_multi else 'use_p1000' if use_p1000 else None
+    if left_pipette and volume_of_beads < 30:
+        # without the p50 the p300 adds the beads, and it cannot measure less than 30 uL
+        input_errors.append('With {} the left mount has no p50 and the p300 cannot measure less than 30 uL: '
+                            'volume_of_beads is {:g} uL.'.format(left_pipette, volume_of_beads))
+    if single_hop_elution and not 0.5 <= elution_bottom_mm <= 5:
+        input_errors.append('elution_bottom_mm has to be 0.5 to 5 mm; lower disturbs the bead pellet, higher leaves the eluate behind.')
+
+    # | --------- deck layout --------- |
+    # Slot of every labware and 15mL_50mL rack position of every bulk tube; deck_layout overrides any of them. The
+    # reservoirs and tiprack_left racks are only loaded with use_p300_multi (tiprack_left alone with use_p1000), and
+    # tiprack_50 only without either, the collection plate only with elution_plate, which takes the place of
+    # tiprack_left_3.
+    layout, layout_errors = resolve_layout({'tiprack_50': 1, 'tiprack_300': 2, 'tiprack_300_2': 3, 'tuberack_2mL': 4,
+                                            'tuberack_15ml_50ml': 5, 'collection_plate': 6, 'mag_deck': 7, 'reservoir': 8,
+                                            'waste_reservoir': 9, 'tiprack_left_2': 10, 'tiprack_left': 11, 'tiprack_left_3': 6,
+                                            'DMSO': 'A1', 'ACN': 'A3', 'waste_1': 'B3', 'waste_2': 'B4', 'waste_3': 'A4'},
+                                           deck_layout, modules=('mag_deck',))
+    input_errors.extend(layout_errors)
+    if input_errors:
+        raise Exception('\n'.join(input_errors))
+
     # | ---------  tip racks --------- |
-    tiprack_300 = protocol.load_labware('opentrons_96_tiprack_300ul', 2)
-    tiprack_300_2 = protocol.load_labware('opentrons_96_tiprack_300ul', 3)
-    tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', 1) 
+    tiprack_300 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_300'])
+    tiprack_300_2 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_300_2'])
     # tiprack_50_2 = protocol.load_labware('opentrons_96_tiprack_300ul', 6)
 
     # | ---------  pipettes --------- |
     p300 = protocol.load_instrument('p300_single', 'right', tip_racks=[tiprack_300, tiprack_300_2])
-    p50 = protocol.load_instrument('p50_single', 'left', tip_racks=[tiprack_50]) #change p50 to p20 if p20 will be used here and throughout the script following OT-2 API; this script has not been tested with p20 therefore testing is required.
-    p50.starting_tip = tiprack_50.well(starting_tip_p50) 
     p300.starting_tip = tiprack_300.well(starting_tip_p300)
-    p300_aspirate_slow = 25  # Aspiration speed when removing supernatant
+    # With use_p300_multi or use_p1000 the 8-channel or the p1000 has the left mount for the whole run (it is loaded
+    # with the SP3 bead steps below), so there is no p50 and the p300 adds the beads
+    p50 = None
+    if not use_p300_multi and not use_p1000:
+        tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', layout['tiprack_50'])
+        p50 = protocol.load_instrument('p50_single', 'left', tip_racks=[tiprack_50]) #change p50 to p20 if p20 will be used here and throughout the script following OT-2 API; this script has not been tested with p20 therefore testing is required.
+        p50.starting_tip = tiprack_50.well(starting_tip_p50)
+    p_small = p50 or p300  # adds the beads
+    # Tip racks are refilled between stages, in the pause a stage starts with, before a stage would run out
+    tips = TipInventory(protocol, [pipette for pipette in (p50, p300) if pipette], tip_inventory_file)
+    p300_aspirate_slow = 25  # Aspiration speed when removing supernatant near the bead pellet
     p300_aspirate_default = 150  # Normal aspiration speed by default
-    p300_aspirate_fast = 200
+    p300_aspirate_fast = 200  # Aspiration speed for the bulk of the supernatant, well above the beads
     p50_aspirate_slow = 25  # Aspiration speed when removing supernatant; 
     p50_aspirate_default = 150  # Normal aspiration speed by default; 
 
     # | ---------  tube racks/plates/containers --------- |
-    mag_deck = protocol.load_module('magdeck', 7)
+    mag_deck = protocol.load_module('magdeck', layout['mag_deck'])
     if mag_deck.status == 'engaged':
         mag_deck.disengage()
 
     mag_plate = mag_deck.load_labware('nest_96_wellplate_2ml_deep')
-    tuberack_2mL = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', 4)
-    tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', 5)
+    tuberack_2mL = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', layout['tuberack_2mL'])
+    tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', layout['tuberack_15ml_50ml'])
 
     # | --------- reagents --------- |
     beads = tuberack_2mL['A6']
-    DMSO = tuberack_15ml_50ml['A1']
-    ACN = tuberack_15ml_50ml['A3']
-    waste = tuberack_15ml_50ml['B3']
-    samples = tuberack_2mL.wells()[:number_of_samples]
+    DMSO = tuberack_15ml_50ml[layout['DMSO']]
+    ACN = tuberack_15ml_50ml[layout['ACN']]
+    waste_tubes = [tuberack_15ml_50ml[layout[name]] for name in ('waste_1', 'waste_2', 'waste_3')]  # 50 mL supernatant waste tubes, filled in this order
+
+    # | --------- batches --------- |
+    # A mag plate holds the digests of a batch and, unless single_hop_elution is set, their first eluates, the 2 mL
+    # tube rack (A6 holds the beads) the sample tubes and, unless elution_plate is set, the eluate tubes, and the waste
+    # tubes the supernatants. Samples that do not fit are run in further batches, back to back on a fresh mag plate
+    # with the reagents already loaded.
+    # Samples are packed into batches in order, as many as fit.
+    batches = []  # sample indices of every batch
+    for i in range(number_of_samples):
+        digests = sum(sample_replicates[j] for j in batches[-1]) + sample_replicates[i] if batches else 0
+        if (batches and digests * mag_wells_per_digest <= 96 - starting_mag_well and digests <= waste_digests
+                and len(batches[-1]) + 1 + (0 if elution_plate else digests) <= 20):
+            batches[-1].append(i)
+        else:
+            batches.append([i])
+    batch_digests = [sum(sample_replicates[i] for i in batch) for batch in batches]
+    if elution_plate:
+        collection_plate = protocol.load_labware('nest_96_wellplate_2ml_deep', layout['collection_plate'])
+    eluates_collected = [0]  # wells of the collection plate filled so far
+
+    # Progress is saved after every stage and well, so that a run can be resumed where it stopped
+    checkpoint = Checkpoint(protocol, checkpoint_file, resume, modules=[mag_deck])
+    # The liquid level of the bulk tubes in reagent_volumes is followed down as they are drawn from; the top-ups
+    # between batches fill them to the same volumes
+    bulk_reagents = {'ACN': (ACN, 'ACN'), 'DMSO': (DMSO, '2% DMSO')}
+    levels = LiquidLevels(protocol, [(bulk_reagents[name][0], ml, bulk_reagents[name][1]) for name, ml in reagent_volumes.items()],
+                          layout['tuberack_15ml_50ml'], checkpoint)
+
+    # | --------- SP3 bead steps --------- |
+    # Full mag-plate columns can go to a p300 8-channel, and volumes larger than one p300 tip-full to a p1000; either
+    # holds the left mount for the whole run.
+    beads_sp3 = BeadWorkflow(protocol, p300, mag_deck, mag_plate, waste_tubes, p300_aspirate_slow, p300_aspirate_default,
+                             p300_aspirate_fast, reuse_tips=reuse_tips, batch_reagent_additions=batch_reagent_additions,
+                             use_p300_multi=use_p300_multi, mix_repetitions=10, touch_tip_after_mix=True,
+                             checkpoint=checkpoint, tips=tips, levels=levels)
+    multi_reagents = ((ACN, 'ACN', volume_of_ACN + 1000), (DMSO, '2% DMSO', volume_of_DMSO))
+    if use_p300_multi:
+        beads_sp3.load_multi([layout['tiprack_left'], layout['tiprack_left_2']] + ([] if elution_plate else [layout['tiprack_left_3']]),
+                             layout['reservoir'], layout['waste_reservoir'])
+        beads_sp3.plan_reservoir(multi_reagents, beads_sp3.columns_of(starting_mag_well, max(batch_digests)))
+    if use_p1000:
+        if use_p300_multi:
+            raise Exception("use_p300_multi and use_p1000 both need the left mount; set only one of them.")
+        beads_sp3.load_p1000(layout['tiprack_left'])
+
+    # What a batch draws from the reagent tubes, asked for up front with preload_reagents and topped up to between
+    # batches; the wells of the full columns draw their ACN and DMSO from the reservoir of the 8-channel instead
+    reagents = ReagentPlan(protocol, preload_reagents)
+    tube_wells = max(digests - 8 * len(beads_sp3.columns_of(starting_mag_well, digests)) for digests in batch_digests)
+    reagents.add('beads', beads, volume_of_beads * max(batch_digests), 'the 2ml tube rack located in slot {}'.format(layout['tuberack_2mL']))
+    reagents.add('ACN', ACN, (volume_of_ACN + 1000) * tube_wells, 'the 15mL_50mL tube rack located in slot {}'.format(layout['tuberack_15ml_50ml']))
+    reagents.add('2% DMSO', DMSO, volume_of_DMSO * tube_wells, 'the 15mL_50mL tube rack located in slot {}'.format(layout['tuberack_15ml_50ml']))
 
     # ---------------------------- COMMANDS ---------------------------- #
 
-    # Check total number of samples and replicates
-    if (starting_mag_well + total_samples * 2 > 96):
-        raise Exception("Well plate does not have the required number of wells to hold all replicates at that starting position.")
-
-    # Function for resuspending beads in a given volume of a specified reagent
-    def reagentTransfer(vol, reagent, wells=mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]):
-        for well in wells:
-            p300.pick_up_tip()
-            p300.transfer(
-                vol,
-                reagent,
-                well.top() if reagent == ACN else well,
-                mix_before=(3, 100) if reagent == DMSO else None,
-                air_gap=10,
-                touch_tip=True if reagent == DMSO else False,
-                new_tip='never',
-                blow_out=True,
-                blowout_location='destination well',
-            )
-            p300.mix(10, vol if vol < 300 else 300, well.bottom(1))
-            p300.touch_tip()
-            p300.blow_out()
-            p300.drop_tip()
-
-    # Function for mixing resuspended beads to mimic mixing on a plate shaker
-    def mixWells(mix_vol, num_mixes, delay_min, wells=mag_plate.wells()[starting_mag_well: total_samples + starting_mag_well]):
-        curr_mix = 0
-        while curr_mix < num_mixes:
-            protocol.delay(minutes=delay_min)
-            for well in wells:
-                p300.pick_up_tip()
-                p300.mix(10, mix_vol if mix_vol < 300 else 300, well.bottom(1))
-                p300.blow_out()
-                p300.touch_tip()
-                p300.drop_tip()
-            curr_mix += 1
-
-
-    # Transfer defined mass of peptide from sample to the plate on magnetic module
-    
-     for i in range(len(samples)):
-         p300.flow_rate.aspirate = p300_aspirate_slow
-         p300.flow_rate.dispense = p300_aspirate_slow   
-         p300.transfer(
-         transfer_vol_peptides,
-         samples[i],
-         mag_plate.wells()[i * replicates + starting_mag_well: i * replicates + replicates + starting_mag_well],
-         touch_tip=True,
-         new_tip='once',
-         blow_out=True,
-         blowout_location='destination well'
-         )
-       
-     p300.flow_rate.aspirate = p300_aspirate_default
-     p300.flow_rate.dispense = p300_aspirate_default
-
-     # Transfer beads, then ACN to the tubes with peptide samples
-     protocol.pause('Ensure prepared beads have been loaded into A6 of the 2ml tube rack located in slot 4 prior to resuming protocol.')
-     p50.flow_rate.aspirate = p50_aspirate_default 
-     p50.flow_rate.dispense = p50_aspirate_default 
-     
-     # Mixing beads. Change p50 to p20 if needed 
-     p50.transfer(
-         volume_of_beads,
-         beads,
-         mag_plate.wells()[starting_mag_well:total_samples + starting_mag_well],
-         mix_before=(5, 50),
-         mix_after=(5, 50),
-         new_tip='always',
-         touch_tip=True,
-         blow_out=True,
-         blowout_location='destination well'
-     )
-
-    
-    reagentTransfer(volume_of_ACN, ACN)
-    mixWells(mix_vol=volume_of_ACN, num_mixes=5, delay_min=0.0)
-    mag_deck.engage()
-    protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes.')
-
-    # Remove supernatant after initial incubation
-    # Reduce aspiration speed prior to removing supernatant
-    p300.flow_rate.aspirate = p300_aspirate_slow
-    p300.flow_rate.dispense = p300_aspirate_default
-    for mag_well in mag_plate.wells()[starting_mag_well:total_samples + starting_mag_well]:
-        p300.pick_up_tip()
-        p300.transfer(
-            volume_of_ACN * 1.1,
-            mag_well.bottom(1),
-            waste.top(),
-            air_gap=10,
-            new_tip='never'
-        )
-        p300.touch_tip()
-        p300.blow_out(waste)
-        p300.drop_tip()
-    # Return aspiration speed back to default before moving on in the protocol execution
-    p300.flow_rate.aspirate = p300_aspirate_default
-    mag_deck.disengage()
-
-    # # Wash beads with 1mL ACN
-    protocol.pause('make sure ACN tube caps are off')
-    reagentTransfer(1000, ACN)
-    mixWells(mix_vol=1000, num_mixes=1, delay_min=0)
-    mag_deck.engage()
-    protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes.')
-
-    # Remove supernatant after wash incubation
-    # Reduce aspiration speed prior to removing supernatant
-    p300.flow_rate.aspirate = p300_aspirate_slow
-    for mag_well in mag_plate.wells()[starting_mag_well:total_samples+starting_mag_well]:
-        p300.pick_up_tip()
-        p300.transfer(
-            1000 * 1.1,
-            mag_well.bottom(1),
-            waste.top(),
-            air_gap=10,
-            new_tip='never'
-        )
-        p300.blow_out(waste)
-        p300.drop_tip()
-    # Return aspiration speed back to default before moving on in the protocol execution
-    p300.flow_rate.aspirate = p300_aspirate_default
-    protocol.delay(seconds=60, msg='Delaying for 60 seconds to allow residual ACN to evaporate.')
-    mag_deck.disengage()
-
-    # # Peptide elution
-    # Transfer 2% DMSO to samples
-    protocol.pause('vortex DMSO again and open caps.')
-    reagentTransfer(volume_of_DMSO, DMSO)
-    mixWells(mix_vol=volume_of_DMSO, num_mixes=4, delay_min=0)
-    mag_deck.engage()
-    protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes.')
-
-    # # Transfer first elution volumes to empty wells on the plate
-    # # Reduce aspiration speed prior to removing supernatant
-    p300.flow_rate.aspirate = p300_aspirate_slow
-    for mag_well, dest_well in zip(mag_plate.wells()[starting_mag_well:total_samples + starting_mag_well],
-                                   mag_plate.wells()[total_samples + starting_mag_well:total_samples * 2 + starting_mag_well]):
-        p300.pick_up_tip()
-        p300.transfer(
-            volume_of_DMSO * 1.2,
-            mag_well.bottom(0.5),
-            dest_well,
-            new_tip='never',
-            blow_out=True,
-            blowout_location='destination well'
-        )
-        p300.drop_tip()
-    protocol.delay(minutes=2, msg='Incubating on magnet for 2 minutes to remove any residual beads in solution.')
-
-    # # Transfer final elution volumes to new tubes on the 2mL tube rack
-    # protocol.pause('Ensure enough 2mL LoBind tubes are in the 2mL tube rack to match total number of samples')
-    for mag_well, dest_well in zip(mag_plate.wells()[total_samples + starting_mag_well: total_samples*2 + starting_mag_well],
-                                   tuberack_2mL.wells()[number_of_samples:number_of_samples + total_samples]):
-        p300.pick_up_tip()
-        p300.transfer(
-            volume_of_DMSO * 1.1,
-            mag_well,
-            dest_well,
-            new_tip='never',
-            blow_out=True,
-            blowout_location='destination well'
-        )
-        p300.drop_tip()
-
-    # Return aspiration speed back to default before moving on in the protocol execution
-    p300.flow_rate.aspirate = p300_aspirate_default
-    mag_deck.disengage()
+    # Every supernatant removal of a single-channel well goes into the waste tubes, which are emptied between
+    # batches; the 8-channel has its own reservoir
+    beads_sp3.use_waste_tubes(volume_of_ACN + 1000, max(batch_digests), layout['tuberack_15ml_50ml'])
+
+    for b, batch in enumerate(batches):
+        batch_samples = batch_digests[b]  # digests of this batch
+        batch_wells = mag_plate.wells()[starting_mag_well:starting_mag_well + batch_samples]
+        samples = tuberack_2mL.wells()[:len(batch)]
+        if elution_plate:
+            if eluates_collected[0] + batch_samples > 96:
+                protocol.pause('Replace the full collection plate in slot {} with an empty 96-well deep-well plate.'.format(
+                    layout['collection_plate']))
+                eluates_collected[0] = 0
+            eluate_wells = collection_plate.wells()[eluates_collected[0]:eluates_collected[0] + batch_samples]
+            eluates_collected[0] += batch_samples
+        else:
+            eluate_wells = tuberack_2mL.wells()[len(batch):len(batch) + batch_samples]
+        if b > 0:
+            if checkpoint.pending('new plate'):
+                protocol.pause('Batch {} of {}: place a fresh plate on the magnetic module, load {} into the first {} '
+                               'positions of the 2ml tube rack located in slot {}{}, top up {} (DMSO vortexed), and empty '
+                               'the waste tubes.'.format(b + 1, len(batches), ', '.join(sample_names[i] for i in batch), len(batch),
+                                                         layout['tuberack_2mL'],
+                                                         '' if elution_plate else ' with empty tubes after them for the eluates',
+                                                         ', '.join('{} to {}'.format(name, '{:g} mL'.format(reagent_volumes[key])
+                                                                                     if key in reagent_volumes else reagents.amount(name))
+                                                                   for key, name in (('beads', 'beads'), ('ACN', 'ACN'), ('DMSO', '2% DMSO')))))
+                beads_sp3.new_plate()
+                levels.topped_up()
+                checkpoint.complete()
+        else:
+            reagents.start([
+                'Ensure the sample tubes are in the 2ml tube rack located in slot {}: {}.'.format(layout['tuberack_2mL'],
+                    ', '.join('{} in {}'.format(sample_names[i], tube.well_name) for i, tube in zip(batch, samples)))
+                if sample_manifest else None,
+            ])
+
+        # Transfer defined mass of peptide from sample to the plate on magnetic module
+        if checkpoint.pending('sample loading'):
+            protocol.comment('Stage: sample loading')
+            tips.ensure({p300: len(samples)}, 'sample loading')
+            for i in checkpoint.each('sample', range(len(samples)), name=lambda i: samples[i].well_name):
+                first_well = starting_mag_well + sum(sample_replicates[j] for j in batch[:i])
+                p300.flow_rate.aspirate = p300_aspirate_slow
+                p300.flow_rate.dispense = p300_aspirate_slow
+                p300.transfer(
+                    transfer_vol_peptides,
+                    samples[i],
+                    mag_plate.wells()[first_well:first_well + sample_replicates[batch[i]]],
+                    touch_tip=True,
+                    new_tip='once',
+                    blow_out=True,
+                    blowout_location='destination well'
+                )
+            checkpoint.complete()
+
+        p300.flow_rate.aspirate = p300_aspirate_default
+        p300.flow_rate.dispense = p300_aspirate_default
+
+        # Transfer beads, then ACN to the tubes with peptide samples
+        if checkpoint.pending('bead addition'):
+            protocol.comment('Stage: bead addition')
+            tips.ensure({p_small: batch_samples}, 'bead addition', reagents.prompt('beads',
+                        'Ensure prepared beads have been loaded into A6 of the 2ml tube rack located in slot {} prior to resuming protocol.'.format(
+                            layout['tuberack_2mL'])) if b == 0 else None)
+            p_small.flow_rate.aspirate = p50_aspirate_default
+            p_small.flow_rate.dispense = p50_aspirate_default
+
+            # Mixing beads. Change p50 to p20 if needed
+            for well in checkpoint.each('beads', batch_wells):
+                p_small.transfer(
+                    volume_of_beads,
+                    beads,
+                    well,
+                    mix_before=(5, 50),
+                    mix_after=(5, 50),
+                    new_tip='always',
+                    touch_tip=True,
+                    blow_out=True,
+                    blowout_location='destination well'
+                )
+            checkpoint.complete()
+
+        beads_sp3.full_columns = beads_sp3.columns_of(starting_mag_well, batch_samples)
+        if beads_sp3.full_columns:
+            beads_sp3.load_reservoir(multi_reagents)
+
+        # the binding is the first step to draw ACN, so the caps come off before it
+        beads_sp3.wash(volume_of_ACN, ACN, batch_wells, 'ACN binding', mixes=5, interval_min=bead_mix_interval_min,
+                       top_dispense=True, touch_tip=True,
+                       pause=reagents.prompt('ACN', 'make sure ACN tube caps are off') if b == 0 else None)
+
+        # # Wash beads with 1mL ACN
+        beads_sp3.wash(1000, ACN, batch_wells, 'ACN wash', mixes=1, top_dispense=True, dry_seconds=60)
+
+        # # Peptide elution
+        # Transfer 2% DMSO to samples, then move the eluates off the beads to new tubes on the 2mL tube rack, or to
+        # the collection plate, through spare mag-plate wells or with single_hop_elution straight
+        beads_sp3.elute(volume_of_DMSO, DMSO, batch_wells, eluate_wells, 'DMSO elution', mixes=4,
+                        interval_min=bead_mix_interval_min, premix=(3, 100), direct=single_hop_elution,
+                        bottom_mm=elution_bottom_mm, settle_minutes=elution_settle_min,
+                        pause=reagents.prompt('2% DMSO', 'vortex DMSO again and open caps.') if b == 0 else None)
+
+    beads_sp3.report_trips()
+    tips.save()
 
     # Final check to disengage magnetic module if it hasn't disengaged
     if mag_deck.status == 'engaged':
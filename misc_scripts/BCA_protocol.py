@@ -1,5 +1,7 @@
 from opentrons import protocol_api
 
+from protocol_lib.plate_map import log_plate_map, plate_map
+
 metadata = {
     'protocolName': 'BCA Protocol Practice',
     'author': 'Cody',
@@ -11,16 +13,21 @@ metadata = {
 def run(protocol: protocol_api.ProtocolContext):
 
     # | --------- Customize --------- |
-    num_samples = 3  # If dilution is required, dilute the samples prior to loading on the robot
-    num_standards = 9
+    num_samples = 3  # If dilution is required, dilute the samples prior to loading on the robot; up to a full plate
+    standard_concentrations = [2000, 1500, 1000, 750, 500, 250, 125, 25, 0]  # ug/mL of the BSA standards, in tube order from A1 of the 2ml tube rack
     volume_standard: float = 25.0
     volume_sample: float = 25.0
     volume_WR: float = 200
     replicates_standards = 3
     replicates_samples = 3
-    total_samples = num_standards * replicates_standards + num_samples * replicates_samples
     starting_tip_p50 = 'E2'  # change if full tip rack will not be used
     starting_tip_p300 = 'B1'  # change if full tip rack will not be used
+    plate_map_file = ''  # optional path on the robot to write the plate map to as CSV (well, kind, name, concentration), for python -m protocol_tools.bca
+
+    num_standards = len(standard_concentrations)
+    total_samples = num_standards * replicates_standards + num_samples * replicates_samples
+    if total_samples > 96:
+        raise Exception('The standards and samples need {} wells; the plate has 96.'.format(total_samples))
 
     # | --------- Tip Racks --------- |
     tiprack_50 = protocol.load_labware('opentrons_96_tiprack_300ul', 1)
@@ -36,17 +43,33 @@ def run(protocol: protocol_api.ProtocolContext):
     plate_96_well = protocol.load_labware('nest_96_wellplate_200ul_flat', 3)
     tuberack_2ml = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', 4)
     tuberack_15ml_50ml = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', 5)
+    # samples that do not fit next to the standards go on to a second 2ml tube rack in slot 6
+    tubes = tuberack_2ml.wells()
+    second_rack = num_standards + num_samples > len(tubes)
+    if second_rack:
+        tubes = tubes + protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', 6).wells()
 
     # | --------- Reagents --------- |
     WR_15 = tuberack_15ml_50ml['A1']
     WR_50 = tuberack_15ml_50ml['A3']
     # if more than 15mL of working reagent is needed, use WR_50 located in A3. Change code on line 46 to WR_50.
 
+    # | --------- Plate map --------- |
+    # Standards, then samples, each in consecutive wells down the plate's columns
+    plate_rows = plate_map([('standard', 'standard {}'.format(std + 1), concentration, replicates_standards)
+                            for std, concentration in enumerate(standard_concentrations)]
+                           + [('sample', 'sample {}'.format(sample + 1), None, replicates_samples) for sample in range(num_samples)],
+                           plate_96_well.wells())
+    log_plate_map(protocol, plate_rows, plate_map_file)
+    if second_rack:
+        protocol.pause('Place samples {} onwards in the second 2ml tube rack located in slot 6, from A1.'.format(
+            len(tuberack_2ml.wells()) - num_standards + 1))
+
     #transfer standards to well plate
     for std in range(num_standards):
         p50.distribute(
             volume_standard,
-            tuberack_2ml.wells()[std],
+            tubes[std],
             plate_96_well.wells()[(std * replicates_standards) :
                                   (std * replicates_standards) + replicates_standards],
             touch_tip=True,
@@ -59,7 +82,7 @@ def run(protocol: protocol_api.ProtocolContext):
     for sample in range(num_samples):
         p50.distribute(
             volume_sample,
-            tuberack_2ml.wells()[sample + num_standards], #this tells where to pick up the sample in 2.0mL tube rack
+            tubes[sample + num_standards], #this tells where to pick up the sample in 2.0mL tube rack
             plate_96_well.wells()[(sample * replicates_samples) + (num_standards * replicates_standards):
                                   (sample * replicates_samples) + (num_standards * replicates_standards) + replicates_samples],
             touch_tip=True,
@@ -69,15 +92,23 @@ def run(protocol: protocol_api.ProtocolContext):
         )
 
     # transfer working reagent to the well plate
+    wr_wells = plate_96_well.wells()[:total_samples]
     p300.pick_up_tip()
-    for well in plate_96_well.wells()[:total_samples]:
-       p300.transfer(
-           volume_WR,
-           WR_50,
-           well.top(),
-           blow_out = True,
-           blowout_location = 'destination well',
-           new_tip='never',
-        )
+    # The tip never touches the wells while dispensing at their tops, so every trip fills it and is spread over
+    # as many wells as it reaches, a well's reagent split over two trips where it straddles them: at 200 uL per
+    # well that is two trips for every three wells. Each trip is blown out, as there is no disposal volume.
+    remaining = [volume_WR] * len(wr_wells)
+    i = 0
+    while i < len(wr_wells):
+        load = min(p300.max_volume, sum(remaining[i:]))
+        p300.aspirate(load, WR_50)
+        while load > 0.01:
+            portion = min(load, remaining[i])
+            p300.dispense(portion, wr_wells[i].top())
+            load -= portion
+            remaining[i] -= portion
+            if remaining[i] < 0.01:
+                i += 1
+        p300.blow_out()
     p300.drop_tip()
     protocol.comment('Incubate plate at 37C for 30 minutes prior to measuring absorbance at 562nm.')
@@ -0,0 +1,9 @@
+"""Stages shared by the digestion protocol scripts.
+
+The scripts import from here; ``python -m protocol_tools.bundle`` inlines the
+modules they use into a single file the Opentrons App accepts.
+
+Every stage of a run starts with a ``protocol.comment('Stage: <name>')``; the
+comment shows in the run log and ``python -m protocol_tools.profiler`` splits
+the command stream at it.
+"""
@@ -0,0 +1,540 @@
+"""SP3 bead steps on the deep-well plate of the magnetic module: binding, washes and elution.
+
+Full plate columns can go to a p300 8-channel, and volumes the p300 cannot move in one trip to a p1000; either holds
+the left mount in place of the p50 for the whole run.
+"""
+
+import math
+
+from protocol_lib.checkpoint import Checkpoint
+from protocol_lib.liquid import LiquidLevels
+from protocol_lib.schedule import MOVE_SECONDS, TIP_SECONDS, ProtocolClock, Task, mix_seconds, run_tasks
+from protocol_lib.tipracks import TipInventory
+
+
+class BeadWorkflow:
+    """The reagent additions, bead mixing and supernatant removals of an SP3 protocol.
+
+    Keeps the state the steps share: the pipettes working on the mag plate, the reservoir of the 8-channel, how
+    full each waste tube is, parked tips when ``reuse_tips`` is set and when each well was last mixed.
+
+    With ``reuse_tips`` a tip is parked in its rack slot between uses and only ever goes back into the well it came
+    from. How long it is kept depends on what it did:
+
+    - 'sample' - touched the sample (adding reagent, mixing beads): kept until the next reagent goes in
+    - 'waste' - only took supernatant out: kept for every later wash of that well
+
+    Dispensing at the top of the wells never touches sample; ``batch_reagent_additions`` uses one tip for all of them.
+
+    Every wash and elution is a ``checkpoint`` step, and so is each well's reagent addition, mix and supernatant
+    removal within it; the waste, reservoir and parked tips are saved with the checkpoint. Each of them starts by
+    making sure the racks of the p300 hold the ``tips`` it needs.
+    """
+
+    well_ul_per_mm = 67.0  # liquid per mm of height in the 8.2 mm square wells of the deep-well plate
+    settle_volume = 200.0  # supernatant over the bead pellet that is only aspirated slowly, from the bottom of the well
+    waste_tube_capacity = 45000.0  # uL of supernatant per 50 mL waste tube
+    reservoir_well_volume = 14000.0  # uL usable in each well of the 12-well reservoir
+    magnet_minutes = 2  # time on the engaged magnet before supernatant is removed
+    tip_lifetime = {'sample': 'step', 'waste': 'run'}
+
+    def __init__(self, protocol, p300, mag_deck, mag_plate, waste_tubes, aspirate_slow, aspirate_default, aspirate_fast,
+                 reuse_tips=False, batch_reagent_additions=False, use_p300_multi=False, mix_repetitions=5,
+                 touch_tip_after_mix=False, checkpoint=None, tips=None, levels=None):
+        self.protocol = protocol
+        self.p300 = p300
+        self.mag_deck = mag_deck
+        self.mag_plate = mag_plate
+        self.waste_tubes = waste_tubes  # 50 mL supernatant waste tubes, filled in this order
+        self.aspirate_slow = aspirate_slow  # near the bead pellet
+        self.aspirate_default = aspirate_default
+        self.aspirate_fast = aspirate_fast  # the bulk of the supernatant, well above the beads
+        self.reuse_tips = reuse_tips
+        self.batch_reagent_additions = batch_reagent_additions
+        self.use_p300_multi = use_p300_multi
+        self.mix_repetitions = mix_repetitions
+        self.touch_tip_after_mix = touch_tip_after_mix
+
+        self.p300_multi = None
+        self.p1000 = None
+        self.full_columns = []  # mag-plate columns the 8-channel handles
+        self.reservoir_plan = {}  # reagent -> reservoir wells it is loaded into
+        self.reservoir_drawn = {}  # reagent -> uL drawn from its reservoir wells so far
+        self.left_tips_used = 0  # tips taken from the racks of the 8-channel or the p1000 since they were last filled
+        self.waste_filled = {}  # waste tube -> uL of supernatant discarded into it so far
+        self.last_mixed = {}  # clock time of the latest mix of each well, used to space out bead mixing
+        self.parked_tips = {}  # (role, pipette name, well) -> rack slot of the parked tip
+        self.trip_counts = {}  # phase -> trips (aspirations) per phase
+        self.clock = ProtocolClock(protocol)
+        self.checkpoint = checkpoint or Checkpoint()
+        self.checkpoint.add_state('beads', self._state, self._put_state)
+        self.tips = tips or TipInventory(protocol)
+        self.levels = levels or LiquidLevels(protocol)  # the single channels draw reagents from below the liquid surface
+
+    # | --------- deck --------- |
+    def load_multi(self, tip_rack_slots, reservoir_slot=8, waste_slot=9):
+        """Loads the 8-channel on the left mount, where it stays for the run, and what it needs. A tube cannot take 8
+        tips at once, so it draws reagents from a 12-well reservoir and discards supernatant into a 1-well reservoir."""
+        self.reservoir_slot = reservoir_slot
+        self.waste_slot = waste_slot
+        multi_tip_racks = [self.protocol.load_labware('opentrons_96_tiprack_300ul', slot) for slot in tip_rack_slots]
+        self.reservoir = self.protocol.load_labware('nest_12_reservoir_15ml', reservoir_slot)
+        self.waste_multi = self.protocol.load_labware('nest_1_reservoir_195ml', waste_slot)['A1']
+        self.p300_multi = self.protocol.load_instrument('p300_multi', 'left', tip_racks=multi_tip_racks)
+
+    def load_p1000(self, tip_rack_slot=11):
+        """Loads the p1000 on the left mount, where it stays for the run, with its 1000 uL tip rack."""
+        tip_racks = [self.protocol.load_labware('opentrons_96_tiprack_1000ul', tip_rack_slot)]
+        self.p1000 = self.protocol.load_instrument('p1000_single', 'left', tip_racks=tip_racks)
+
+    def columns_of(self, first_well, count):
+        """Mag-plate columns completely filled by count wells from first_well, if the 8-channel is used."""
+        wells = range(first_well, first_well + count)
+        return [col for col in range(12) if all(col * 8 + row in wells for row in range(8))] if self.use_p300_multi else []
+
+    def plan_reservoir(self, reagents, columns):
+        """Reservoir wells each of ``reagents`` ((reagent, name, uL per mag-plate well) each) is loaded into."""
+        plan = {}
+        for reagent, _, vol in reagents:
+            # every reservoir well keeps one 8-channel tip-full in reserve so a draw never spans two wells
+            used = sum(len(wells) for wells in plan.values())
+            needed = math.ceil(len(columns) * 8 * vol / (self.reservoir_well_volume - 8 * 300))
+            plan[str(reagent)] = self.reservoir.wells()[used:used + needed]
+        if sum(len(wells) for wells in plan.values()) > 12:
+            raise Exception("The 12-well reservoir cannot hold the {} needed for the 8-channel columns.".format(
+                ' and '.join(name for _, name, _ in reagents)))
+        return plan
+
+    def use_waste_tubes(self, supernatant, wells, rack_slot=5):
+        """Keeps the waste tubes that wells wells of supernatant uL each need, asking for them when that is more than
+        one. ``rack_slot`` is the slot of their 15mL_50mL tube rack."""
+        needed = math.ceil(supernatant * 1.1 * wells / self.waste_tube_capacity)
+        if needed > len(self.waste_tubes):
+            raise Exception("The supernatant of that many samples does not fit in the waste tubes of the 15mL_50mL tube rack.")
+        self.waste_tubes = self.waste_tubes[:needed]
+        if len(self.waste_tubes) > 1:
+            self.protocol.pause('Place empty 50 mL waste tubes in {} of the 15mL_50mL tube rack located in slot {} prior to resuming protocol.'.format(
+                ', '.join(tube.well_name for tube in self.waste_tubes), rack_slot))
+
+    def new_plate(self):
+        """Forgets the waste, mixing and parked tips of the previous plate; the waste tubes have been emptied."""
+        self.waste_filled.clear()
+        self.last_mixed.clear()
+        self.parked_tips.clear()
+
+    def _state(self):
+        labware = self.protocol.loaded_labwares
+        return {
+            'waste_filled': self.waste_filled,
+            'reservoir_drawn': self.reservoir_drawn,
+            'left_tips_used': self.left_tips_used,
+            'trip_counts': self.trip_counts,
+            'parked_tips': [list(key) + [next(slot for slot, rack in labware.items() if rack is tip.parent), tip.well_name]
+                            for key, tip in self.parked_tips.items()],
+        }
+
+    def _put_state(self, state):
+        labware = self.protocol.loaded_labwares
+        self.waste_filled = state['waste_filled']
+        self.reservoir_drawn = state['reservoir_drawn']
+        self.left_tips_used = state['left_tips_used']
+        self.trip_counts = state['trip_counts']
+        self.parked_tips = {(role, pipette, well): labware[int(slot)][tip]
+                            for role, pipette, well, slot, tip in state['parked_tips']}
+
+    def load_reservoir(self, reagents):
+        """Pauses for the reservoir of the 8-channel to be loaded with ``reagents`` for the full columns and for its
+        waste reservoir to be emptied. The pause is a ``checkpoint`` step, so a resumed run does not ask again."""
+        self.reservoir_plan = self.plan_reservoir(reagents, self.full_columns)
+        if self.checkpoint.pending('reservoir'):
+            self.reservoir_drawn = {}
+            self.protocol.pause('Load the 12-well reservoir in slot {} with '.format(self.reservoir_slot)
+                                + ', '.join('{:.1f} mL {} in each of {}'.format(
+                                    len(self.full_columns) * 8 * vol / len(self.reservoir_plan[str(reagent)]) / 1000 + 1, name,
+                                    ', '.join(well.well_name for well in self.reservoir_plan[str(reagent)]))
+                                    for reagent, name, vol in reagents)
+                                + ' and place the empty 1-well waste reservoir in slot {}.'.format(self.waste_slot))
+            self.checkpoint.complete()
+
+    # | --------- pipettes, tips and sources --------- |
+    def mag_targets(self, wells):
+        """Full columns of the mag plate go to the 8-channel, addressed by their row-A well; wells of partial
+        columns stay with the single-channel p300."""
+        if self.p300_multi is None:
+            return [(self.p300, well) for well in wells]
+        plate_wells = self.mag_plate.wells()
+        targets = []
+        for well in wells:
+            i = plate_wells.index(well)
+            if i // 8 not in self.full_columns:
+                targets.append((self.p300, well))
+            elif i % 8 == 0:
+                targets.append((self.p300_multi, well))
+        return targets
+
+    def reagent_source(self, pipette, reagent, vol):
+        """Where a pipette should aspirate vol (per channel) of a reagent from."""
+        if pipette is not self.p300_multi:
+            return self.levels.draw(reagent, vol)
+        size = self.reservoir_well_volume
+        drawn = self.reservoir_drawn.get(str(reagent), 0)
+        if drawn % size + vol * 8 > size:
+            drawn += size - drawn % size  # the rest of this reservoir well stays behind
+        self.reservoir_drawn[str(reagent)] = drawn + vol * 8
+        return self.reservoir_plan[str(reagent)][int(drawn // size)]
+
+    def bulk_pipette(self, pipette, vol):
+        """The p1000 takes over from the single-channel p300 for any volume the p300 cannot move in one trip."""
+        if pipette is self.p300 and self.p1000 is not None and vol > self.p300.max_volume - 10:
+            return self.p1000
+        return pipette
+
+    def plan_trips(self, pipette, vol, phase):
+        """Fewest equal trips that move vol when every trip also carries a 10 uL air gap, tallied per phase."""
+        trips = math.ceil(vol / (pipette.max_volume - 10))
+        self.trip_counts[phase] = self.trip_counts.get(phase, 0) + trips
+        return trips, vol / trips
+
+    def waste_for(self, pipette, vol):
+        """Where a pipette discards vol of supernatant: the 8-channel into its reservoir, the single channels into
+        the first waste tube with room left."""
+        if pipette is self.p300_multi:
+            return self.waste_multi
+        tube = next((tube for tube in self.waste_tubes if self.waste_filled.get(str(tube), 0) + vol <= self.waste_tube_capacity),
+                    self.waste_tubes[-1])
+        self.waste_filled[str(tube)] = self.waste_filled.get(str(tube), 0) + vol
+        return tube
+
+    def set_aspirate_rate(self, rate):
+        for pipette in (self.p300, self.p300_multi, self.p1000):
+            if pipette is not None:
+                pipette.flow_rate.aspirate = rate
+
+    def next_tip(self, pipette):
+        """The tip a pipette would pick up next by itself, so that a parked tip's slot is known."""
+        for rack in pipette.tip_racks:
+            tip = rack.next_tip(pipette.channels, pipette.starting_tip if pipette.starting_tip in rack.wells() else None)
+            if tip is not None:
+                return tip
+        return None
+
+    def pick_up_tip(self, pipette, tip=None):
+        """Picks up the given tip, or a fresh one, and returns its rack slot when tips are reused. The 8-channel and
+        the p1000 have fewer racks than they may need, and a step may need more tips than the racks of the p300 hold;
+        ask for fresh racks instead of running out mid-step."""
+        if tip is None:
+            if pipette is self.p300_multi or pipette is self.p1000:
+                if self.left_tips_used + pipette.channels > 96 * len(pipette.tip_racks):
+                    self.protocol.pause('Replace the empty {} tip racks with full ones, then click Resume.'.format(pipette.name))
+                    pipette.reset_tipracks()
+                    self.left_tips_used = 0
+                    for key in [key for key in self.parked_tips if key[1] == pipette.name]:
+                        del self.parked_tips[key]
+                self.left_tips_used += pipette.channels
+            elif not self.tips.left(pipette):
+                self.ensure_tips({pipette: 1}, 'rest of this step', None)
+            tip = self.next_tip(pipette) if self.reuse_tips else None
+        pipette.pick_up_tip(tip)
+        return tip
+
+    def get_tip(self, pipette, role, well):
+        """The parked tip for a role on a well if there is one, a fresh tip otherwise."""
+        return self.pick_up_tip(pipette, self.parked_tips.pop((role, pipette.name, str(well)), None))
+
+    def release_tip(self, pipette, tip, role, well):
+        """Parks the tip for later use on the same well when tips are reused, drops it otherwise."""
+        if self.reuse_tips and tip is not None:
+            self.parked_tips[(role, pipette.name, str(well))] = tip
+            pipette.return_tip()
+            # the tip tracker counts returned tips as fresh; keep parked tips out of other wells
+            column = next(column for column in tip.parent.columns() if tip in column)
+            for slot in column[column.index(tip):column.index(tip) + pipette.channels]:
+                slot.has_tip = False
+        else:
+            pipette.drop_tip()
+
+    def tips_needed(self, vol, wells, mixes=0, removal=True):
+        """Fresh tips the single-channel p300 takes to add vol of reagent to ``wells`` and mix them ``mixes`` times,
+        and with ``removal`` to remove the supernatant afterwards."""
+        wells = [well for pipette, well in self.mag_targets(wells) if pipette is self.p300]
+        if not wells:
+            return 0
+        adds = self.bulk_pipette(self.p300, vol) is self.p300
+        tips = len(wells) + self.batch_reagent_additions if adds else 0
+        if mixes:
+            # a reused tip stays with its well from the addition on
+            tips += (0 if adds else len(wells)) if self.reuse_tips else mixes * len(wells)
+        if removal and self.bulk_pipette(self.p300, vol * 1.1) is self.p300:
+            tips += len(wells)  # a parked waste tip may go with its rack
+        return tips
+
+    def ensure_tips(self, needs, phase, pause):
+        """Asks for the tip racks ``needs`` calls for, with ``pause``; tips parked in replaced racks are gone."""
+        replaced = self.tips.ensure(needs, phase, pause)
+        for key in [key for key, tip in self.parked_tips.items() if tip.parent in replaced]:
+            del self.parked_tips[key]
+
+    def end_step(self):
+        """A new reagent goes in, so tips that touched the samples are not used again."""
+        for key in [key for key in self.parked_tips if self.tip_lifetime[key[0]] == 'step']:
+            del self.parked_tips[key]
+
+    # | --------- steps --------- |
+    def reagent_transfer(self, vol, reagent, wells, phase, top_dispense=False, premix=None):
+        """Resuspends the beads of every well in vol of reagent.
+
+        ``top_dispense`` dispenses above the liquid. ``premix`` ((repetitions, uL)) mixes the reagent before it is
+        drawn, and then the tip is touched off after every draw, for reagents that settle or cling to the tip.
+        """
+        targets = [(self.bulk_pipette(pipette, vol), well) for pipette, well in self.mag_targets(wells)]
+        # a step of its own, so that a resumed run keeps the tips parked since
+        if self.checkpoint.pending('end of previous step'):
+            self.end_step()
+            self.checkpoint.complete()
+        if self.batch_reagent_additions:
+            # The tip never touches the samples while dispensing at the top of the wells, so one tip (set) per
+            # pipette fills all of its wells, carrying as much reagent per trip as fits next to the air gap.
+            # Each well is then mixed with its own tip.
+            for pipette in (self.p300_multi, self.p1000, self.p300):
+                pipette_wells = [well for p, well in targets if p is pipette]
+                if not pipette_wells or not self.checkpoint.pending('{} {}'.format(phase, pipette.name)):
+                    continue
+                self.pick_up_tip(pipette)
+                if premix:
+                    pipette.mix(premix[0], premix[1], self.reagent_source(pipette, reagent, 0))
+                remaining = [vol] * len(pipette_wells)
+                i = 0
+                while i < len(pipette_wells):
+                    load = min(pipette.max_volume - 10, sum(remaining[i:]))
+                    pipette.aspirate(load, self.reagent_source(pipette, reagent, load))
+                    self.trip_counts[phase] = self.trip_counts.get(phase, 0) + 1
+                    pipette.air_gap(10)
+                    gap = 10
+                    while load > 0.01:
+                        portion = min(load, remaining[i])
+                        pipette.dispense(portion + gap, pipette_wells[i].top())
+                        gap = 0
+                        load -= portion
+                        remaining[i] -= portion
+                        if remaining[i] < 0.01:
+                            i += 1
+                    pipette.blow_out()
+                pipette.drop_tip()
+                self.checkpoint.complete()
+            for pipette, well in self.checkpoint.each('mix in', targets, name=lambda target: target[1].well_name):
+                tip = self.get_tip(pipette, 'sample', well)
+                self._mix_in(pipette, well, vol, 10)
+                self.release_tip(pipette, tip, 'sample', well)
+            return
+        for pipette, well in self.checkpoint.each(phase, targets, name=lambda target: target[1].well_name):
+            # the air gap rides along on every trip; the tip is blown out once, after mixing
+            trips, trip_vol = self.plan_trips(pipette, vol, phase)
+            tip = self.get_tip(pipette, 'sample', well)
+            if premix:
+                pipette.mix(premix[0], premix[1], self.reagent_source(pipette, reagent, 0))
+            for _ in range(trips):
+                pipette.aspirate(trip_vol, self.reagent_source(pipette, reagent, trip_vol))
+                if premix:
+                    pipette.touch_tip()
+                pipette.air_gap(10)
+                pipette.dispense(trip_vol + 10, well.top() if top_dispense else well)
+            self._mix_in(pipette, well, vol, 10)
+            self.release_tip(pipette, tip, 'sample', well)
+
+    def _mix_in(self, pipette, well, vol, repetitions):
+        pipette.mix(repetitions, vol if vol < 300 else 300, well.bottom(1))
+        pipette.blow_out()
+        if self.touch_tip_after_mix:
+            pipette.touch_tip()
+        self.clock.work(mix_seconds(pipette, repetitions, min(vol, 300)))
+        self.last_mixed[str(well)] = self.clock.now()
+
+    def remove_supernatant(self, vol, phase, wells, touch_tip=False):
+        """Removes the supernatant from the wells into waste. vol is the liquid in the well; 10% more is aspirated.
+
+        The bulk is aspirated fast from just below the falling liquid surface, and only the last ``settle_volume``
+        slowly from the bottom of the well, so the bead pellet is not disturbed.
+        """
+        for pipette, well in self.checkpoint.each(phase, self.mag_targets(wells), name=lambda target: target[1].well_name):
+            pipette = self.bulk_pipette(pipette, vol * 1.1)
+            trips, trip_vol = self.plan_trips(pipette, vol * 1.1, phase)
+            tip = self.get_tip(pipette, 'waste', well)
+            left = vol
+            for _ in range(trips):
+                fast_vol = min(trip_vol, max(0, left - self.settle_volume))
+                if fast_vol > 0:
+                    pipette.flow_rate.aspirate = self.aspirate_fast
+                    pipette.aspirate(fast_vol, well.bottom(max(1, (left - fast_vol) / self.well_ul_per_mm - 1)))
+                if trip_vol > fast_vol:
+                    pipette.flow_rate.aspirate = self.aspirate_slow
+                    pipette.aspirate(trip_vol - fast_vol, well.bottom(1))
+                left -= trip_vol
+                pipette.air_gap(10)
+                waste = self.waste_for(pipette, trip_vol)
+                pipette.dispense(trip_vol + 10, waste.top())
+            if touch_tip:
+                pipette.touch_tip()
+            pipette.blow_out(waste)
+            self.release_tip(pipette, tip, 'waste', well)
+            pipette.flow_rate.aspirate = self.aspirate_default
+
+    def mix_wells(self, mix_vol, num_mixes, interval_min, wells):
+        """Mixes the resuspended beads to mimic mixing on a plate shaker.
+
+        Each well is mixed num_mixes times, no sooner than interval_min minutes after its previous mix. Wells are
+        mixed in the order they come due, so every well rests equally long and the robot only waits when no well
+        is due yet.
+        """
+        start = self.clock.now()
+        tasks = []
+        for pipette, well in self.mag_targets(wells):
+            previous = []
+            for _ in range(num_mixes):
+                previous = [Task('mix {}'.format(well.well_name), lambda pipette=pipette, well=well: self._mix_well(pipette, well, mix_vol),
+                                 after=previous, gap=interval_min * 60,
+                                 not_before=self.last_mixed.get(str(well), start) + interval_min * 60)]
+                tasks += previous
+        run_tasks(self.protocol, tasks, clock=self.clock)
+
+    def _mix_well(self, pipette, well, mix_vol):
+        if not self.checkpoint.pending('mix ' + well.well_name):
+            return
+        tip = self.get_tip(pipette, 'sample', well)
+        pipette.mix(self.mix_repetitions, mix_vol if mix_vol < 300 else 300, well.bottom(1))
+        pipette.blow_out()
+        pipette.touch_tip()
+        self.release_tip(pipette, tip, 'sample', well)
+        # to the tip rack, the well and the trash
+        self.clock.work(TIP_SECONDS + 3 * MOVE_SECONDS + mix_seconds(pipette, self.mix_repetitions, min(mix_vol, 300)))
+        self.last_mixed[str(well)] = self.clock.now()
+        self.checkpoint.complete()
+
+    def pellet(self, minutes=None):
+        """Engages the magnet and waits ``minutes``, by default ``magnet_minutes``, for the beads to pellet."""
+        minutes = self.magnet_minutes if minutes is None else minutes
+        self.mag_deck.engage()
+        self.clock.delay(minutes=minutes, msg='Incubating on magnet for {} minutes.'.format(minutes))
+
+    def wash(self, vol, reagent, wells, phase, mixes=0, interval_min=0, top_dispense=False, touch_tip=False, dry_seconds=0,
+             pause=None):
+        """Adds vol of reagent to the beads, mixes them, pellets them on the magnet and removes the supernatant.
+
+        Binding and every wash of the SP3 protocols are this step. ``touch_tip`` touches off the tip that removed
+        the supernatant; ``dry_seconds`` lets the pellet dry on the magnet afterwards. The step starts with
+        ``pause``, if given, which also asks for any tip racks the step needs.
+        """
+        if not self.checkpoint.pending(phase):
+            return
+        self.protocol.comment('Stage: ' + phase)
+        self.ensure_tips({self.p300: self.tips_needed(vol, wells, mixes)}, phase, pause)
+        if self.mag_deck.status == 'engaged':
+            self.mag_deck.disengage()
+        self.reagent_transfer(vol, reagent, wells, phase, top_dispense=top_dispense)
+        self.mix_wells(vol, mixes, interval_min, wells)
+        self.pellet()
+        self.protocol.comment('Stage: ' + phase + ' supernatant')
+        self.remove_supernatant(vol, phase + ' supernatant', wells, touch_tip=touch_tip)
+        if dry_seconds:
+            self.clock.delay(seconds=dry_seconds, msg='Delaying for {} seconds to allow residual liquid to evaporate.'.format(
+                dry_seconds))
+        self.mag_deck.disengage()
+        self.checkpoint.complete()
+
+    def elute(self, vol, reagent, wells, eluate_wells, phase, mixes, interval_min, premix=None, pause=None, direct=False,
+              bottom_mm=1.0, settle_minutes=None):
+        """Elutes the beads in vol of reagent and moves the eluates off the beads into ``eluate_wells``.
+
+        The eluate first goes to the empty mag-plate wells after ``wells``, still on the magnet, so beads carried
+        along settle out before it moves on. With ``direct`` it goes straight to ``eluate_wells`` instead, with one
+        tip per well: after ``settle_minutes`` on the magnet (``magnet_minutes`` if not given) it is drawn slowly
+        in two steps that follow the liquid down and stop ``bottom_mm`` above the bottom of the well, clear of the
+        pellet. The step starts with ``pause``, as ``wash`` does.
+        """
+        if not self.checkpoint.pending(phase):
+            return
+        self.protocol.comment('Stage: ' + phase)
+        if direct:
+            targets = self.direct_targets(wells, eluate_wells)
+            self.ensure_tips({self.p300: self.tips_needed(vol, wells, mixes, removal=False)
+                              + sum(pipette is self.p300 for pipette, _, _ in targets)}, phase, pause)
+        else:
+            # one tip per well for the eluate and another for its collection, unless the 8-channel moves the eluate
+            eluates = len(wells) if len(wells) % 8 else sum(pipette is self.p300 for pipette, _ in self.mag_targets(wells))
+            self.ensure_tips({self.p300: self.tips_needed(vol, wells, mixes, removal=False) + eluates + len(wells)},
+                             phase, pause)
+        if self.mag_deck.status == 'engaged':
+            self.mag_deck.disengage()
+        self.reagent_transfer(vol, reagent, wells, phase, premix=premix)
+        self.mix_wells(vol, mixes, interval_min, wells)
+        self.pellet(settle_minutes if direct else None)
+
+        if direct:
+            self.protocol.comment('Stage: ' + phase + ' eluate transfer')
+            self.set_aspirate_rate(self.aspirate_slow)
+            for pipette, mag_well, dest_well in self.checkpoint.each('eluate', targets,
+                                                                      name=lambda target: target[2].well_name):
+                self.pick_up_tip(pipette)
+                # the first half from below the surface, the rest down to the stop height
+                pipette.aspirate(vol / 2, mag_well.bottom(max(bottom_mm, vol / 2 / self.well_ul_per_mm)))
+                pipette.aspirate(vol / 2, mag_well.bottom(bottom_mm))
+                pipette.dispense(vol, dest_well)
+                pipette.blow_out(dest_well.top())
+                pipette.drop_tip()
+            self.set_aspirate_rate(self.aspirate_default)
+            self.mag_deck.disengage()
+            self.checkpoint.complete()
+            return
+
+        self.protocol.comment('Stage: ' + phase + ' eluate transfer')
+        plate_wells = self.mag_plate.wells()
+        # The 8-channel only moves whole columns when the eluate columns line up with the sample columns
+        self.set_aspirate_rate(self.aspirate_slow)
+        targets = self.mag_targets(wells) if len(wells) % 8 == 0 else [(self.p300, well) for well in wells]
+        for pipette, mag_well in self.checkpoint.each('eluate', targets, name=lambda target: target[1].well_name):
+            self.pick_up_tip(pipette)
+            pipette.transfer(
+                vol * 1.2,
+                mag_well.bottom(0.5),
+                plate_wells[plate_wells.index(mag_well) + len(wells)],
+                new_tip='never',
+                blow_out=True,
+                blowout_location='destination well'
+            )
+            pipette.drop_tip()
+        self.clock.delay(minutes=self.magnet_minutes,
+                         msg='Incubating on magnet for {} minutes to remove any residual beads in solution.'.format(
+                             self.magnet_minutes))
+
+        for well, dest_well in self.checkpoint.each('eluate collection', list(zip(wells, eluate_wells)),
+                                                    name=lambda pair: pair[1].well_name):
+            self.pick_up_tip(self.p300)
+            self.p300.transfer(
+                vol * 1.1,
+                plate_wells[plate_wells.index(well) + len(wells)],
+                dest_well,
+                new_tip='never',
+                blow_out=True,
+                blowout_location='destination well'
+            )
+            self.p300.drop_tip()
+        self.set_aspirate_rate(self.aspirate_default)
+        self.mag_deck.disengage()
+        self.checkpoint.complete()
+
+    def direct_targets(self, wells, eluate_wells):
+        """(pipette, mag-plate well, eluate well) of every eluate moved straight off the beads. The 8-channel takes
+        a full column only when its eluates fill one column of a 96-well plate, in the same order."""
+        targets = []
+        for pipette, well in self.mag_targets(wells):
+            i = wells.index(well)
+            dest = eluate_wells[i]
+            plate_wells = dest.parent.wells()
+            j = plate_wells.index(dest)
+            if pipette is self.p300 or len(plate_wells) == 96 and j % 8 == 0 and plate_wells[j:j + 8] == eluate_wells[i:i + 8]:
+                targets.append((pipette, well, dest))
+            else:
+                targets += [(self.p300, mag_well, eluate_wells[wells.index(mag_well)]) for mag_well in wells[i:i + 8]]
+        return targets
+
+    def report_trips(self):
+        self.protocol.comment('Trips per phase: ' + ', '.join('{} {}'.format(phase, trips) for phase, trips in self.trip_counts.items()))
@@ -0,0 +1,103 @@
+"""Progress of a run, saved after every step so that an aborted run can be started again where it stopped."""
+
+import json
+import os
+
+
+class Checkpoint:
+    """The completed steps, used tips and module states of a run, saved to ``path`` after every step.
+
+    Stages and the wells or tubes within them are steps. A step's key is its label under the step it is part of,
+    and labels met more than once under the same step are numbered, so a run with the same settings meets the same
+    keys. With ``resume`` the steps completed by the run that wrote ``path`` are skipped. Before the first step that
+    still has to run, the tip racks, ``modules`` and the state added with ``add_state`` are put back the way they
+    were after the last completed step. A step that was under way when the run stopped runs again in full.
+
+    Without a ``path`` every step runs and nothing is saved. Nothing is read or written while the protocol is
+    simulated, so the Opentrons App always simulates the whole run.
+    """
+
+    def __init__(self, protocol=None, path='', resume=False, modules=()):
+        self.protocol = protocol
+        self.path = path if path and not protocol.is_simulating() else ''
+        self.modules = list(modules)
+        self.states = {}  # name -> (get, put) of state that goes with the completed steps
+        self.done = set()
+        self.saved = None  # what to put back before the first step that still has to run
+        self.active = []  # keys of the steps under way, outermost first
+        self.counts = {}  # (enclosing step, label) -> times met
+        if self.path and resume:
+            if not os.path.exists(self.path):
+                raise Exception('resume is set, but there is no checkpoint file at {}.'.format(self.path))
+            with open(self.path) as f:
+                self.saved = json.load(f)
+            self.done = set(self.saved['done'])
+            protocol.comment('Resuming from {}: {} steps are complete.'.format(self.path, len(self.done)))
+
+    def add_state(self, name, get, put):
+        """Saves ``get()`` with every checkpoint and hands it to ``put`` when a run resumes."""
+        self.states[name] = (get, put)
+
+    def pending(self, label):
+        """Whether the step ``label`` still has to run. If it does, it is under way until ``complete()``."""
+        parent = self.active[-1] if self.active else ''
+        count = self.counts[(parent, label)] = self.counts.get((parent, label), 0) + 1
+        key = '{} > {}'.format(parent, label) if parent else label
+        if count > 1:
+            key += ' #{}'.format(count)
+        if key in self.done:
+            return False
+        if self.saved is not None:
+            self._restore(self.saved)
+            self.saved = None
+        self.active.append(key)
+        return True
+
+    def complete(self):
+        """Marks the step under way complete and saves the checkpoint."""
+        self.done.add(self.active.pop())
+        if self.path:
+            self._save()
+
+    def each(self, label, items, name=lambda item: item.well_name):
+        """The ``items`` whose step (``label`` and the item's ``name``) still has to run. Each one's step is
+        complete once the loop moves past it."""
+        for item in items:
+            if self.pending('{} {}'.format(label, name(item))):
+                yield item
+                self.complete()
+
+    def _save(self):
+        labware = self.protocol.loaded_labwares
+        checkpoint = {
+            'done': sorted(self.done),
+            'tips': {str(slot): [well.well_name for well in rack.wells() if not well.has_tip]
+                     for slot, rack in labware.items() if rack.is_tiprack},
+            'modules': [{'engaged': module.status == 'engaged'} if hasattr(module, 'engage') else {'target': module.target}
+                        for module in self.modules],
+            'states': {name: get() for name, (get, _) in self.states.items()},
+        }
+        # written next to the checkpoint and moved over it, so a run stopped mid-write leaves the last one intact
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _restore(self, saved):
+        labware = self.protocol.loaded_labwares
+        for slot, used in saved['tips'].items():
+            for name in used:
+                labware[int(slot)][name].has_tip = False
+        for module, state in zip(self.modules, saved['modules']):
+            if 'engaged' in state:
+                if state['engaged'] and module.status != 'engaged':
+                    module.engage()
+                elif not state['engaged'] and module.status == 'engaged':
+                    module.disengage()
+            elif state['target'] is None:
+                if module.target is not None:
+                    module.deactivate()
+            elif module.target != state['target']:
+                module.set_temperature(state['target'])
+        for name, (_, put) in self.states.items():
+            if name in saved['states']:
+                put(saved['states'][name])
@@ -0,0 +1,41 @@
+"""Deck layout: the slot of every labware and the rack position of every bulk tube."""
+
+MODULE_SLOTS = (1, 3, 4, 6, 7, 9, 10)  # OT-2 slots a module's cable reaches
+RACK_POSITIONS = (('A1', 'B1', 'C1', 'A2', 'B2', 'C2'), ('A3', 'B3', 'A4', 'B4'))  # 15 mL and 50 mL tubes of the 15mL_50mL rack
+
+
+def resolve_layout(defaults, overrides, modules=()):
+    """``defaults`` with ``overrides`` applied, and the problems found with them.
+
+    Slot entries (int) take a deck slot; tube entries (rack position) take a free position for a tube of the same
+    size. ``modules`` name the entries that are modules. Entries that share a slot in ``defaults`` are never loaded
+    in the same run and may keep sharing it; any other shared slot is a problem.
+    """
+    errors = []
+    unknown = sorted(name for name in overrides if name not in defaults)
+    if unknown:
+        errors.append('deck_layout has no entry named {}; it takes {}.'.format(', '.join(unknown), ', '.join(defaults)))
+    layout = dict(defaults)
+    layout.update((name, value) for name, value in overrides.items() if name in defaults)
+
+    for name, value in layout.items():
+        default = defaults[name]
+        if isinstance(default, int):
+            if name in modules and value not in MODULE_SLOTS:
+                errors.append('deck_layout: {} has to go in one of slots {}.'.format(
+                    name, ', '.join(str(slot) for slot in MODULE_SLOTS)))
+            elif value not in range(1, 12):
+                errors.append('deck_layout: {} has to go in one of slots 1 to 11, not {!r}.'.format(name, value))
+        else:
+            size = next(positions for positions in RACK_POSITIONS if default in positions)
+            if value not in size:
+                errors.append('deck_layout: {} is a {} mL tube and has to go in one of {} of the 15mL_50mL tube rack.'.format(
+                    name, 15 if size is RACK_POSITIONS[0] else 50, ', '.join(size)))
+
+    names = list(layout)
+    for i, name in enumerate(names):
+        for other in names[:i]:
+            if layout[name] == layout[other] and defaults[name] != defaults[other]:
+                errors.append('deck_layout: {} and {} are both in {}.'.format(
+                    other, name, 'slot {}'.format(layout[name]) if isinstance(layout[name], int) else layout[name]))
+    return layout, errors
@@ -0,0 +1,64 @@
+"""Liquid left in the bulk reagent tubes, so that the pipettes draw from just below its surface."""
+
+import math
+
+from protocol_lib.checkpoint import Checkpoint
+
+
+class LiquidLevels:
+    """The volume and liquid height of the bulk reagent tubes of the 15mL_50mL tube rack.
+
+    ``tubes`` lists every tracked tube with the mL loaded into it and the reagent's name. Each draw takes its volume
+    off the tube and aspirates ``submerge_mm`` below the level the liquid falls to, instead of at the tube bottom;
+    before a draw would leave less than ``reserve_ul``, the run pauses for the tube to be topped up again. Tubes that
+    are not tracked are drawn from at their bottom, as before. The volumes are saved with the ``checkpoint``.
+    """
+
+    submerge_mm = 3.0  # below the liquid surface, so the tip stays in liquid for the whole aspiration
+    bottom_mm = 1.0  # the default aspiration height above the bottom of a tube
+    reserve_ul = 500.0  # left in a tube so the tip never draws air
+    cone_mm = {15000.0: 22.0, 50000.0: 14.0}  # height of the conical bottom of the Falcon tubes, by tube volume
+
+    def __init__(self, protocol, tubes=(), rack_slot=5, checkpoint=None):
+        self.protocol = protocol
+        self.rack_slot = rack_slot
+        self.loaded = {}  # tube -> uL loaded
+        self.names = {}
+        for tube, ml, name in tubes:
+            if ml * 1000 > tube.max_volume:
+                raise Exception('The {} tube in {} holds at most {:g} mL, not {:g} mL.'.format(
+                    name, tube.well_name, tube.max_volume / 1000, ml))
+            self.loaded[str(tube)] = ml * 1000
+            self.names[str(tube)] = name
+        self.volumes = dict(self.loaded)  # tube -> uL left
+        (checkpoint or Checkpoint()).add_state('liquid', lambda: self.volumes, self._put_volumes)
+
+    def topped_up(self):
+        """The tracked tubes have been filled to their loaded volumes again."""
+        self.volumes = dict(self.loaded)
+
+    def _put_volumes(self, volumes):
+        self.volumes = volumes
+
+    def height(self, tube, volume):
+        """Height in mm of ``volume`` uL in ``tube``: a cone at the bottom, a cylinder above it."""
+        radius = tube.diameter / 2
+        cone = self.cone_mm.get(tube.max_volume, 0.0)
+        cone_volume = math.pi * radius ** 2 * cone / 3
+        if volume <= cone_volume:
+            return cone * (max(volume, 0.0) / cone_volume) ** (1 / 3)
+        return min(tube.depth, cone + (volume - cone_volume) / (math.pi * radius ** 2))
+
+    def draw(self, tube, vol):
+        """Where to aspirate ``vol`` uL from ``tube``: below the level the liquid falls to, or ``tube`` itself
+        when it is not tracked."""
+        key = str(tube)
+        if key not in self.volumes:
+            return tube
+        if self.volumes[key] - vol < self.reserve_ul:
+            self.protocol.pause('Top up the {} in {} of the 15mL_50mL tube rack located in slot {} to {:g} mL; '
+                                '{:.1f} mL is left.'.format(self.names[key], tube.well_name, self.rack_slot,
+                                                            self.loaded[key] / 1000, self.volumes[key] / 1000))
+            self.volumes[key] = self.loaded[key]
+        self.volumes[key] -= vol
+        return tube.bottom(max(self.bottom_mm, self.height(tube, self.volumes[key]) - self.submerge_mm))
@@ -0,0 +1,58 @@
+"""Sample manifests: one CSV or TSV row per sample, checked in one pass."""
+
+import csv
+import os
+
+
+def read_manifest(manifest, limits, rack_positions=None):
+    """The samples of ``manifest``, pasted text or the path of a file on the robot.
+
+    ``limits`` maps every numeric column to ``(type, low, high)``. Returns ``(samples, errors)``: ``samples`` maps
+    'sample', each column of ``limits`` and, given ``rack_positions``, 'position' to a list with one value per row,
+    ``None`` where a value cannot be used; ``errors`` describes every problem found. A manifest without the columns
+    raises ``ValueError``.
+    """
+    if os.path.isfile(manifest.strip()):
+        with open(manifest.strip()) as f:
+            manifest = f.read()
+    lines = [line for line in manifest.strip().splitlines() if line.strip()]
+    reader = csv.DictReader(lines, delimiter='\t' if lines and '\t' in lines[0] else ',')
+    rows = [{key.strip().lower(): (value or '').strip() for key, value in row.items() if key is not None} for row in reader]
+    columns = ['sample'] + list(limits)
+    missing = [column for column in columns if rows and column not in rows[0]]
+    if not rows or missing:
+        raise ValueError('Manifest needs a header row and one row per sample with the columns {}{}.'.format(
+            ', '.join(columns), '; missing ' + ', '.join(missing) if missing else ''))
+
+    errors = []
+    samples = {'sample': [row['sample'] or 'line {}'.format(line) for line, row in enumerate(rows, 2)]}
+    for column, (convert, low, high) in limits.items():
+        samples[column] = [_value(row, line, column, convert, low, high, errors) for line, row in enumerate(rows, 2)]
+    if rack_positions is not None:
+        samples['position'] = _positions([row.get('position', '').upper() for row in rows], rack_positions, errors)
+    return samples, errors
+
+
+def _value(row, line, column, convert, low, high, errors):
+    try:
+        value = convert(row.get(column, ''))
+    except ValueError:
+        errors.append('Manifest line {}: {} {!r} is not a valid number.'.format(line, column, row.get(column, '')))
+        return None
+    if not low <= value <= high:
+        errors.append('Manifest line {}: {} {} is outside {} to {}.'.format(line, column, value, low, high))
+        return None
+    return value
+
+
+def _positions(positions, rack_positions, errors):
+    """Rack positions of the rows; rows without one take the free positions in order."""
+    for line, position in enumerate(positions, 2):
+        if position and position not in rack_positions:
+            errors.append('Manifest line {}: position {} is not one of the sample positions {} to {} of the 2ml tube rack.'.format(
+                line, position, rack_positions[0], rack_positions[-1]))
+        elif position and positions.index(position) != line - 2:
+            errors.append('Manifest line {}: position {} is already taken by line {}.'.format(
+                line, position, positions.index(position) + 2))
+    free = [position for position in rack_positions if position not in positions]
+    return [position or (free.pop(0) if free else None) for position in positions]
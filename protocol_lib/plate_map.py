@@ -0,0 +1,31 @@
+"""What every well of an assay plate holds, for the run log and the analysis of the plate reader's export."""
+
+import csv
+
+FIELDS = ('well', 'kind', 'name', 'concentration')  # columns of the plate map file; concentration only for standards
+
+
+def plate_map(groups, wells):
+    """Rows of the plate map when every group (``(kind, name, concentration, replicates)``) fills the next of
+    ``wells`` with its replicates."""
+    rows = []
+    for kind, name, concentration, replicates in groups:
+        for well in wells[len(rows):len(rows) + replicates]:
+            rows.append({'well': well.well_name, 'kind': kind, 'name': name, 'concentration': concentration})
+    return rows
+
+
+def log_plate_map(protocol, rows, path=''):
+    """Writes the plate map to the run log, a line per group, and with a ``path`` as CSV to that file. Nothing is
+    written to the file while the protocol is simulated."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['kind'], row['name'], row['concentration']), []).append(row['well'])
+    for (kind, name, concentration), wells in groups.items():
+        protocol.comment('Plate map: {}{} in {}.'.format(
+            name, '' if concentration is None else ' ({:g} ug/mL)'.format(concentration), ', '.join(wells)))
+    if path and not protocol.is_simulating():
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,79 @@
+"""Reagent volumes a run draws, worked out before anything moves, and the pauses that ask for them."""
+
+import math
+
+from protocol_lib.liquid import LiquidLevels
+
+
+class ReagentPlan:
+    """Every reagent tube of a run and the volume to load into it.
+
+    Each step's draws are booked with ``add`` before the run starts; ``volume`` adds what the tube keeps below the
+    reach of the tip, rounded up to 10 uL. With ``preload`` the run asks for every reagent in one pause at the start
+    (``start``), and ``prompt`` drops the pauses that would ask for them one by one later on, so the robot can run
+    unattended from there. Without it, ``prompt`` adds the volume to those pauses. A ``fresh`` reagent, such as
+    trypsin that should not stand at room temperature through the run or IAA that is light-sensitive and made just
+    before use, is only named in that first pause and still asked for when it is added.
+    """
+
+    tube_dead_ul = 20.0  # uL a 2 mL tube keeps; bulk tubes keep LiquidLevels.reserve_ul
+
+    def __init__(self, protocol, preload=False):
+        self.protocol = protocol
+        self.preload = preload
+        self.reagents = {}  # name -> [tube, description of its rack, uL drawn]
+        self.fresh = set()  # reagents asked for when they are added, even with preload
+        self.asked = set()  # reagents asked for so far; later batches draw from the same tube
+
+    def add(self, name, tube, ul, rack, fresh=False):
+        """Books ``ul`` drawn from ``tube`` of ``rack`` (e.g. 'the 2ml tube rack located in slot 4')."""
+        self.reagents.setdefault(name, [tube, rack, 0.0])[2] += ul
+        if fresh:
+            self.fresh.add(name)
+
+    def volume(self, name):
+        tube, _, ul = self.reagents[name]
+        dead = LiquidLevels.reserve_ul if tube.max_volume > 2000 else self.tube_dead_ul
+        return math.ceil((ul + dead) / 10) * 10
+
+    def amount(self, name):
+        ul = self.volume(name)
+        return '{:g} uL'.format(ul) if ul < 1000 else '{:.1f} mL'.format(math.ceil(ul / 100) / 10)
+
+    def describe(self, name):
+        tube, rack, _ = self.reagents[name]
+        return '{} {} in {} of {}{}'.format(self.amount(name), name, tube.well_name, rack,
+                                            ' (more than the tube holds; top it up as it runs low)'
+                                            if self.volume(name) > tube.max_volume else '')
+
+    def start(self, notes=()):
+        """The pauses before the first step: the ``notes`` for the operator, each on its own, or with ``preload``
+        one pause with the notes and every reagent to load."""
+        notes = [note for note in notes if note]
+        if self.preload and self.reagents:
+            loaded = [name for name in self.reagents if name not in self.fresh]
+            later = [name for name in self.reagents if name in self.fresh]
+            notes.append('Load {}, and open the caps of the reagent tubes.'.format(
+                '; '.join(self.describe(name) for name in loaded)))
+            if later:
+                notes.append('Have ready {}; the run asks for each when it is added.'.format(
+                    '; '.join(self.describe(name) for name in later)))
+            self.protocol.pause(' '.join(notes))
+            return
+        for note in notes:
+            self.protocol.pause(note)
+
+    def prompt(self, name, msg, volume=True):
+        """``msg`` asking for reagent ``name``, with the volume to load unless ``volume`` is False, or ``None`` when
+        it was loaded before the run or asked for already."""
+        if name in self.asked or self.preload and name in self.reagents and name not in self.fresh:
+            return None
+        self.asked.add(name)
+        if not volume or name not in self.reagents:
+            return msg
+        return '{}{} Load at least {}.'.format(msg, '' if msg.endswith('.') else '.', self.amount(name))
+
+    def pause(self, name, msg, volume=True):
+        msg = self.prompt(name, msg, volume)
+        if msg:
+            self.protocol.pause(msg)
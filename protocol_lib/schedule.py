@@ -0,0 +1,155 @@
+"""Dependency-ordered protocol work, interleaved on the gantry around waits that tie up no pipette.
+
+Both pipettes ride on the one gantry, so only one of them works at a time. What can overlap with pipetting is
+waiting: an incubation, or the rest a well needs between two mixes. ``run_tasks`` fills such waits with whatever
+work is ready and only lets the robot idle when nothing is.
+
+Times are read from a ``ProtocolClock``, which counts the delays the protocol issues and the planned duration of
+its work rather than the time of the computer it runs on, so the robot, the Opentrons App and protocol_tools all
+schedule the same work in the same order.
+"""
+
+TIP_SECONDS = 4.5  # picking up and dropping a tip
+MOVE_SECONDS = 1.0  # a move between two labware, lifting to the travel height and back down
+
+
+def mix_seconds(pipette, repetitions, volume):
+    """Planned seconds of mixing ``volume`` ``repetitions`` times in one place."""
+    return repetitions * (volume / pipette.flow_rate.aspirate + volume / pipette.flow_rate.dispense)
+
+
+def transfer_seconds(pipette, volume, trips=1, mix=None, tips=1):
+    """Planned seconds of moving ``volume`` from a source to a destination ``trips`` times with ``tips`` fresh tips,
+    and of a ``mix`` ((repetitions, uL)) on the way.
+
+    Only the plunger strokes, the tips and the moves between labware are counted, each at the least time it takes,
+    so the plan never runs ahead of the robot: a wait planned from it may run a little long on the robot but is
+    never cut short.
+    """
+    return (tips * TIP_SECONDS + 2 * (tips + trips) * MOVE_SECONDS + mix_seconds(pipette, trips, volume)
+            + (mix_seconds(pipette, *mix) if mix else 0))
+
+
+class ProtocolClock:
+    """Planned seconds into the protocol, for scheduling work around waits.
+
+    The clock counts the delays issued through ``delay`` and the planned seconds of the work in between, added with
+    ``work``. It never reads the time, so a run is scheduled the same on the robot as in any simulation of it.
+    """
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self.elapsed = 0.0
+
+    def now(self):
+        return self.elapsed
+
+    def work(self, seconds):
+        self.elapsed += seconds
+
+    def delay(self, seconds=0, minutes=0, msg=None):
+        self.protocol.delay(seconds=seconds + 60 * minutes, msg=msg)
+        self.elapsed += seconds + 60 * minutes
+
+
+class Task:
+    """One unit of work for ``run_tasks``.
+
+    ``action`` is called to do the work, with either pipette, which is planned to take ``duration`` seconds
+    (``transfer_seconds``). A task without an action is a wait of ``wait`` seconds, such as an incubation, which
+    ties up neither pipette; ``msg`` is shown while the robot idles on it.
+    A task starts once every task in ``after`` has finished, ``gap`` seconds after the last of them, and not
+    before the ``ProtocolClock`` time ``not_before``.
+    """
+
+    def __init__(self, name, action=None, duration=0, after=(), gap=0, wait=0, not_before=None, msg=None):
+        self.name = name
+        self.action = action
+        self.duration = duration
+        self.after = list(after)
+        self.gap = gap
+        self.wait = wait
+        self.not_before = not_before
+        self.msg = msg
+        self.start = None
+        self.finish = None
+
+    def ready_at(self):
+        """When the task may start, or None while a task it depends on has not started."""
+        if any(task.finish is None for task in self.after):
+            return None
+        times = [task.finish + self.gap for task in self.after]
+        if self.not_before is not None:
+            times.append(self.not_before)
+        return max(times, default=float('-inf'))
+
+
+def run_tasks(protocol, tasks, report=None, clock=None):
+    """Runs ``tasks`` in dependency order and returns their critical path.
+
+    Waits start as soon as they may and run in the background. Of the other tasks that may start, the one that
+    could start first goes first, ties in the given order; the robot only idles when none may start yet. Returns
+    once every wait has run out. With ``report`` the critical path is written to the run log under that name.
+    Times are read from ``clock``, a new ``ProtocolClock`` by default.
+    """
+    pending = list(tasks)
+    clock = clock or ProtocolClock(protocol)
+    now = clock.now()
+    while pending:
+        now = max(now, clock.now())
+        for task in [task for task in pending if task.action is None and task.ready_at() is not None
+                     and task.ready_at() <= now]:
+            task.start = now
+            task.finish = now + task.wait
+            pending.remove(task)
+        due = [(task.ready_at(), i, task) for i, task in enumerate(pending)
+               if task.action is not None and task.ready_at() is not None and task.ready_at() <= now]
+        if due:
+            task = min(due)[2]
+            task.start = now
+            task.action()
+            clock.work(task.duration)
+            now = max(now, clock.now())
+            task.finish = now
+            pending.remove(task)
+            continue
+        if not pending:
+            break
+        upcoming = [task.ready_at() for task in pending if task.ready_at() is not None]
+        if not upcoming:
+            raise ValueError('Tasks {} wait on tasks that are not scheduled.'.format(', '.join(task.name for task in pending)))
+        now = _idle(clock, tasks, now, min(upcoming))
+    _idle(clock, tasks, now, max((task.finish for task in tasks), default=now))
+
+    path = critical_path(tasks)
+    if report and path:
+        protocol.comment('Critical path of {}: {:.1f} of {:.1f} min, {}.'.format(
+            report, (path[-1].finish - path[0].start) / 60, (path[-1].finish - min(task.start for task in tasks)) / 60,
+            ' > '.join(task.name for task in path)))
+    return path
+
+
+def _idle(clock, tasks, now, until):
+    """Lets the robot wait until ``until``, showing the message of the wait it is held up by."""
+    if until <= now:
+        return now
+    running = [task for task in tasks if task.action is None and task.start is not None and task.finish > now]
+    msg = min(running, key=lambda task: task.finish).msg if running else None
+    clock.delay(seconds=until - now, msg=msg)
+    return until
+
+
+def critical_path(tasks):
+    """The chain of tasks that ended last: from the last task to finish, back through the dependency that held up
+    each task's start, as long as the task started as soon as that dependency let it."""
+    done = [task for task in tasks if task.finish is not None]
+    if not done:
+        return []
+    path = [max(done, key=lambda task: task.finish)]
+    while path[-1].after:
+        task = path[-1]
+        held_by = max(task.after, key=lambda dep: dep.finish)
+        if task.start > held_by.finish + task.gap + 1e-6:
+            break  # it waited for the gantry, not for its dependencies
+        path.append(held_by)
+    return path[::-1]
@@ -0,0 +1,88 @@
+"""Tips left in the tip racks of the p50 and p300, refilled between stages and carried over between runs."""
+
+import json
+import os
+
+
+class TipInventory:
+    """The tips left in the racks of ``pipettes``.
+
+    The tips before each pipette's ``starting_tip`` are marked as used up front. With a ``path`` the used tips of
+    every rack are read from there when the run starts and written back at the start of every stage, so the next run
+    carries on with the partial racks left on the deck instead of needing a ``starting_tip``. Delete the file when the
+    racks are replaced with full ones between runs. Nothing is read or written while the protocol is simulated.
+
+    Racks are refilled between stages, not when a pipette runs out: ``ensure`` asks for them before a stage that would
+    otherwise run out part-way, along with any pause the stage starts with. The pipettes ``BeadWorkflow`` loads on the
+    left mount in place of the p50 keep their own racks.
+    """
+
+    def __init__(self, protocol, pipettes=(), path=''):
+        self.protocol = protocol
+        self.names = [pipette.name for pipette in pipettes]
+        self.racks = [rack for pipette in pipettes for rack in pipette.tip_racks]
+        self.path = path if path and not protocol.is_simulating() else ''
+        for pipette in pipettes:
+            if pipette.starting_tip is not None:
+                for rack in pipette.tip_racks:
+                    if pipette.starting_tip in rack.wells():
+                        for well in rack.wells()[:rack.wells().index(pipette.starting_tip)]:
+                            well.has_tip = False
+                        break
+                    for well in rack.wells():
+                        well.has_tip = False
+                pipette.starting_tip = None
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                used = json.load(f)
+            for rack in self.racks:
+                for name in used.get(str(self._slot(rack)), []):
+                    rack[name].has_tip = False
+            protocol.comment('Tips left from the previous run, from {}: {}.'.format(self.path, ', '.join(
+                'slot {} {}'.format(self._slot(rack), sum(well.has_tip for well in rack.wells())) for rack in self.racks)))
+
+    def left(self, pipette):
+        """Tips the racks of ``pipette`` have left."""
+        return sum(well.has_tip for rack in pipette.tip_racks for well in rack.wells())
+
+    def ensure(self, needs, stage, msg=None):
+        """Pauses with ``msg`` before ``stage``, and in the same pause asks for full racks in place of the emptiest
+        ones of every pipette with fewer tips left than ``needs`` ({pipette: tips}) gives it for the stage.
+
+        Returns the racks replaced. A stage that needs more tips than all racks of a pipette hold gets them all
+        full and has to ask again part-way.
+        """
+        replaced = []
+        for pipette, need in needs.items():
+            if pipette.name not in self.names:
+                continue
+            short = need - self.left(pipette)
+            for rack in sorted(pipette.tip_racks, key=lambda rack: sum(well.has_tip for well in rack.wells())):
+                if short <= 0:
+                    break
+                if rack not in replaced:
+                    replaced.append(rack)
+                    short -= sum(not well.has_tip for well in rack.wells())
+        if replaced:
+            refill = 'Replace the empty and nearly empty tip racks in slot{} {} with full ones for the {}.'.format(
+                's' if len(replaced) > 1 else '', ', '.join(str(self._slot(rack)) for rack in replaced), stage)
+            msg = msg + ' ' + refill if msg else refill
+            for rack in replaced:
+                for well in rack.wells():
+                    well.has_tip = True
+        if msg:
+            self.protocol.pause(msg)
+        self.save()
+        return replaced
+
+    def save(self):
+        """Writes the used tips of every rack to ``path``."""
+        if not self.path:
+            return
+        used = {str(self._slot(rack)): [well.well_name for well in rack.wells() if not well.has_tip] for rack in self.racks}
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(used, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _slot(self, rack):
+        return next(slot for slot, labware in self.protocol.loaded_labwares.items() if labware is rack)
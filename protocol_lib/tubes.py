@@ -0,0 +1,187 @@
+"""Stages on the 2 mL digest tubes in the aluminum block of the temperature module.
+
+Change the 50 uL split and mix volumes to 20 if a p20 is used instead of the p50.
+"""
+
+from protocol_lib.checkpoint import Checkpoint
+from protocol_lib.reagents import ReagentPlan
+from protocol_lib.schedule import MOVE_SECONDS, TIP_SECONDS, Task, run_tasks, transfer_seconds
+from protocol_lib.tipracks import TipInventory
+
+
+def normalize_protein(p50, p300, abc, samples, digests, concentrations, mass=100.0, volume=100.0, checkpoint=None,
+                      levels=None):
+    """Puts ``mass`` ug of every sample into each of its digest tubes, made up to ``volume`` uL with ABC.
+
+    ``digests`` lists the tubes of every sample. The volumes and the pipette of every tube are worked out in one
+    pass; each pipette then adds all of its ABC from one tip, as the tubes are still empty, and moves its protein
+    with a fresh tip per tube, drawing the ABC from below the level it falls to if ``levels`` tracks it. The ABC of
+    each pipette and the protein of each tube are ``checkpoint`` steps. Without a ``p50`` the p300 moves every
+    volume.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    tubes = [tube for sample_tubes in digests for tube in sample_tubes]
+    sources = [sample for sample, sample_tubes in zip(samples, digests) for _ in sample_tubes]
+    protein_volumes, abc_volumes = _normalization_volumes(digests, concentrations, mass, volume)
+
+    for pipette in filter(None, (p300, p50)):
+        plan = [d for d, vol in enumerate(abc_volumes) if vol > 0 and _pipette_for(vol, p50, p300) is pipette]
+        if not plan or not checkpoint.pending('ABC ' + pipette.name):
+            continue
+        volumes = [abc_volumes[d] for d in plan]
+        source = levels.draw(abc, sum(volumes)) if levels else abc
+        # a multi-dispense only pays off when two tubes fit in one aspiration next to the disposal volume; it blows
+        # the disposal volume out into the source, so it draws from the tube itself rather than below the surface
+        if pipette.max_volume - pipette.min_volume >= 2 * max(volumes):
+            pipette.distribute(volumes, abc, [tubes[d] for d in plan], touch_tip=True, blow_out=True,
+                               blowout_location='source well')
+        else:
+            pipette.transfer(volumes, source, [tubes[d] for d in plan], touch_tip=True, blow_out=True,
+                             blowout_location='destination well')
+        checkpoint.complete()
+
+    for pipette in filter(None, (p300, p50)):
+        plan = [d for d, vol in enumerate(protein_volumes) if _pipette_for(vol, p50, p300) is pipette]
+        for d in checkpoint.each('protein', plan, name=lambda d: tubes[d].well_name):
+            pipette.transfer(
+                protein_volumes[d],
+                sources[d],
+                tubes[d],
+                mix_after=(3, 50),
+                new_tip='always',
+                touch_tip=True,
+                blow_out=True,
+                blowout_location='destination well'
+            )
+
+
+def normalization_tips(p50, p300, digests, concentrations, mass=100.0, volume=100.0):
+    """Tips ``normalize_protein`` takes, as {pipette: tips}."""
+    protein_volumes, abc_volumes = _normalization_volumes(digests, concentrations, mass, volume)
+    return {pipette: any(vol > 0 and _pipette_for(vol, p50, p300) is pipette for vol in abc_volumes)
+            + sum(_pipette_for(vol, p50, p300) is pipette for vol in protein_volumes) for pipette in filter(None, (p300, p50))}
+
+
+def normalization_seconds(p50, p300, digests, concentrations, mass=100.0, volume=100.0):
+    """Planned seconds ``normalize_protein`` takes (``schedule.transfer_seconds``)."""
+    protein_volumes, abc_volumes = _normalization_volumes(digests, concentrations, mass, volume)
+    abc = [(_pipette_for(vol, p50, p300), vol) for vol in abc_volumes if vol > 0]
+    return (sum(transfer_seconds(pipette, vol, tips=0) for pipette, vol in abc)
+            + (TIP_SECONDS + 2 * MOVE_SECONDS) * len({pipette for pipette, _ in abc})
+            + sum(transfer_seconds(_pipette_for(vol, p50, p300), vol, mix=(3, 50)) for vol in protein_volumes))
+
+
+def _pipette_for(vol, p50, p300):
+    return p300 if p50 is None or vol > 50 else p50
+
+
+def _normalization_volumes(digests, concentrations, mass, volume):
+    protein_volumes = [mass / concentration for concentration, sample_tubes in zip(concentrations, digests)
+                       for _ in sample_tubes]
+    return protein_volumes, [volume - vol for vol in protein_volumes]
+
+
+def add_to_tubes(pipette, vol, reagent, tubes, checkpoint=None):
+    """Adds ``vol`` of ``reagent`` to every tube with a fresh tip and mixes it in; each tube is a ``checkpoint``
+    step."""
+    for tube in (checkpoint or Checkpoint()).each(reagent.well_name, tubes):
+        pipette.transfer(
+            vol,
+            reagent,
+            tube,
+            mix_after=(5, 50),
+            new_tip='always',
+            touch_tip=True,
+            blow_out=True,
+            blowout_location='destination well'
+        )
+
+
+def addition_seconds(pipette, vol, tubes):
+    """Planned seconds ``add_to_tubes`` takes (``schedule.transfer_seconds``)."""
+    return len(tubes) * transfer_seconds(pipette, vol, mix=(5, 50))
+
+
+def await_temperature(protocol, temp_mod, celsius, msg, equilibration_min, tolerance=0.5, poll_seconds=10,
+                      max_wait_min=30):
+    """Waits out the rest of a ramp started with ``start_set_temperature``, then holds the tubes at ``celsius``.
+
+    The block temperature is read every ``poll_seconds``; after ``max_wait_min`` the module's own wait takes over.
+    """
+    for _ in range(int(max_wait_min * 60 / poll_seconds)):
+        if abs(temp_mod.temperature - celsius) <= tolerance:
+            break
+        protocol.delay(seconds=poll_seconds, msg=msg)
+    temp_mod.await_temperature(celsius)
+    if equilibration_min:
+        protocol.delay(minutes=equilibration_min, msg=f'Holding tubes at {celsius} degrees for {equilibration_min} minutes.')
+
+
+def reduce_and_alkylate(protocol, temp_mod, p50, dtt, iaa, tubes, volume_of_dtt, volume_of_iaa, incubation_time_dtt,
+                        incubation_time_iaa, equilibration_min, rack_slot=4, during_iaa=(), during_iaa_tips=None,
+                        checkpoint=None, tips=None, reagents=None, dtt_added=False, tubes_name='sample tubes',
+                        before_heating=None):
+    """DTT reduction at 55 degrees, then IAA alkylation at 22 degrees in the dark, in the tubes on the temp block.
+
+    Ramps are started early so they run while the operator closes the caps or loads the IAA. The block is
+    deactivated at the end. ``rack_slot`` is the slot of the 2ml tube rack holding the DTT and IAA. The tasks
+    (``schedule.Task``) in ``during_iaa`` run while the IAA incubates; work they need beyond the
+    incubation time extends it, and ``during_iaa_tips`` ({pipette: tips}) are the tips they take. Both stages are
+    ``checkpoint`` steps, and both start with the ``tips`` the p50 needs. The DTT and IAA are asked for through
+    ``reagents`` (a ``ReagentPlan``), if given, with the volume to load, or not at all if they were loaded before the
+    run. With ``dtt_added`` the DTT is already in the tubes, put there while an earlier batch incubated, and the
+    stage starts by heating the block. The pauses for the caps name the tubes ``tubes_name``; ``before_heating`` is
+    added to the one before the block heats.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    tips = tips or TipInventory(protocol)
+    reagents = reagents or ReagentPlan(protocol)
+    if checkpoint.pending('DTT reduction'):
+        protocol.comment('Stage: DTT reduction')
+        if not dtt_added:
+            tips.ensure({p50: len(tubes)}, 'DTT reduction', reagents.prompt('DTT',
+                        'Ensure DTT has been loaded into {} of the 2ml tube rack located in slot {} prior to resuming protocol.'.format(
+                            dtt.well_name, rack_slot)))
+            add_to_tubes(p50, volume_of_dtt, dtt, tubes, checkpoint)
+        # the block heats while the caps are closed
+        temp_mod.start_set_temperature(55)
+        protocol.pause(' '.join(filter(None, [before_heating, 'Ensure to close caps on {}.'.format(tubes_name)])))
+        await_temperature(protocol, temp_mod, 55, 'Waiting for the temp block to reach 55 degrees.', equilibration_min)
+        protocol.delay(minutes=incubation_time_dtt, msg=f'Incubating at 55 degrees for {incubation_time_dtt} minutes.')
+        checkpoint.complete()
+
+    # cool the block and tubes to room temp before adding IAA; the IAA is loaded while it cools
+    if checkpoint.pending('IAA alkylation'):
+        protocol.comment('Stage: IAA alkylation')
+        protocol.comment('Cooling down temp block.')
+        temp_mod.start_set_temperature(22)
+        needs = {p50: len(tubes)}
+        for pipette, count in (during_iaa_tips or {}).items():
+            needs[pipette] = needs.get(pipette, 0) + count
+        tips.ensure(needs, 'IAA alkylation', reagents.prompt('IAA',
+                    'Ensure IAA has been loaded into {} of the 2ml tube rack located in slot {} prior to resuming protocol.'.format(
+                        iaa.well_name, rack_slot)))
+        await_temperature(protocol, temp_mod, 22, 'Waiting for the temp block to cool to 22 degrees.', equilibration_min)
+        protocol.pause('Ensure to open caps on {}.'.format(tubes_name))
+        add_to_tubes(p50, volume_of_iaa, iaa, tubes, checkpoint)
+        protocol.pause('Close caps on {} and cover tubes with foil'.format(tubes_name))
+
+        temp_mod.set_temperature(22)
+        incubation = Task('IAA incubation', wait=incubation_time_iaa * 60,
+                          msg=f'Protect tubes from light. Incubating at 22 degrees for {incubation_time_iaa} minutes.')
+        run_tasks(protocol, [incubation] + list(during_iaa), report='the IAA incubation' if during_iaa else None)
+        protocol.comment('Temp block will now be deactivated.')
+        temp_mod.deactivate()
+        checkpoint.complete()
+
+
+def staggered_schedule(batches, incubation_time_dtt, incubation_time_iaa):
+    """The temp block schedule of ``batches`` (the tubes of each) run staggered, as one line for the run log."""
+    steps = []
+    for b, tubes in enumerate(batches):
+        steps.append('batch {} ({} tubes from {}) DTT at 55 degrees for {} min'.format(
+            b + 1, len(tubes), tubes[0].well_name, incubation_time_dtt))
+        steps.append('batch {} IAA at 22 degrees for {} min{}'.format(
+            b + 1, incubation_time_iaa, ' while batch {} is normalized and gets its DTT'.format(b + 2)
+            if b + 1 < len(batches) else ''))
+    return 'Temp block schedule: {}.'.format(' > '.join(steps))
@@ -0,0 +1 @@
+"""Offline tools for simulating and estimating the OT-2 protocol scripts."""
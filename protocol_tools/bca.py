@@ -0,0 +1,359 @@
+"""BCA analysis: protein concentrations from plate-reader exports, as a sample manifest for the digestion scripts.
+
+Reads the 562 nm absorbance of each plate, as an 8 x 12 grid or one well per
+line, next to the plate map ``BCA_protocol.py`` writes to ``plate_map_file``.
+The blank (the 0 ug/mL standard) is subtracted, a replicate that lies far off
+the other replicates of its standard or sample is set aside, and each plate's
+standards are fitted with a linear, quadratic or four-parameter logistic (4PL)
+curve. The samples' concentrations, times the dilution they were measured at,
+go into a manifest with the columns ``sample_manifest`` reads.
+
+    python -m protocol_tools.bca --plate plate1.csv plate1_map.csv --dilution 10 \\
+        --replicates 3 --output samples.csv
+"""
+
+import argparse
+import csv
+import json
+import math
+import re
+
+from protocol_lib.plate_map import FIELDS
+
+MODELS = ('linear', 'quadratic', '4pl')
+ROWS = 'ABCDEFGH'
+WELL = re.compile(r'^([A-H])0?([1-9]|1[0-2])$')
+MANIFEST_FIELDS = ('sample', 'concentration', 'replicates')  # the columns the digestion scripts read
+UG_PER_ML = 1000.0  # the plate map's standards are in ug/mL, the digestion scripts take ug/uL
+
+
+def read_absorbance(path):
+    """``{well: absorbance}`` of a plate-reader export: the first 8 x 12 grid in the file (a header row 1 to 12,
+    then rows A to H), or else every line that starts with a well name and a number. Other lines, such as the
+    reader's header and footer, are skipped."""
+    with open(path, newline='') as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    rows = [[field.strip() for field in re.split(r'\t|,|;', line)] for line in lines]
+    grid = _grid(rows)
+    if grid:
+        return grid
+    wells = {}
+    for row in rows:
+        values = [field for field in row if field]
+        if len(values) >= 2 and WELL.match(values[0].upper()) and _number(values[1]) is not None:
+            wells[_well_name(values[0])] = _number(values[1])
+    if not wells:
+        raise ValueError('{} has neither an 8 x 12 grid nor lines of well and absorbance.'.format(path))
+    return wells
+
+
+def _grid(rows):
+    for start, header in enumerate(rows):
+        columns = {i: int(field) for i, field in enumerate(header) if field.isdigit() and 1 <= int(field) <= 12}
+        if len(columns) < 2:
+            continue
+        wells = {}
+        for row in rows[start + 1:start + 1 + len(ROWS)]:
+            letter = next((field.upper() for field in row if field), '')
+            if letter not in ROWS or len(letter) != 1:
+                break
+            for i, column in columns.items():
+                value = _number(row[i]) if i < len(row) else None
+                if value is not None:
+                    wells['{}{}'.format(letter, column)] = value
+        if wells:
+            return wells
+    return {}
+
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _well_name(text):
+    match = WELL.match(text.strip().upper())
+    return '{}{}'.format(match.group(1), match.group(2))
+
+
+def read_plate_map(path):
+    """Rows of a plate map file as ``log_plate_map`` writes them, with the standards' concentrations as numbers."""
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows or any(field not in rows[0] for field in FIELDS):
+        raise ValueError('{} needs the columns {}.'.format(path, ', '.join(FIELDS)))
+    for row in rows:
+        row['concentration'] = float(row['concentration']) if row['concentration'] else None
+    return rows
+
+
+def flag_outliers(values, tolerance=0.1, floor=0.02):
+    """Indices of the replicates in ``values`` to set aside: with three or more, those further than ``tolerance``
+    of the median from it, and at least ``floor`` absorbance units. Two replicates cannot tell which one is off,
+    so neither is set aside."""
+    if len(values) < 3:
+        return []
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    flagged = [i for i, value in enumerate(values) if abs(value - median) > max(tolerance * abs(median), floor)]
+    # more than half set aside means the replicates simply scatter; keep them all
+    return flagged if len(flagged) <= (len(values) - 1) // 2 else []
+
+
+class Curve:
+    """A standard curve: absorbance as a function of concentration, and its inverse."""
+
+    def __init__(self, model, params, concentrations, absorbances):
+        self.model = model
+        self.params = params
+        self.low = min(y for x, y in zip(concentrations, absorbances) if x > 0)
+        self.high = max(absorbances)
+        mean = sum(absorbances) / len(absorbances)
+        total = sum((y - mean) ** 2 for y in absorbances)
+        residual = sum((y - self.absorbance(x)) ** 2 for x, y in zip(concentrations, absorbances))
+        self.r_squared = 1 - residual / total if total else 0.0
+
+    def absorbance(self, concentration):
+        if self.model == '4pl':
+            a, b, c, d = self.params
+            return d + (a - d) / (1 + (max(concentration, 0.0) / c) ** b)
+        return sum(p * concentration ** i for i, p in enumerate(self.params))
+
+    def concentration(self, absorbance):
+        """Concentration at ``absorbance`` on the rising part of the curve, or ``None`` where it never gets there."""
+        if self.model == 'linear':
+            a, b = self.params
+            return (absorbance - a) / b if b else None
+        if self.model == 'quadratic':
+            a, b, c = self.params
+            discriminant = b * b + 4 * c * (absorbance - a)
+            if discriminant < 0 or b + math.sqrt(discriminant) == 0:
+                return None
+            # the root where the curve rises, written so it stays accurate as c goes to 0
+            return 2 * (absorbance - a) / (b + math.sqrt(discriminant))
+        a, b, c, d = self.params
+        if not min(a, d) < absorbance < max(a, d):
+            return None
+        return c * ((a - d) / (absorbance - d) - 1) ** (1 / b)
+
+    def describe(self):
+        names = {'linear': 'a + b*x', 'quadratic': 'a + b*x + c*x^2', '4pl': 'd + (a - d) / (1 + (x/c)^b)'}
+        return 'A562 = {} with {}, R^2 {:.4f}'.format(names[self.model], ', '.join(
+            '{}={:.4g}'.format(name, p) for name, p in zip('abcd', self.params)), self.r_squared)
+
+
+def fit_curve(concentrations, absorbances, model='quadratic'):
+    """Least-squares ``Curve`` of ``model`` through the standards."""
+    if model not in MODELS:
+        raise ValueError('Unknown curve {!r}; use one of {}.'.format(model, ', '.join(MODELS)))
+    needed = {'linear': 2, 'quadratic': 3, '4pl': 4}[model]
+    if len(set(concentrations)) < needed:
+        raise ValueError('A {} curve needs at least {} standard concentrations.'.format(model, needed))
+    if model == '4pl':
+        params = _fit_4pl(concentrations, absorbances)
+    else:
+        degree = needed - 1
+        rows = [[x ** i for i in range(degree + 1)] for x in concentrations]
+        params = _least_squares(rows, absorbances)
+    return Curve(model, params, concentrations, absorbances)
+
+
+def _least_squares(rows, values, damping=0.0):
+    """Solves the normal equations of ``rows @ params = values``, with Levenberg-Marquardt ``damping``."""
+    n = len(rows[0])
+    matrix = [[sum(row[i] * row[j] for row in rows) for j in range(n)] for i in range(n)]
+    for i in range(n):
+        matrix[i][i] *= 1 + damping
+    vector = [sum(row[i] * value for row, value in zip(rows, values)) for i in range(n)]
+    return _solve(matrix, vector)
+
+
+def _solve(matrix, vector):
+    """Gaussian elimination with partial pivoting."""
+    n = len(vector)
+    augmented = [row[:] + [value] for row, value in zip(matrix, vector)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(augmented[r][col]))
+        if augmented[pivot][col] == 0:
+            raise ValueError('The standards do not determine the curve.')
+        augmented[col], augmented[pivot] = augmented[pivot], augmented[col]
+        for r in range(col + 1, n):
+            factor = augmented[r][col] / augmented[col][col]
+            for k in range(col, n + 1):
+                augmented[r][k] -= factor * augmented[col][k]
+    solution = [0.0] * n
+    for r in reversed(range(n)):
+        solution[r] = (augmented[r][n] - sum(augmented[r][k] * solution[k] for k in range(r + 1, n))) / augmented[r][r]
+    return solution
+
+
+def _fit_4pl(concentrations, absorbances, iterations=200):
+    """Levenberg-Marquardt fit of the 4PL parameters ``(a, b, c, d)``: the response at 0 and at saturation
+    (``a``, ``d``), the slope ``b`` and the midpoint ``c``."""
+    top = max(concentrations)
+    params = [min(absorbances), 1.0, top / 2, 2 * max(absorbances)]
+
+    def residuals(p):
+        a, b, c, d = p
+        return [y - (d + (a - d) / (1 + (x / c) ** b)) for x, y in zip(concentrations, absorbances)]
+
+    def jacobian(p):
+        a, b, c, d = p
+        rows = []
+        for x in concentrations:
+            ratio = (x / c) ** b if x > 0 else 0.0
+            denominator = 1 + ratio
+            log = math.log(x / c) if x > 0 else 0.0
+            rows.append([1 / denominator,
+                         -(a - d) * ratio * log / denominator ** 2,
+                         (a - d) * ratio * b / c / denominator ** 2,
+                         1 - 1 / denominator])
+        return rows
+
+    error = sum(r * r for r in residuals(params))
+    damping = 1e-3
+    for _ in range(iterations):
+        step = _least_squares(jacobian(params), residuals(params), damping)
+        trial = [p + s for p, s in zip(params, step)]
+        if trial[1] > 0 and trial[2] > 0:
+            trial_error = sum(r * r for r in residuals(trial))
+            if trial_error < error:
+                converged = error - trial_error < 1e-12 * max(error, 1e-12)
+                params, error, damping = trial, trial_error, damping / 10
+                if converged:
+                    break
+                continue
+        damping *= 10
+        if damping > 1e10:
+            break
+    return params
+
+
+def analyze(plates, model='quadratic', dilution=1.0, tolerance=0.1):
+    """Fits every plate and works out its samples.
+
+    ``plates`` lists ``(absorbance, plate_map_rows)`` per plate. Returns one dict per plate with its ``curve``,
+    ``blank``, set-aside ``outliers`` (``(name, well, absorbance)``) and ``samples``: ``name``, ``wells``, the kept
+    ``absorbances``, their ``cv``, ``concentration`` in ug/uL (``None`` off the curve) and a ``note``.
+    """
+    results = []
+    for absorbance, rows in plates:
+        missing = [row['well'] for row in rows if row['well'] not in absorbance]
+        if missing:
+            raise ValueError('The plate reader export has no absorbance for {}.'.format(', '.join(missing)))
+        groups = {}
+        for row in rows:
+            groups.setdefault((row['kind'], row['name'], row['concentration']), []).append(row['well'])
+        kept = {}
+        outliers = []
+        for key, wells in groups.items():
+            values = [absorbance[well] for well in wells]
+            flagged = flag_outliers(values, tolerance)
+            outliers += [(key[1], wells[i], values[i]) for i in flagged]
+            kept[key] = [(well, value) for i, (well, value) in enumerate(zip(wells, values)) if i not in flagged]
+
+        standards = [(key[2], kept[key]) for key in groups if key[0] == 'standard']
+        blanks = [value for concentration, points in standards if concentration == 0 for _, value in points]
+        blank = sum(blanks) / len(blanks) if blanks else 0.0
+        points = [(concentration, value - blank) for concentration, wells in standards for _, value in wells]
+        curve = fit_curve([x for x, _ in points], [y for _, y in points], model)
+
+        samples = []
+        for key in groups:
+            if key[0] != 'sample':
+                continue
+            values = [value - blank for _, value in kept[key]]
+            mean = sum(values) / len(values)
+            deviation = math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1)) if len(values) > 1 else 0.0
+            concentration = curve.concentration(mean)
+            note = ''
+            if mean > curve.high:
+                note = 'above the top standard; dilute further and measure again'
+            elif mean < curve.low:
+                note = 'below the lowest standard'
+            if note or concentration is None or concentration < 0:
+                concentration = None
+            else:
+                concentration = concentration * dilution / UG_PER_ML
+            samples.append({'name': key[1], 'wells': [well for well, _ in kept[key]], 'absorbances': values,
+                            'cv': deviation / mean if mean else None, 'concentration': concentration,
+                            'note': note or ('' if concentration is not None else 'off the standard curve')})
+        results.append({'curve': curve, 'blank': blank, 'outliers': outliers, 'samples': samples})
+    return results
+
+
+def manifest_rows(results, replicates=3, names=None):
+    """Rows of the sample manifest, the samples of all plates in order. ``names`` replace the plate map's names in
+    order; names that repeat across plates get the plate number."""
+    samples = [(plate, sample) for plate, result in enumerate(results, 1) for sample in result['samples']]
+    if names and len(names) != len(samples):
+        raise ValueError('{} names for {} samples.'.format(len(names), len(samples)))
+    counts = {}
+    for _, sample in samples:
+        counts[sample['name']] = counts.get(sample['name'], 0) + 1
+    rows = []
+    for i, (plate, sample) in enumerate(samples):
+        name = names[i] if names else sample['name']
+        if not names and counts[name] > 1:
+            name = '{} plate {}'.format(name, plate)
+        # a sample off the curve keeps an empty concentration, so the digestion scripts refuse the manifest
+        concentration = '' if sample['concentration'] is None else '{:.2f}'.format(sample['concentration'])
+        rows.append({'sample': name, 'concentration': concentration, 'replicates': replicates})
+    return rows
+
+
+def write_manifest(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def format_report(results, rows):
+    lines = []
+    for plate, result in enumerate(results, 1):
+        lines.append('Plate {}: {}; blank {:.3f}'.format(plate, result['curve'].describe(), result['blank']))
+        for name, well, value in result['outliers']:
+            lines.append('  set aside {} in {}: {:.3f}'.format(name, well, value))
+    lines.append('  A562    CV  ug/uL  sample')
+    samples = [sample for result in results for sample in result['samples']]
+    for sample, row in zip(samples, rows):
+        mean = sum(sample['absorbances']) / len(sample['absorbances'])
+        cv = '' if sample['cv'] is None else '{:.0%}'.format(sample['cv'])
+        lines.append('{:6.3f} {:>5} {:>6}  {}{}'.format(mean, cv, row['concentration'] or '-', row['sample'],
+                                                        '  ({})'.format(sample['note']) if sample['note'] else ''))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plate', nargs=2, action='append', required=True, metavar=('EXPORT', 'PLATE_MAP'),
+                        help='plate-reader export and plate map file of one plate; repeat for more plates')
+    parser.add_argument('--curve', choices=MODELS, default='quadratic', help='standard curve model (default quadratic)')
+    parser.add_argument('--dilution', type=float, default=1.0,
+                        help='dilution of the samples on the plate, e.g. 10 for 1:10 (default 1)')
+    parser.add_argument('--replicates', type=int, default=3, help='digestion replicates per sample (default 3)')
+    parser.add_argument('--names', help='comma-separated sample names, in plate map order, for the manifest')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='set a replicate aside this fraction off the others (default 0.1)')
+    parser.add_argument('--output', help='write the sample manifest to this CSV file')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+    plates = [(read_absorbance(export), read_plate_map(plate_map)) for export, plate_map in args.plate]
+    results = analyze(plates, args.curve, args.dilution, args.tolerance)
+    rows = manifest_rows(results, args.replicates, [n.strip() for n in args.names.split(',')] if args.names else None)
+    if args.output:
+        write_manifest(args.output, rows)
+    if args.json:
+        print(json.dumps([dict(result, curve={'model': result['curve'].model, 'params': result['curve'].params,
+                                              'r_squared': result['curve'].r_squared})
+                          for result in results], indent=2))
+    else:
+        print(format_report(results, rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Run-time benchmark matrix for the protocol scripts.
+
+Every case runs one script headless with a combination of sample count,
+replicates and starting mag-plate well, and compares the estimated run time
+and tip count against ``benchmarks/baseline.json``. A case that got slower
+than the baseline by more than ``TOLERANCE_SECONDS`` (or ``TOLERANCE_FRACTION``
+of its run time, whichever is larger) is reported as a regression.
+
+    python -m protocol_tools.benchmark            # compare against the baseline
+    python -m protocol_tools.benchmark --update   # accept the current estimates
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+
+from .estimator import format_duration, summarize
+from .recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+TOLERANCE_SECONDS = 30.0
+TOLERANCE_FRACTION = 0.01
+
+
+def _digestion(n, r, well=None):
+    settings = {'number_of_samples': n, 'sample_concentrations': [2.0] * n, 'replicates': r}
+    if well is not None:
+        settings['starting_mag_well'] = well
+    return settings
+
+
+def _cleanup(n, r, well):
+    return {'number_of_samples': n, 'replicates': r, 'starting_mag_well': well}
+
+
+def _bca(n, r):
+    return {'num_samples': n, 'replicates_samples': r}
+
+
+# script -> (short name, settings factory, axes, optional modes benchmarked on top of the defaults)
+MATRIX = [
+    ('digestion_scripts/NoSP3_digestion.py', 'nosp3', _digestion, ([1, 4, 8], [1, 3]), {}),
+    ('digestion_scripts/SP3_digestion.py', 'sp3', _digestion, ([1, 4, 8], [1, 3], [0, 24]), {
+        'batched': {'batch_reagent_additions': True},
+        'paced': {'bead_mix_interval_min': 3},
+        # the p300 adds the small volumes in place of the p50
+        'multi': {'use_p300_multi': True, 'volume_of_DTT': 30.0, 'volume_of_IAA': 30.0, 'volume_of_beads': 30.0,
+                  'volume_of_trypsin': 30.0},
+        'p1000': {'use_p1000': True, 'volume_of_DTT': 30.0, 'volume_of_IAA': 30.0, 'volume_of_beads': 30.0,
+                  'volume_of_trypsin': 30.0},
+        'reuse': {'reuse_tips': True},
+        'levels': {'reagent_volumes': {'ABC': 14, 'ethanol100': 45, 'ethanol80': 45}},
+    }),
+    ('digestion_scripts/SP3_peptide_cleanup.py', 'cleanup', _cleanup, ([1, 4, 6], [1, 2], [0, 24]), {
+        'batched': {'batch_reagent_additions': True},
+        'paced': {'bead_mix_interval_min': 3},
+        'multi': {'use_p300_multi': True, 'volume_of_beads': 30.0},
+        'p1000': {'use_p1000': True, 'volume_of_beads': 30.0},
+        'reuse': {'reuse_tips': True},
+        'levels': {'reagent_volumes': {'ACN': 45, 'DMSO': 14}},
+    }),
+    ('digestion_scripts/SP3_peptide_cleanup.py', 'cleanup', _cleanup, ([24], [2], [0]), {
+        'plate': {'elution_plate': True},
+    }),
+    ('misc_scripts/BCA_protocol.py', 'bca', _bca, ([3, 9, 15, 23], [3]), {}),
+]
+
+
+def cases():
+    """``(case name, script path, settings)`` for every point of the matrix."""
+    for script, short, factory, axes, modes in MATRIX:
+        for point in itertools.product(*axes):
+            name = '{}-{}'.format(short, '-'.join(
+                '{}{}'.format(tag, value) for tag, value in zip(('n', 'r', 'w'), point)))
+            yield name, os.path.join(ROOT, script), factory(*point)
+            for mode, settings in modes.items():
+                yield '{}-{}'.format(name, mode), os.path.join(ROOT, script), dict(factory(*point), **settings)
+
+
+def measure(script, settings):
+    summary = summarize(simulate(script, settings))
+    return {k: summary[k] for k in ('total_seconds', 'tips', 'commands')}
+
+
+def run_matrix(selected=None):
+    return {name: measure(script, settings) for name, script, settings in cases()
+            if not selected or any(s in name for s in selected)}
+
+
+def load_baseline(path=BASELINE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def regression(current, baseline):
+    """Seconds by which ``current`` exceeds the tolerated run time, or ``None``."""
+    if baseline is None:
+        return None
+    allowed = baseline['total_seconds'] + max(TOLERANCE_SECONDS, TOLERANCE_FRACTION * baseline['total_seconds'])
+    excess = current['total_seconds'] - allowed
+    return excess if excess > 0 else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Estimate run times for the benchmark matrix.')
+    parser.add_argument('cases', nargs='*', help='only run cases whose name contains one of these')
+    parser.add_argument('--update', action='store_true', help='write the current estimates as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run_matrix(args.cases)
+    baseline = load_baseline()
+    failed = False
+    for name, result in results.items():
+        base = baseline.get(name)
+        delta = '' if base is None else '{:+.0f} s, {:+d} tips'.format(
+            result['total_seconds'] - base['total_seconds'], result['tips'] - base['tips'])
+        slower = regression(result, base)
+        failed = failed or slower is not None
+        print('{:<22} {}  {:>4} tips  {}{}'.format(name, format_duration(result['total_seconds']), result['tips'],
+                                                   delta, '  REGRESSION' if slower is not None else ''))
+    if args.update:
+        baseline.update(results)
+        with open(BASELINE, 'w') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write('\n')
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Single-file builds of protocol scripts for the Opentrons App.
+
+The App uploads one ``.py`` file per protocol, so the ``protocol_lib`` modules a
+script imports are inlined into it: their imports are merged with the
+script's and their code goes in front of the script's own.
+
+    python -m protocol_tools.bundle digestion_scripts/*.py   # writes build/<script>.py
+"""
+
+import argparse
+import ast
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = 'protocol_lib'
+
+
+def _split(source, path):
+    """``(docstring lines, import statements, protocol_lib modules imported, remaining lines)`` of a module."""
+    tree = ast.parse(source, filename=path)
+    lines = source.splitlines()
+    drop = set()
+    docstring = []
+    imports = []
+    modules = []
+    for i, node in enumerate(tree.body):
+        span = range(node.lineno - 1, node.end_lineno)
+        if i == 0 and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            docstring = lines[span.start:span.stop]
+        elif isinstance(node, ast.ImportFrom) and (node.module or '').split('.')[0] == PACKAGE:
+            modules.append(node.module)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append('\n'.join(lines[span.start:span.stop]))
+        else:
+            continue
+        drop.update(span)
+    return docstring, imports, modules, [line for i, line in enumerate(lines) if i not in drop]
+
+
+def _module_path(module):
+    return os.path.join(ROOT, *module.split('.')) + '.py'
+
+
+def bundle(path):
+    """Source of the script at ``path`` with every ``protocol_lib`` module it uses inlined."""
+    with open(path) as f:
+        docstring, imports, pending, body = _split(f.read(), path)
+    libraries = []  # (module, code) in dependency order
+    while pending:
+        module = pending.pop(0)
+        if any(name == module for name, _ in libraries):
+            continue
+        with open(_module_path(module)) as f:
+            _, lib_imports, lib_modules, code = _split(f.read(), module)
+        # modules a library depends on go in front of it
+        unresolved = [name for name in lib_modules if not any(name == done for done, _ in libraries)]
+        if unresolved:
+            pending[:0] = unresolved + [module]
+            continue
+        imports = lib_imports + imports
+        libraries.append((module, '\n'.join(code).strip('\n')))
+
+    plain = sorted({statement for statement in imports if statement.startswith('import ')})
+    from_imports = list(dict.fromkeys(statement for statement in imports if not statement.startswith('import ')))
+    parts = ['\n'.join(docstring)] if docstring else []
+    parts.append('\n'.join(plain + ([''] if plain and from_imports else []) + from_imports))
+    for module, code in libraries:
+        parts.append('# | --------- {} (inlined by protocol_tools.bundle) --------- |\n{}'.format(
+            _module_path(module)[len(ROOT) + 1:].replace(os.sep, '/'), code))
+    parts.append('\n'.join(body).strip('\n'))
+    return '\n\n\n'.join(part for part in parts if part) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scripts', nargs='+', help='protocol scripts to bundle')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'build'), help='directory the bundled scripts are written to')
+    args = parser.parse_args(argv)
+    os.makedirs(args.out, exist_ok=True)
+    for script in args.scripts:
+        target = os.path.join(args.out, os.path.basename(script))
+        # built before the target is opened, so a script that fails to bundle leaves no empty file to upload
+        source = bundle(script)
+        with open(target, 'w') as f:
+            f.write(source)
+        print(target)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Deck-layout optimizer: proposes labware slots and tube positions that shorten head travel.
+
+Runs a script headless and collects its travel graph: how often the head moves
+between a well of one labware and a well of another. It then searches the slot
+of every labware in the script's layout (see ``protocol_lib.deck``) and the
+15mL_50mL rack position of every bulk tube for the assignment with the least
+gantry travel. Modules stay in the slots their cable reaches and the trash in
+slot 12. The proposal is checked by running the script again with it, and
+printed as the ``deck_layout`` setting that applies it.
+
+    python -m protocol_tools.deck digestion_scripts/SP3_digestion.py \\
+        --set number_of_samples=8 --set "sample_concentrations=[2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0]"
+"""
+
+import argparse
+import ast
+import json
+import math
+import random
+
+from protocol_lib.deck import MODULE_SLOTS, RACK_POSITIONS
+
+from . import labware as defs
+from .estimator import format_duration, parse_settings, summarize
+from .recorder import simulate
+from .timing import TimingModel
+
+LAYOUT_CALL = 'resolve_layout'
+TUBE_RACK = 'tuberack_15ml_50ml'
+DECK_SLOTS = tuple(range(1, 12))
+
+
+def script_layout(script):
+    """``(defaults, modules)`` of the layout a script passes to ``resolve_layout``."""
+    with open(script) as f:
+        tree = ast.parse(f.read(), filename=script)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, 'id', None) == LAYOUT_CALL:
+            modules = next((ast.literal_eval(k.value) for k in node.keywords if k.arg == 'modules'), ())
+            return ast.literal_eval(node.args[0]), tuple(modules)
+    raise ValueError('{} has no deck layout ({} call)'.format(script, LAYOUT_CALL))
+
+
+def travel_graph(commands):
+    """``{((slot, well), (slot, well)): moves}`` for every move of the head between two labware."""
+    graph = {}
+    previous = None
+    for command in commands:
+        if command['name'] != 'move_to':
+            continue
+        slot, well = command['location'].split(' ')[0].split(':')
+        here = (int(slot), well)
+        if previous is not None and previous[0] != here[0]:
+            graph[(previous, here)] = graph.get((previous, here), 0) + 1
+        previous = here
+    return graph
+
+
+class _Layout:
+    """The travel graph of one run in terms of the layout entries it depends on."""
+
+    def __init__(self, layout, modules, protocol):
+        self.layout = layout
+        # entries that share a slot are never loaded together and move as one group
+        slots = sorted({value for value in layout.values() if isinstance(value, int)})
+        self.groups = [tuple(name for name, value in layout.items() if value == slot) for slot in slots]
+        self.module_groups = [i for i, group in enumerate(self.groups) if any(name in modules for name in group)]
+        self.unused_groups = [i for i, slot in enumerate(slots) if slot not in protocol.loaded_labwares]
+        self.tubes = [name for name, value in layout.items() if isinstance(value, str)]
+        self.start = ([slots[i] for i in range(len(self.groups))], [layout[name] for name in self.tubes])
+
+        rack = protocol.loaded_labwares.get(layout.get(TUBE_RACK))
+        self.rack_local = {}
+        if rack is not None:
+            self.rack_local = {well.well_name: (well.x - rack.origin[0], well.y - rack.origin[1]) for well in rack.wells()}
+        self.edges = []
+        for (a, b), count in travel_graph(protocol.commands).items():
+            self.edges.append((count, self._endpoint(a, slots, protocol, rack), self._endpoint(b, slots, protocol, rack)))
+
+    def _endpoint(self, where, slots, protocol, rack):
+        slot, name = where
+        labware = protocol.loaded_labwares[slot]
+        well = labware[name]
+        if slot not in slots:
+            return None, None, (well.x, well.y)  # trash or labware outside the layout
+        tube = self.tubes.index(next(t for t in self.tubes if self.layout[t] == name)) \
+            if labware is rack and name in [self.layout[t] for t in self.tubes] else None
+        return slots.index(slot), tube, (well.x - labware.origin[0], well.y - labware.origin[1])
+
+    def _point(self, endpoint, group_slots, tube_positions):
+        group, tube, local = endpoint
+        if group is None:
+            return local
+        x, y = defs.SLOT_ORIGINS[group_slots[group]]
+        lx, ly = self.rack_local[tube_positions[tube]] if tube is not None else local
+        return x + lx, y + ly
+
+    def travel(self, state, xy_speed):
+        """Seconds of horizontal head travel between labware with the slots and tube positions of ``state``."""
+        group_slots, tube_positions = state
+        total = 0.0
+        for count, a, b in self.edges:
+            (xa, ya), (xb, yb) = self._point(a, group_slots, tube_positions), self._point(b, group_slots, tube_positions)
+            total += count * math.hypot(xb - xa, yb - ya)
+        return total / xy_speed
+
+    def allowed(self, group):
+        return MODULE_SLOTS if group in self.module_groups else DECK_SLOTS
+
+    def neighbours(self, state):
+        """Layouts one labware move (to a free slot, or swapping with the labware there) or tube swap away."""
+        group_slots, tube_positions = state
+        for group, slot in enumerate(group_slots):
+            for target in self.allowed(group):
+                if target == slot:
+                    continue
+                moved = list(group_slots)
+                if target in group_slots:
+                    other = group_slots.index(target)
+                    if slot not in self.allowed(other):
+                        continue
+                    moved[other] = slot
+                moved[group] = target
+                yield moved, tube_positions
+        for tube, position in enumerate(tube_positions):
+            for size in RACK_POSITIONS:
+                if position not in size:
+                    continue
+                for target in size:
+                    if target == position:
+                        continue
+                    moved = list(tube_positions)
+                    if target in tube_positions:
+                        moved[tube_positions.index(target)] = position
+                    moved[tube] = target
+                    yield group_slots, moved
+
+    def random_state(self, rng):
+        slots = [None] * len(self.groups)
+        free = list(DECK_SLOTS)
+        for group in sorted(range(len(self.groups)), key=lambda g: g not in self.module_groups):
+            slots[group] = rng.choice([slot for slot in free if slot in self.allowed(group)])
+            free.remove(slots[group])
+        positions = list(self.start[1])
+        for size in RACK_POSITIONS:
+            indices = [i for i, position in enumerate(positions) if position in size]
+            for i, position in zip(indices, rng.sample(size, len(indices))):
+                positions[i] = position
+        return slots, positions
+
+    def as_settings(self, state):
+        group_slots, tube_positions = state
+        # labware the run does not load goes back to where it was if that slot is still free
+        group_slots = list(group_slots)
+        for group in self.unused_groups:
+            if self.start[0][group] not in group_slots:
+                group_slots[group] = self.start[0][group]
+        layout = {}
+        for group, slot in zip(self.groups, group_slots):
+            layout.update((name, slot) for name in group)
+        layout.update(zip(self.tubes, tube_positions))
+        return layout
+
+
+def _climb(problem, state, xy_speed):
+    cost = problem.travel(state, xy_speed)
+    while True:
+        best = min(((problem.travel(candidate, xy_speed), candidate) for candidate in problem.neighbours(state)),
+                   key=lambda pair: pair[0], default=(cost, state))
+        if best[0] >= cost - 1e-6:
+            return cost, state
+        cost, state = best
+
+
+def optimize(script, settings=None, restarts=10, seed=0, model=None):
+    """The layout of ``script`` with the least head travel for a run with ``settings``.
+
+    Hill-climbs from the script's current layout and from ``restarts`` random ones and returns a dict with the
+    ``deck_layout`` setting that applies the best layout (only the entries that differ from the script's
+    defaults), and the travel and run time of the current and proposed layouts.
+    """
+    settings = dict(settings or {})
+    defaults, modules = script_layout(script)
+    current = dict(defaults, **settings.get('deck_layout', {}))
+    protocol = simulate(script, dict(settings, deck_layout=current), model=model)
+    problem = _Layout(current, modules, protocol)
+    xy_speed = (model or TimingModel()).xy_speed
+
+    rng = random.Random(seed)
+    best = _climb(problem, problem.start, xy_speed)
+    for _ in range(restarts):
+        best = min(best, _climb(problem, problem.random_state(rng), xy_speed), key=lambda pair: pair[0])
+
+    proposed = problem.as_settings(best[1])
+    after = simulate(script, dict(settings, deck_layout=proposed), model=model)
+    return {
+        'deck_layout': {name: value for name, value in proposed.items() if defaults[name] != value},
+        'before': {'travel_seconds': round(problem.travel(problem.start, xy_speed), 1),
+                   'total_seconds': summarize(protocol)['total_seconds']},
+        'after': {'travel_seconds': round(best[0], 1), 'total_seconds': summarize(after)['total_seconds']},
+    }
+
+
+def format_result(result):
+    before, after = result['before'], result['after']
+    return '\n'.join([
+        'Head travel between labware {} -> {}, run time {} -> {} ({} saved)'.format(
+            format_duration(before['travel_seconds']), format_duration(after['travel_seconds']),
+            format_duration(before['total_seconds']), format_duration(after['total_seconds']),
+            format_duration(before['total_seconds'] - after['total_seconds'])),
+        'deck_layout = {!r}'.format(result['deck_layout']),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('script', help='protocol script to lay out')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a CUSTOMIZE setting of the script')
+    parser.add_argument('--restarts', type=int, default=10, help='random layouts to search from besides the current one')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    args = parser.parse_args(argv)
+    result = optimize(args.script, parse_settings(args.set), restarts=args.restarts)
+    print(json.dumps(result, indent=2) if args.json else format_result(result))
+
+
+if __name__ == '__main__':
+    main()
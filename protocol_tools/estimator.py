@@ -0,0 +1,113 @@
+"""Offline run-time estimator for the protocol scripts.
+
+Runs a script's ``run(protocol)`` against a ``RecordingContext`` and prints the
+predicted wall-clock time of every phase. A phase is the stretch of commands
+between two operator pauses, which is where a person has to walk up to the
+robot anyway.
+
+    python -m protocol_tools.estimator digestion_scripts/SP3_digestion.py \\
+        --set number_of_samples=8 --set "sample_concentrations=[2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0]"
+"""
+
+import argparse
+import ast
+import json
+
+from .recorder import simulate
+
+CATEGORIES = {
+    'aspirate': 'liquid', 'dispense': 'liquid', 'mix': 'liquid', 'air_gap': 'liquid',
+    'blow_out': 'liquid', 'touch_tip': 'liquid',
+    'move_to': 'moves', 'home': 'moves',
+    'pick_up_tip': 'tips', 'drop_tip': 'tips', 'return_tip': 'tips',
+    'delay': 'delays', 'pause': 'delays',
+    'set_temperature': 'temperature', 'start_set_temperature': 'temperature',
+    'await_temperature': 'temperature', 'deactivate': 'temperature',
+    'engage': 'magnet', 'disengage': 'magnet',
+}
+
+
+def phases(commands):
+    """Split a timed command stream at operator pauses and total each phase.
+
+    A phase counts the fresh tips it picks up (a tip picked up again is not counted) and its trips, i.e.
+    aspirations; mixes are not trips.
+    """
+    result = []
+    current = None
+    for command in commands:
+        if current is None or command['name'] == 'pause':
+            label = command.get('msg') if command['name'] == 'pause' else 'start'
+            current = {'label': label or 'pause', 'start': command['start'], 'duration': 0.0,
+                       'tips': 0, 'trips': 0, 'by_category': {}}
+            result.append(current)
+        category = CATEGORIES.get(command['name'], 'other')
+        current['duration'] += command['duration']
+        current['by_category'][category] = current['by_category'].get(category, 0.0) + command['duration']
+        if command['name'] == 'pick_up_tip' and not command.get('reused'):
+            current['tips'] += 1
+        elif command['name'] == 'aspirate':
+            current['trips'] += 1
+    return result
+
+
+def summarize(protocol):
+    """Totals for a simulated run: time, tips, pauses and per-phase breakdown."""
+    commands = protocol.commands
+    return {
+        'total_seconds': round(protocol.elapsed, 1),
+        'tips': sum(1 for c in commands if c['name'] == 'pick_up_tip' and not c.get('reused')),
+        'pauses': sum(1 for c in commands if c['name'] == 'pause'),
+        'commands': len(commands),
+        'problems': list(protocol.problems),
+        'phases': phases(commands),
+    }
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{:d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+def format_report(summary):
+    lines = []
+    for i, phase in enumerate(summary['phases']):
+        breakdown = ', '.join('{} {}'.format(k, format_duration(v))
+                              for k, v in sorted(phase['by_category'].items(), key=lambda kv: -kv[1]) if v >= 0.5)
+        lines.append('{:>2}  {}  {:>3} tips  {:>4} trips  {}'.format(
+            i, format_duration(phase['duration']), phase['tips'], phase['trips'], phase['label'][:70]))
+        if breakdown:
+            lines.append('              {}'.format(breakdown))
+    lines.append('Total {} ({} tips, {} pauses, {} commands)'.format(
+        format_duration(summary['total_seconds']), summary['tips'], summary['pauses'], summary['commands']))
+    for problem in summary['problems']:
+        lines.append('WARNING: {}'.format(problem))
+    return '\n'.join(lines)
+
+
+def parse_settings(pairs):
+    """``['name=value', ...]`` -> ``{'name': value}`` with values read as Python literals."""
+    overrides = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition('=')
+        try:
+            overrides[name.strip()] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            raise ValueError('--set {} needs a Python literal, e.g. a number, a quoted string or a list'.format(pair))
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('script', help='protocol script to estimate')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a CUSTOMIZE setting of the script')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+    summary = summarize(simulate(args.script, parse_settings(args.set)))
+    print(json.dumps(summary, indent=2) if args.json else format_report(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Golden command traces: what the protocol scripts do, checked command by command.
+
+Every case runs one script headless with fixed settings and normalizes its
+command stream into one line per command: the instrument, volumes, locations,
+tips, module settings and messages, without the timestamps and head moves
+(which the locations already determine). The trace and its command count, tip
+count and estimated run time are compared against ``benchmarks/golden/<case>.trace``.
+Any change in what a script does, or how long it takes, shows up as a
+difference, so transfer and mixing changes can be checked against it.
+
+    python -m protocol_tools.golden              # compare every case against its golden trace
+    python -m protocol_tools.golden --update     # accept the current traces
+"""
+
+import argparse
+import difflib
+import os
+import sys
+
+from .estimator import format_duration
+from .recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(ROOT, 'benchmarks', 'golden')
+METRICS = ('commands', 'tips', 'seconds')
+SKIPPED_COMMANDS = ('move_to',)
+SKIPPED_FIELDS = ('name', 'instrument', 'mount', 'start', 'duration', 'path')
+
+
+def _digestion(n, r, **settings):
+    return dict({'number_of_samples': n, 'sample_concentrations': [2.0] * n, 'replicates': r}, **settings)
+
+
+# case -> (script, settings)
+CASES = {
+    'nosp3-n2-r2': ('digestion_scripts/NoSP3_digestion.py', _digestion(2, 2)),
+    'nosp3-n3-r4-staggered': ('digestion_scripts/NoSP3_digestion.py', _digestion(3, 4, stagger_batch_size=6)),
+    'sp3-n2-r2': ('digestion_scripts/SP3_digestion.py', _digestion(2, 2)),
+    'sp3-n2-r2-batched': ('digestion_scripts/SP3_digestion.py', _digestion(2, 2, batch_reagent_additions=True)),
+    'sp3-n2-r2-reuse': ('digestion_scripts/SP3_digestion.py', _digestion(2, 2, reuse_tips=True)),
+    'sp3-n2-r2-beads-during-iaa': ('digestion_scripts/SP3_digestion.py', _digestion(2, 2, beads_during_iaa=True)),
+    'sp3-n4-r2-multi': ('digestion_scripts/SP3_digestion.py',
+                        _digestion(4, 2, use_p300_multi=True, volume_of_DTT=30.0, volume_of_IAA=30.0, volume_of_beads=30.0,
+                                   volume_of_trypsin=30.0)),
+    'cleanup-n2-r2': ('digestion_scripts/SP3_peptide_cleanup.py', {'number_of_samples': 2, 'replicates': 2}),
+    'cleanup-n4-r2-multi': ('digestion_scripts/SP3_peptide_cleanup.py',
+                            {'number_of_samples': 4, 'replicates': 2, 'use_p300_multi': True, 'volume_of_beads': 30.0}),
+    'cleanup-n12-r2-plate': ('digestion_scripts/SP3_peptide_cleanup.py',
+                             {'number_of_samples': 12, 'replicates': 2, 'elution_plate': True}),
+    'cleanup-n4-r2-multi-single-hop': ('digestion_scripts/SP3_peptide_cleanup.py',
+                                       {'number_of_samples': 4, 'replicates': 2, 'use_p300_multi': True,
+                                        'volume_of_beads': 30.0, 'elution_plate': True, 'single_hop_elution': True}),
+    'bca-n3': ('misc_scripts/BCA_protocol.py', {'num_samples': 3}),
+}
+
+
+def _value(value):
+    if isinstance(value, float):
+        return '{:g}'.format(round(value, 2))
+    return str(value).replace('\n', '\\n')
+
+
+def normalize(command):
+    """One line for a recorded command: its name, instrument or module and the rest of its fields."""
+    fields = ['{}={}'.format(key, _value(value)) for key, value in sorted(command.items())
+              if key not in SKIPPED_FIELDS and value is not None]
+    return ' '.join([command['name']] + ([command['instrument']] if 'instrument' in command else []) + fields)
+
+
+def trace(script, settings):
+    """``(metrics, lines)`` of a run of ``script``."""
+    protocol = simulate(os.path.join(ROOT, script), settings)
+    commands = protocol.commands
+    metrics = {
+        'commands': len(commands),
+        'tips': sum(1 for c in commands if c['name'] == 'pick_up_tip' and not c.get('reused')),
+        'seconds': round(protocol.elapsed, 1),
+    }
+    lines = [normalize(c) for c in commands if c['name'] not in SKIPPED_COMMANDS]
+    lines += ['problem {}'.format(problem) for problem in protocol.problems]
+    return metrics, lines
+
+
+def golden_path(case):
+    return os.path.join(GOLDEN_DIR, case + '.trace')
+
+
+def read_golden(case):
+    """``(metrics, lines)`` stored for ``case``, or ``None``."""
+    if not os.path.exists(golden_path(case)):
+        return None
+    metrics, lines = {}, []
+    with open(golden_path(case)) as f:
+        for line in f.read().splitlines():
+            if line.startswith('# '):
+                key, value = line[2:].split(' ', 1)
+                metrics[key] = float(value) if key == 'seconds' else int(value)
+            else:
+                lines.append(line)
+    return metrics, lines
+
+
+def write_golden(case, metrics, lines):
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(golden_path(case), 'w') as f:
+        for key in METRICS:
+            f.write('# {} {}\n'.format(key, metrics[key]))
+        f.write('\n'.join(lines) + '\n')
+
+
+def compare(case, context=3, limit=40):
+    """Differences of ``case`` from its golden trace as report lines; empty when it matches."""
+    script, settings = CASES[case]
+    metrics, lines = trace(script, settings)
+    golden = read_golden(case)
+    if golden is None:
+        return ['{}: no golden trace; run python -m protocol_tools.golden --update'.format(case)]
+    before, golden_lines = golden
+    report = []
+    changed = [key for key in METRICS if metrics[key] != before.get(key)]
+    if changed or lines != golden_lines:
+        report.append('{}: {}'.format(case, ', '.join(_delta(key, before.get(key), metrics[key]) for key in METRICS)))
+        diff = list(difflib.unified_diff(golden_lines, lines, 'golden', 'current', n=context, lineterm=''))
+        report += diff[2:2 + limit] + (['... {} more diff lines'.format(len(diff) - 2 - limit)]
+                                       if len(diff) > 2 + limit else [])
+    return report
+
+
+def _delta(key, before, after):
+    if before is None:
+        return '{} {}'.format(key, after)
+    if key == 'seconds':
+        return 'run time {} -> {} ({:+.0f} s)'.format(format_duration(before), format_duration(after), after - before)
+    return '{} {} -> {} ({:+d})'.format(key, before, after, after - before)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the protocol scripts against their golden command traces.')
+    parser.add_argument('cases', nargs='*', help='only check cases whose name contains one of these')
+    parser.add_argument('--update', action='store_true', help='write the current traces as the new goldens')
+    parser.add_argument('--lines', type=int, default=40, help='diff lines shown per case (default 40)')
+    args = parser.parse_args(argv)
+    selected = [case for case in CASES if not args.cases or any(s in case for s in args.cases)]
+    failed = False
+    for case in selected:
+        if args.update:
+            write_golden(case, *trace(*CASES[case]))
+            print('{}: updated'.format(case))
+            continue
+        report = compare(case, limit=args.lines)
+        failed = failed or bool(report)
+        print('\n'.join(report) if report else '{}: unchanged'.format(case))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Deck, labware and pipette geometry used by the offline protocol tools.
+
+The numbers below are taken from the Opentrons labware and pipette definitions
+for the items loaded by the scripts in this repository, rounded to what
+matters for estimating head travel. They are not a replacement for the real
+definitions and only cover the labware these protocols use.
+"""
+
+# | --------- deck --------- |
+# Front-left corner of every OT-2 deck slot in deck coordinates (mm).
+SLOT_ORIGINS = {
+    1: (0.0, 0.0), 2: (132.5, 0.0), 3: (265.0, 0.0),
+    4: (0.0, 90.5), 5: (132.5, 90.5), 6: (265.0, 90.5),
+    7: (0.0, 181.0), 8: (132.5, 181.0), 9: (265.0, 181.0),
+    10: (0.0, 271.5), 11: (132.5, 271.5), 12: (265.0, 271.5),
+}
+TRASH_SLOT = 12
+TRASH_LABWARE = 'opentrons_1_trash_1100ml_fixed'
+
+# Height of the labware seat above the deck for each supported module.
+MODULE_OFFSETS = {
+    'temperature module': 80.1,
+    'temperature module gen2': 80.1,
+    'tempdeck': 80.1,
+    'magnetic module': 87.0,
+    'magnetic module gen2': 87.0,
+    'magdeck': 87.0,
+}
+TEMPERATURE_MODULES = ('temperature module', 'temperature module gen2', 'tempdeck')
+MAGNETIC_MODULES = ('magnetic module', 'magnetic module gen2', 'magdeck')
+
+
+def _grid(rows, cols, x0, y0, pitch_x, pitch_y, depth, max_volume, diameter):
+    """Wells of a regular grid in column-major order (A1, B1, ... H1, A2, ...)."""
+    wells = []
+    for col in range(cols):
+        for row in range(rows):
+            name = 'ABCDEFGHIJKLMNOP'[row] + str(col + 1)
+            wells.append((name, x0 + col * pitch_x, y0 - row * pitch_y, depth, max_volume, diameter))
+    return wells
+
+
+_FALCON_15 = (117.98, 15000.0, 14.9)
+_FALCON_50 = (113.3, 50000.0, 27.8)
+
+# name -> (height, [(well, x, y, depth, max_volume, diameter), ...])
+LABWARE = {
+    TRASH_LABWARE: (82.0, [('A1', 82.84, 80.0, 0.0, 1100000.0, 100.0)]),
+    'opentrons_96_tiprack_20ul': (64.7, _grid(8, 12, 14.38, 74.38, 9.0, 9.0, 39.2, 20.0, 5.2)),
+    'opentrons_96_tiprack_300ul': (64.5, _grid(8, 12, 14.38, 74.38, 9.0, 9.0, 59.3, 300.0, 5.2)),
+    'opentrons_96_tiprack_1000ul': (97.5, _grid(8, 12, 14.38, 74.38, 9.0, 9.0, 88.0, 1000.0, 7.1)),
+    'opentrons_24_tuberack_nest_2ml_snapcap': (
+        79.5, _grid(4, 6, 18.21, 75.43, 19.89, 19.28, 39.3, 2000.0, 8.7)),
+    'opentrons_24_aluminumblock_nest_2ml_snapcap': (
+        51.7, _grid(4, 6, 20.75, 68.63, 17.25, 17.25, 38.7, 2000.0, 8.7)),
+    'opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical': (124.4, [
+        ('A1', 13.88, 76.38) + _FALCON_15, ('B1', 13.88, 51.38) + _FALCON_15,
+        ('C1', 13.88, 26.38) + _FALCON_15, ('A2', 38.88, 76.38) + _FALCON_15,
+        ('B2', 38.88, 51.38) + _FALCON_15, ('C2', 38.88, 26.38) + _FALCON_15,
+        ('A3', 71.38, 71.38) + _FALCON_50, ('B3', 71.38, 36.38) + _FALCON_50,
+        ('A4', 106.38, 71.38) + _FALCON_50, ('B4', 106.38, 36.38) + _FALCON_50,
+    ]),
+    'nest_96_wellplate_2ml_deep': (41.0, _grid(8, 12, 14.4, 74.4, 9.0, 9.0, 38.0, 2000.0, 8.2)),
+    'nest_12_reservoir_15ml': (31.4, _grid(1, 12, 14.38, 42.78, 9.0, 0.0, 26.85, 15000.0, 8.2)),
+    'nest_1_reservoir_195ml': (31.4, [('A1', 63.88, 42.74, 25.0, 195000.0, 106.8)]),
+    'nest_96_wellplate_200ul_flat': (15.7, _grid(8, 12, 14.38, 74.24, 9.0, 9.0, 10.9, 360.0, 6.96)),
+}
+
+# | --------- pipettes --------- |
+# name -> (channels, min_volume, max_volume, aspirate, dispense, blow_out) flow rates in uL/s
+PIPETTES = {
+    'p20_single_gen2': (1, 1.0, 20.0, 7.56, 7.56, 7.56),
+    'p50_single': (1, 5.0, 50.0, 25.0, 50.0, 50.0),
+    'p300_single': (1, 30.0, 300.0, 150.0, 300.0, 300.0),
+    'p300_single_gen2': (1, 20.0, 300.0, 92.86, 92.86, 92.86),
+    'p300_multi': (8, 30.0, 300.0, 150.0, 300.0, 300.0),
+    'p300_multi_gen2': (8, 20.0, 300.0, 94.0, 94.0, 94.0),
+    'p1000_single': (1, 100.0, 1000.0, 500.0, 1000.0, 1000.0),
+    'p1000_single_gen2': (1, 100.0, 1000.0, 274.7, 274.7, 274.7),
+}
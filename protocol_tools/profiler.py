@@ -0,0 +1,150 @@
+"""Per-stage profile of a protocol script's command stream.
+
+Runs a script headless and splits its commands at the ``Stage: <name>``
+comments the scripts and ``protocol_lib`` emit (sample loading, DTT reduction,
+each wash, elution, ...). For every stage it counts aspirates, dispenses,
+mixes, tip pick-ups and moves and reports the simulated robot time next to
+the wall-clock time the host spent running the stage's protocol code.
+A stage that runs more than once (the three 80% ethanol washes, every batch of
+the peptide cleanup) is numbered.
+
+    python -m protocol_tools.profiler digestion_scripts/SP3_digestion.py \\
+        --set number_of_samples=4 --set "sample_concentrations=[2.0, 2.0, 2.0, 2.0]" --format csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import time
+
+from .estimator import CATEGORIES, format_duration, parse_settings
+from .recorder import RecordingContext, simulate
+
+STAGE_PREFIX = 'Stage: '
+SETUP_STAGE = 'setup'  # commands before the first stage comment
+COUNTED = {'aspirate': 'aspirates', 'dispense': 'dispenses', 'mix': 'mixes', 'pick_up_tip': 'tip_pickups',
+           'move_to': 'moves'}
+CATEGORY_NAMES = sorted(set(CATEGORIES.values())) + ['other']
+FIELDS = (['stage', 'start_seconds', 'sim_seconds', 'wall_seconds']
+          + sorted(COUNTED.values()) + ['fresh_tips', 'mix_seconds', 'aspirate_seconds']
+          + ['{}_seconds'.format(category) for category in CATEGORY_NAMES])
+
+
+class ProfilingContext(RecordingContext):
+    """``RecordingContext`` that also stamps every command with the host's wall clock."""
+
+    def __init__(self, model=None, strict=False):
+        super().__init__(model=model, strict=strict)
+        self.wall = []  # time.perf_counter() as each command was recorded
+
+    def _record(self, name, **fields):
+        self.wall.append(time.perf_counter())
+        return super()._record(name, **fields)
+
+
+def _new_stage(name, command, stamp):
+    stage = dict.fromkeys(FIELDS, 0)
+    stage.update(stage=name, start_seconds=command['start'], wall_start=stamp)
+    return stage
+
+
+def stages(commands, wall, wall_end):
+    """Totals of every stage of a command stream, given the wall-clock stamp of each command and of the run's end."""
+    result = []
+    for command, stamp in zip(commands, wall):
+        msg = command.get('msg') or ''
+        if command['name'] == 'comment' and msg.startswith(STAGE_PREFIX):
+            result.append(_new_stage(msg[len(STAGE_PREFIX):], command, stamp))
+        elif not result:
+            result.append(_new_stage(SETUP_STAGE, command, stamp))
+        stage = result[-1]
+        name = command['name']
+        stage['sim_seconds'] += command['duration']
+        stage['{}_seconds'.format(CATEGORIES.get(name, 'other'))] += command['duration']
+        if name in COUNTED:
+            stage[COUNTED[name]] += 1
+        if name == 'pick_up_tip' and not command.get('reused'):
+            stage['fresh_tips'] += 1
+        if name in ('mix', 'aspirate'):
+            stage['{}_seconds'.format(name)] += command['duration']
+
+    for stage, following in zip(result, result[1:] + [None]):
+        stage['wall_seconds'] = (following['wall_start'] if following else wall_end) - stage.pop('wall_start')
+        for field in FIELDS[1:]:
+            if isinstance(stage[field], float):
+                stage[field] = round(stage[field], 3 if field == 'wall_seconds' else 1)
+
+    # number the stages that run more than once
+    runs = {}
+    for stage in result:
+        runs[stage['stage']] = runs.get(stage['stage'], 0) + 1
+    seen = {}
+    for stage in result:
+        if runs[stage['stage']] > 1:
+            seen[stage['stage']] = seen.get(stage['stage'], 0) + 1
+            stage['stage'] = '{} {}'.format(stage['stage'], seen[stage['stage']])
+    return result
+
+
+def profile(script, settings=None, model=None):
+    """Profile of ``script`` run headless with ``settings`` overriding its CUSTOMIZE section."""
+    protocol = ProfilingContext(model=model)
+    wall_start = time.perf_counter()
+    simulate(script, settings, protocol=protocol)
+    wall_end = time.perf_counter()
+    return {
+        'script': script,
+        'settings': dict(settings or {}),
+        'total_seconds': round(protocol.elapsed, 1),
+        'wall_seconds': round(wall_end - wall_start, 3),
+        'problems': list(protocol.problems),
+        'stages': stages(protocol.commands, protocol.wall, wall_end),
+    }
+
+
+def format_csv(report):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(report['stages'])
+    return out.getvalue()
+
+
+def format_table(report):
+    lines = ['    robot  host ms  asp  disp  mix  tips  moves  stage']
+    for stage in report['stages']:
+        lines.append('{}  {:>7.1f}  {:>3}  {:>4}  {:>3}  {:>4}  {:>5}  {}'.format(
+            format_duration(stage['sim_seconds']), stage['wall_seconds'] * 1000, stage['aspirates'], stage['dispenses'],
+            stage['mixes'], stage['fresh_tips'], stage['moves'], stage['stage'][:50]))
+    lines.append('Total {} robot, {:.0f} ms host'.format(format_duration(report['total_seconds']),
+                                                        report['wall_seconds'] * 1000))
+    for problem in report['problems']:
+        lines.append('WARNING: {}'.format(problem))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('script', help='protocol script to profile')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a CUSTOMIZE setting of the script')
+    parser.add_argument('--format', choices=('table', 'json', 'csv'), default='table', help='report format')
+    parser.add_argument('--output', metavar='PATH', help='write the report to PATH instead of printing it')
+    args = parser.parse_args(argv)
+    report = profile(args.script, parse_settings(args.set))
+    if args.format == 'json':
+        text = json.dumps(report, indent=2) + '\n'
+    elif args.format == 'csv':
+        text = format_csv(report)
+    else:
+        text = format_table(report) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text, end='')
+
+
+if __name__ == '__main__':
+    main()
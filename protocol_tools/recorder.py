@@ -0,0 +1,715 @@
+"""A recording stand-in for the Opentrons ``ProtocolContext``.
+
+``RecordingContext`` implements the subset of the Opentrons API v2 used by the
+scripts in this repository. Instead of driving hardware it appends every
+command to ``commands`` and timestamps it with a ``SimClock``, so a protocol's
+``run(protocol)`` can be executed headless and its run time estimated.
+
+``transfer`` and ``distribute`` are expanded the way the Opentrons
+``TransferPlan`` does it (volume splitting, tip policy, mixing, air gaps,
+touch tips and blow-outs) so the recorded stream matches what the robot does.
+"""
+
+import ast
+import importlib.util
+import math
+import sys
+import types
+
+from . import labware as defs
+from .timing import SimClock
+
+
+class OutOfTipsError(RuntimeError):
+    pass
+
+
+# | --------- labware --------- |
+class Location:
+    """A point relative to a well, as returned by ``Well.top()``/``Well.bottom()``."""
+
+    def __init__(self, well, reference, offset=0.0):
+        self.well = well
+        self.reference = reference
+        self.offset = offset
+
+    @property
+    def labware(self):
+        return self.well.parent
+
+    def point(self):
+        base = self.well.top_z if self.reference == 'top' else self.well.bottom_z
+        return self.well.x, self.well.y, base + self.offset
+
+    def __eq__(self, other):
+        return (isinstance(other, Location) and self.well is other.well
+                and self.reference == other.reference and self.offset == other.offset)
+
+    def __hash__(self):
+        return hash((id(self.well), self.reference, self.offset))
+
+    def __str__(self):
+        return '{} {}{:+g}'.format(self.well, self.reference, self.offset)
+
+
+class Well:
+    def __init__(self, parent, name, x, y, depth, max_volume, diameter):
+        self.parent = parent
+        self.well_name = name
+        self.depth = depth
+        self.max_volume = max_volume
+        self.diameter = diameter
+        self.x = parent.origin[0] + x
+        self.y = parent.origin[1] + y
+        self.top_z = parent.origin[2] + parent.height
+        self.bottom_z = self.top_z - depth
+
+    @property
+    def display_name(self):
+        return str(self)
+
+    @property
+    def has_tip(self):
+        return self not in self.parent.used_tips
+
+    @has_tip.setter
+    def has_tip(self, value):
+        if value:
+            self.parent.used_tips.discard(self)
+        else:
+            self.parent.used_tips.add(self)
+
+    def top(self, z=0.0):
+        return Location(self, 'top', z)
+
+    def bottom(self, z=0.0):
+        return Location(self, 'bottom', z)
+
+    def center(self):
+        return Location(self, 'bottom', self.depth / 2)
+
+    def __str__(self):
+        return '{}:{}'.format(self.parent.slot, self.well_name)
+
+    __repr__ = __str__
+
+
+class Labware:
+    def __init__(self, load_name, slot, label=None, module=None):
+        if load_name not in defs.LABWARE:
+            raise KeyError('No geometry for labware {!r}; add it to protocol_tools/labware.py.'.format(load_name))
+        self.load_name = load_name
+        self.name = label or load_name
+        self.slot = slot
+        self.parent = module
+        height, wells = defs.LABWARE[load_name]
+        x, y = defs.SLOT_ORIGINS[slot]
+        z = defs.MODULE_OFFSETS[module.load_name] if module is not None else 0.0
+        self.origin = (x, y, z)
+        self.height = height
+        self._wells = [Well(self, *w) for w in wells]
+        self._by_name = {w.well_name: w for w in self._wells}
+        self._index = {w: i for i, w in enumerate(self._wells)}
+        # the wells never change, so their rows and columns are worked out once
+        self._rows, self._columns = {}, {}
+        for w in self._wells:
+            self._rows.setdefault(w.well_name[0], []).append(w)
+            self._columns.setdefault(w.well_name[1:], []).append(w)
+        self._column_of = {w: column for column in self._columns.values() for w in column}
+        self.used_tips = set()
+
+    @property
+    def highest_z(self):
+        return self.origin[2] + self.height
+
+    @property
+    def is_tiprack(self):
+        return 'tiprack' in self.load_name
+
+    def wells(self, *names):
+        if not names:
+            return list(self._wells)
+        return [self.well(n) for n in names]
+
+    def well(self, idx):
+        if isinstance(idx, int):
+            return self._wells[idx]
+        return self._by_name[idx]
+
+    def wells_by_name(self):
+        return dict(self._by_name)
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def next_tip(self, num_tips=1, starting_tip=None):
+        """First tip of the first block of ``num_tips`` unused tips in a column, or ``None``."""
+        first = 0 if starting_tip is None else self._index[starting_tip]
+        for column in self._columns.values():
+            for i in range(len(column) - num_tips + 1):
+                tips = column[i:i + num_tips]
+                if self._index[tips[0]] < first:
+                    continue
+                if not any(t in self.used_tips for t in tips):
+                    return tips[0]
+        return None
+
+    def rows(self):
+        return [list(row) for row in self._rows.values()]
+
+    def columns(self):
+        return [list(column) for column in self._columns.values()]
+
+    def rows_by_name(self):
+        return {name: list(row) for name, row in self._rows.items()}
+
+    def columns_by_name(self):
+        return {name: list(column) for name, column in self._columns.items()}
+
+    def __str__(self):
+        return '{} in slot {}'.format(self.name, self.slot)
+
+
+# | --------- modules --------- |
+class _Module:
+    def __init__(self, ctx, load_name, slot):
+        self._ctx = ctx
+        self.load_name = load_name
+        self.slot = slot
+        self.labware = None
+
+    def load_labware(self, name, label=None):
+        self.labware = Labware(name, self.slot, label, module=self)
+        self._ctx._place(self.slot, self.labware)
+        return self.labware
+
+    def _record(self, name, **fields):
+        return self._ctx._record(name, module=self.slot, **fields)
+
+
+class TemperatureModule(_Module):
+    def __init__(self, ctx, load_name, slot):
+        super().__init__(ctx, load_name, slot)
+        self.target = None
+
+    @property
+    def temperature(self):
+        return self._ctx.clock.temperature(self.slot)
+
+    @property
+    def status(self):
+        if self.target is None:
+            return 'idle'
+        if abs(self.temperature - self.target) < 0.5:
+            return 'holding at target'
+        return 'heating' if self.temperature < self.target else 'cooling'
+
+    def set_temperature(self, celsius):
+        self.target = celsius
+        self._record('set_temperature', celsius=celsius)
+
+    def start_set_temperature(self, celsius):
+        self.target = celsius
+        self._record('start_set_temperature', celsius=celsius)
+
+    def await_temperature(self, celsius):
+        self._record('await_temperature', celsius=celsius)
+
+    def deactivate(self):
+        self.target = None
+        self._record('deactivate')
+
+
+class MagneticModule(_Module):
+    def __init__(self, ctx, load_name, slot):
+        super().__init__(ctx, load_name, slot)
+        self.status = 'disengaged'
+
+    def engage(self, height=None, offset=None, height_from_base=None):
+        self.status = 'engaged'
+        self._record('engage')
+
+    def disengage(self):
+        self.status = 'disengaged'
+        self._record('disengage')
+
+
+# | --------- pipettes --------- |
+class FlowRates:
+    def __init__(self, aspirate, dispense, blow_out):
+        self.aspirate = aspirate
+        self.dispense = dispense
+        self.blow_out = blow_out
+
+
+class _Clearance:
+    aspirate = 1.0
+    dispense = 1.0
+
+
+TRANSFER_OPTIONS = {
+    'new_tip', 'trash', 'touch_tip', 'blow_out', 'blowout_location', 'mix_before', 'mix_after',
+    'air_gap', 'disposal_volume', 'carryover', 'gradient',
+}
+
+
+class Pipette:
+    def __init__(self, ctx, name, mount, tip_racks):
+        if name not in defs.PIPETTES:
+            raise KeyError('No specification for pipette {!r}; add it to protocol_tools/labware.py.'.format(name))
+        channels, min_volume, max_volume, aspirate, dispense, blow_out = defs.PIPETTES[name]
+        self._ctx = ctx
+        self.name = name
+        self.mount = mount
+        self.channels = channels
+        self.min_volume = min_volume
+        self.max_volume = max_volume
+        self.flow_rate = FlowRates(aspirate, dispense, blow_out)
+        self.well_bottom_clearance = _Clearance()
+        self.tip_racks = list(tip_racks or [])
+        self.starting_tip = None
+        self.current_volume = 0.0
+        self.has_tip = False
+        self._starting_tip_applied = False
+        self._last_tips = []
+
+    def __str__(self):
+        return '{} on {} mount'.format(self.name, self.mount)
+
+    # | --------- bookkeeping --------- |
+    def _record(self, name, **fields):
+        return self._ctx._record(name, instrument=self.name, mount=self.mount, **fields)
+
+    def _location(self, location, clearance):
+        if location is None:
+            return self._ctx._location
+        if isinstance(location, Well):
+            return location.bottom(clearance)
+        return location
+
+    def _move(self, location):
+        if location is None or location == self._ctx._location:
+            return
+        start = self._ctx._location
+        x1, y1, z1 = location.point()
+        if start is None:
+            x0, y0, z0 = x1, y1, self._ctx._deck_highest_z() + 20.0
+            safe_z = z0
+        else:
+            x0, y0, z0 = start.point()
+            if start.labware is location.labware:
+                safe_z = location.labware.highest_z + 5.0
+            else:
+                safe_z = self._ctx._deck_highest_z() + 20.0
+        self._record('move_to', location=str(location), path=(x0, y0, z0, x1, y1, z1, safe_z))
+        self._ctx._location = location
+
+    # | --------- tips --------- |
+    def _next_tip(self):
+        if self.starting_tip is not None and not self._starting_tip_applied:
+            # tips before the starting tip are treated as already used
+            self._starting_tip_applied = True
+            for rack in self.tip_racks:
+                if self.starting_tip in rack._index:
+                    rack.used_tips.update(rack._wells[:rack._index[self.starting_tip]])
+                    break
+                rack.used_tips.update(rack._wells)
+        for rack in self.tip_racks:
+            if len(rack.used_tips) == len(rack._wells):
+                continue
+            if self.channels == 1:
+                # the wells are in column order already
+                tip = next((t for t in rack._wells if t not in rack.used_tips), None)
+                if tip is not None:
+                    return [tip]
+                continue
+            for column in rack._columns.values():
+                for i in range(len(column) - self.channels + 1):
+                    tips = column[i:i + self.channels]
+                    if not any(t in rack.used_tips for t in tips):
+                        return tips
+        return None
+
+    def reset_tipracks(self):
+        for rack in self.tip_racks:
+            rack.used_tips.clear()
+
+    def pick_up_tip(self, location=None):
+        if self.has_tip:
+            self._ctx._problem('{} picked up a tip while already holding one'.format(self.name))
+        if isinstance(location, Well):
+            column = location.parent._column_of[location]
+            tips = column[column.index(location):column.index(location) + self.channels]
+        else:
+            tips = self._next_tip()
+            if tips is None:
+                if self._ctx.strict:
+                    raise OutOfTipsError('{} has run out of tips'.format(self.name))
+                self._ctx._problem('{} ran out of tips; assuming the racks are refilled'.format(self.name))
+                self._ctx.pause('Replace the empty tip racks for {}.'.format(self.name))
+                self.reset_tipracks()
+                tips = self._next_tip()
+        reused = any(t in tips[0].parent.used_tips for t in tips)
+        tips[0].parent.used_tips.update(tips)
+        self._move(tips[0].top())
+        self._record('pick_up_tip', tip=str(tips[0]), reused=reused)
+        self.has_tip = True
+        self._last_tips = tips
+        return self
+
+    def drop_tip(self, location=None, home_after=True):
+        self._move(self._location(location, 0.0) if location is not None else self._ctx.fixed_trash['A1'].top())
+        self._record('drop_tip')
+        self.has_tip = False
+        self.current_volume = 0.0
+        return self
+
+    def return_tip(self, home_after=True):
+        # as on the robot, the tips go back into their slots and are handed out again like fresh ones
+        if self._last_tips:
+            self._move(self._last_tips[0].top())
+            self._last_tips[0].parent.used_tips.difference_update(self._last_tips)
+        self._record('return_tip')
+        self.has_tip = False
+        self.current_volume = 0.0
+        return self
+
+    # | --------- liquid handling --------- |
+    def aspirate(self, volume=None, location=None, rate=1.0):
+        if not self.has_tip:
+            self._ctx._problem('{} aspirated without a tip'.format(self.name))
+        volume = self.max_volume - self.current_volume if volume is None else volume
+        if self.current_volume + volume > self.max_volume + 1e-6:
+            self._ctx._problem('{} aspirated {:.1f} uL beyond its {:g} uL capacity'.format(
+                self.name, self.current_volume + volume - self.max_volume, self.max_volume))
+        self._move(self._location(location, self.well_bottom_clearance.aspirate))
+        self._record('aspirate', volume=volume, flow_rate=self.flow_rate.aspirate * rate,
+                     location=str(self._ctx._location))
+        self.current_volume += volume
+        return self
+
+    def dispense(self, volume=None, location=None, rate=1.0):
+        volume = self.current_volume if volume is None else volume
+        self._move(self._location(location, self.well_bottom_clearance.dispense))
+        self._record('dispense', volume=volume, flow_rate=self.flow_rate.dispense * rate,
+                     location=str(self._ctx._location))
+        self.current_volume = max(0.0, self.current_volume - volume)
+        return self
+
+    def mix(self, repetitions=1, volume=None, location=None, rate=1.0):
+        if not self.has_tip:
+            self._ctx._problem('{} mixed without a tip'.format(self.name))
+        volume = volume or self.max_volume
+        if volume > self.max_volume + 1e-6:
+            self._ctx._problem('{} mixed {:g} uL, more than its {:g} uL capacity'.format(
+                self.name, volume, self.max_volume))
+        self._move(self._location(location, self.well_bottom_clearance.aspirate))
+        self._record('mix', repetitions=repetitions, volume=volume,
+                     aspirate_rate=self.flow_rate.aspirate * rate,
+                     dispense_rate=self.flow_rate.dispense * rate,
+                     location=str(self._ctx._location))
+        return self
+
+    def air_gap(self, volume=None, height=None):
+        volume = volume or 0.0
+        current = self._ctx._location
+        if current is not None:
+            self._move(current.well.top(5.0 if height is None else height))
+        self._record('air_gap', volume=volume, flow_rate=self.flow_rate.aspirate)
+        self.current_volume += volume
+        return self
+
+    def blow_out(self, location=None):
+        if isinstance(location, Well):
+            location = location.top()
+        self._move(location)
+        self._record('blow_out', location=str(self._ctx._location))
+        self.current_volume = 0.0
+        return self
+
+    def touch_tip(self, location=None, radius=1.0, v_offset=-1.0, speed=60.0):
+        well = location if isinstance(location, Well) else (
+            location.well if location is not None else self._ctx._location.well)
+        self._move(well.top(v_offset))
+        self._record('touch_tip', location=str(well))
+        return self
+
+    def move_to(self, location, force_direct=False, minimum_z_height=None, speed=None):
+        self._move(location)
+        return self
+
+    def home(self):
+        self._ctx._location = None
+        self._record('home')
+        return self
+
+    # | --------- complex liquid handling --------- |
+    def transfer(self, volume, source, dest, **kwargs):
+        return self._transfer('transfer', volume, source, dest, kwargs)
+
+    def distribute(self, volume, source, dest, **kwargs):
+        kwargs.setdefault('disposal_volume', self.min_volume)
+        return self._transfer('distribute', volume, source, dest, kwargs)
+
+    def consolidate(self, volume, source, dest, **kwargs):
+        return self._transfer('consolidate', volume, source, dest, kwargs)
+
+    def _blowout_target(self, where, src, dst):
+        if where == 'source well':
+            return src.well.top() if isinstance(src, Location) else src.top()
+        if where == 'destination well':
+            return dst if isinstance(dst, Location) else dst.top()
+        return self._ctx.fixed_trash['A1'].top()
+
+    def _transfer(self, mode, volume, source, dest, kwargs):
+        for key in kwargs:
+            if key not in TRANSFER_OPTIONS:
+                self._ctx._problem('{}() ignored unknown keyword argument {!r}'.format(mode, key))
+        new_tip = kwargs.get('new_tip', 'once')
+        air_gap = kwargs.get('air_gap') or 0.0
+        touch = kwargs.get('touch_tip', False)
+        blow = kwargs.get('blow_out', False)
+        where = kwargs.get('blowout_location', 'trash')
+        mix_before = kwargs.get('mix_before') or (0, 0)
+        mix_after = kwargs.get('mix_after') or (0, 0)
+        drop = self.drop_tip if kwargs.get('trash', True) else self.return_tip
+
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        dests = dest if isinstance(dest, (list, tuple)) else [dest]
+        if len(sources) == 1 and len(dests) > 1:
+            sources = sources * len(dests)
+        elif len(dests) == 1 and len(sources) > 1:
+            dests = dests * len(sources)
+        if len(sources) != len(dests):
+            # the API refuses the whole transfer, even when the protocol is only simulated
+            raise RuntimeError('{}(): source and destination lists must be the same length ({} sources for {} '
+                               'destinations)'.format(mode, len(sources), len(dests)))
+        volumes = list(volume) if isinstance(volume, (list, tuple)) else [volume] * len(dests)
+        pairs = [(v, s, d) for v, s, d in zip(volumes, sources, dests) if v > 0]
+        if not pairs:
+            return self
+
+        if new_tip == 'once' and not self.has_tip:
+            self.pick_up_tip()
+
+        if mode == 'distribute':
+            disposal = kwargs.get('disposal_volume', 0.0)
+            capacity = self.max_volume - disposal - air_gap
+            split = []
+            for v, s, d in pairs:
+                steps = int(math.ceil(v / capacity - 1e-9))
+                split.extend([(v / steps, s, d)] * steps)
+            batches, batch = [], []
+            for v, s, d in split:
+                if batch and (sum(b[0] for b in batch) + v > capacity + 1e-6 or s is not batch[0][1]):
+                    batches.append(batch)
+                    batch = []
+                batch.append((v, s, d))
+            batches.append(batch)
+            for batch in batches:
+                if new_tip == 'always':
+                    self.pick_up_tip()
+                src = batch[0][1]
+                if mix_before[0]:
+                    self.mix(mix_before[0], mix_before[1], src)
+                self.aspirate(sum(b[0] for b in batch) + disposal, src)
+                if touch:
+                    self.touch_tip(src)
+                for v, _, d in batch:
+                    self.dispense(v, d)
+                    if touch:
+                        self.touch_tip(d)
+                if disposal or blow:
+                    self.blow_out(self._blowout_target(where, src, batch[-1][2]))
+                if new_tip == 'always':
+                    drop()
+        else:
+            limit = self.max_volume - air_gap
+            for v, s, d in pairs:
+                steps = int(math.ceil(v / limit - 1e-9))
+                for _ in range(steps):
+                    if new_tip == 'always':
+                        self.pick_up_tip()
+                    if mix_before[0]:
+                        self.mix(mix_before[0], mix_before[1], s)
+                    self.aspirate(v / steps, s)
+                    if touch:
+                        self.touch_tip(s)
+                    if air_gap:
+                        self.air_gap(air_gap)
+                    self.dispense(v / steps + air_gap, d)
+                    if mix_after[0]:
+                        self.mix(mix_after[0], mix_after[1], d)
+                    if blow:
+                        self.blow_out(self._blowout_target(where, s, d))
+                    if touch:
+                        self.touch_tip(d)
+                    if new_tip == 'always':
+                        drop()
+
+        if new_tip == 'once':
+            drop()
+        return self
+
+
+# | --------- protocol --------- |
+class RecordingContext:
+    """Headless ``ProtocolContext`` that records and times every command.
+
+    With ``strict=False`` (the default) conditions that would stop the robot,
+    such as running out of tips, are recorded in ``problems`` and the run
+    carries on so the rest of the protocol can still be estimated.
+    Set ``simulating`` to False to run a script as the robot would, for
+    example so that it reads and writes its checkpoint file.
+    """
+
+    def __init__(self, model=None, strict=False):
+        self.clock = SimClock(model)
+        self.strict = strict
+        self.simulating = True
+        self.commands = []
+        self.problems = []
+        self._labware = {}
+        self._instruments = {}
+        self._location = None
+        self._highest_z = 0.0
+        self.fixed_trash = Labware(defs.TRASH_LABWARE, defs.TRASH_SLOT)
+        self._place(defs.TRASH_SLOT, self.fixed_trash)
+
+    # | --------- recording --------- |
+    def _record(self, name, **fields):
+        command = dict(name=name, **fields)
+        self.commands.append(command)
+        self.clock.advance(command)
+        return command
+
+    def _problem(self, message):
+        if self.strict:
+            raise RuntimeError(message)
+        self.problems.append(message)
+        self._record('problem', msg=message)
+
+    def _deck_highest_z(self):
+        return self._highest_z
+
+    def _place(self, slot, lw):
+        self._labware[slot] = lw
+        self._highest_z = max(self._highest_z, lw.highest_z)
+
+    # | --------- loading --------- |
+    def load_labware(self, load_name, location, label=None):
+        if location in self._labware:
+            raise ValueError('Slot {} is already occupied'.format(location))
+        lw = Labware(load_name, location, label)
+        self._place(location, lw)
+        return lw
+
+    def load_module(self, module_name, location):
+        key = module_name.lower()
+        if key in defs.TEMPERATURE_MODULES:
+            return TemperatureModule(self, key, location)
+        if key in defs.MAGNETIC_MODULES:
+            return MagneticModule(self, key, location)
+        raise KeyError('Unsupported module {!r}'.format(module_name))
+
+    def load_instrument(self, instrument_name, mount, tip_racks=None, replace=False):
+        if mount in self._instruments and not replace:
+            raise ValueError('Mount {} is already in use'.format(mount))
+        pipette = Pipette(self, instrument_name, mount, tip_racks)
+        self._instruments[mount] = pipette
+        return pipette
+
+    @property
+    def loaded_labwares(self):
+        return dict(self._labware)
+
+    @property
+    def loaded_instruments(self):
+        return dict(self._instruments)
+
+    # | --------- protocol flow --------- |
+    def is_simulating(self):
+        return self.simulating
+
+    def comment(self, msg):
+        self._record('comment', msg=msg)
+
+    def pause(self, msg=None):
+        self._record('pause', msg=msg)
+
+    def delay(self, seconds=0, minutes=0, msg=None):
+        self._record('delay', seconds=seconds + 60 * minutes, msg=msg)
+
+    def home(self):
+        self._location = None
+        self._record('home')
+
+    @property
+    def elapsed(self):
+        return self.clock.now
+
+
+# | --------- loading scripts --------- |
+def _apply_overrides(tree, overrides, path):
+    """Replace the values assigned to CUSTOMIZE variables inside ``run()``."""
+    run = next((n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == 'run'), None)
+    if run is None:
+        raise ValueError('{} does not define run(protocol)'.format(path))
+    remaining = set(overrides)
+    for node in run.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+        elif isinstance(node, ast.AnnAssign):
+            target = node.target
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id in remaining:
+            node.value = ast.parse(repr(overrides[target.id]), mode='eval').body
+            remaining.discard(target.id)
+    if remaining:
+        raise KeyError('{} has no setting named {}'.format(path, ', '.join(sorted(remaining))))
+    return ast.fix_missing_locations(tree)
+
+
+def load_protocol(path, overrides=None):
+    """Load a protocol script as a module, optionally overriding its settings.
+
+    The Opentrons package is only needed for the ``protocol_api`` type
+    annotation on ``run``; when it is not installed a placeholder module
+    is provided while the script is executed.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    if overrides:
+        tree = _apply_overrides(tree, overrides, path)
+    module = types.ModuleType('protocol')
+    module.__file__ = path
+    placeholders = {}
+    if importlib.util.find_spec('opentrons') is None:
+        api = types.ModuleType('opentrons.protocol_api')
+        api.ProtocolContext = RecordingContext
+        package = types.ModuleType('opentrons')
+        package.protocol_api = api
+        placeholders = {'opentrons': package, 'opentrons.protocol_api': api}
+    saved = {name: sys.modules.get(name) for name in placeholders}
+    sys.modules.update(placeholders)
+    try:
+        exec(compile(tree, path, 'exec'), module.__dict__)
+    finally:
+        for name, previous in saved.items():
+            if previous is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = previous
+    return module
+
+
+def simulate(path, overrides=None, model=None, strict=False, protocol=None):
+    """Run a protocol script against a ``RecordingContext`` and return the context.
+
+    ``protocol`` runs the script against an existing context (e.g. a subclass) instead of a new one.
+    """
+    if protocol is None:
+        protocol = RecordingContext(model=model, strict=strict)
+    load_protocol(path, overrides).run(protocol)
+    return protocol
@@ -0,0 +1,157 @@
+"""Parameter sweep: runs a protocol script headless over every combination of settings.
+
+Each ``--vary`` names one or more settings and a list of values, and every
+combination of them runs against a ``RecordingContext``, without the Opentrons
+stack. The sweep reports each run's estimated time, tips, pauses and commands,
+its recorder problems, and the error the script raised for settings it refuses.
+It exits with status 1 if any run failed or had problems, so a CI job can run
+it as a check.
+
+    python -m protocol_tools.sweep digestion_scripts/SP3_digestion.py \\
+        --vary "number_of_samples,sample_concentrations=[(1, [2.0]), (2, [2.0, 3.0]), (3, [2.0, 3.0, 4.0])]" \\
+        --vary "replicates=[1, 2, 3]" --jobs 4
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+
+from .estimator import format_duration, parse_settings
+from .recorder import RecordingContext, simulate
+
+FIELDS = ('settings', 'total_seconds', 'tips', 'pauses', 'commands', 'host_ms', 'problems', 'error')
+
+
+def parse_axes(specs):
+    """``['a=[1, 2]', 'b,c=[(1, 2), (3, 4)]']`` -> ``[(('a',), [(1,), (2,)]), (('b', 'c'), [(1, 2), (3, 4)])]``."""
+    axes = []
+    for spec in specs or []:
+        names, _, values = spec.partition('=')
+        names = tuple(name.strip() for name in names.split(','))
+        values = _values(values)
+        if not isinstance(values, (list, tuple)) or not values:
+            raise ValueError('--vary {} needs a non-empty list of values'.format(spec))
+        values = [value if len(names) > 1 else (value,) for value in values]
+        if any(not isinstance(value, tuple) or len(value) != len(names) for value in values):
+            raise ValueError('--vary {} needs a tuple of {} values per entry'.format(spec, len(names)))
+        axes.append((names, values))
+    return axes
+
+
+def _values(text):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        raise ValueError('--vary values have to be a Python literal list, e.g. [1, 2, 3], not {}'.format(text))
+
+
+def combinations(base, axes):
+    """The settings of every run: ``base`` with one value of every axis."""
+    for point in itertools.product(*[values for _, values in axes]):
+        settings = dict(base)
+        for (names, _), values in zip(axes, point):
+            settings.update(zip(names, values))
+        yield settings
+
+
+def run_case(script, settings, strict=False):
+    """One run of the sweep. A script that refuses its settings gives the message of the error it raised."""
+    varied = dict(settings)
+    start = time.perf_counter()
+    try:
+        protocol = simulate(script, settings, protocol=RecordingContext(strict=strict))
+    except Exception as error:  # the scripts raise plain Exceptions for invalid settings
+        return dict({field: None for field in FIELDS}, settings=varied, problems=[],
+                    host_ms=round((time.perf_counter() - start) * 1000, 1),
+                    error='{}: {}'.format(type(error).__name__, error))
+    commands = protocol.commands
+    return {
+        'settings': varied,
+        'total_seconds': round(protocol.elapsed, 1),
+        'tips': sum(1 for c in commands if c['name'] == 'pick_up_tip' and not c.get('reused')),
+        'pauses': sum(1 for c in commands if c['name'] == 'pause'),
+        'commands': len(commands),
+        'host_ms': round((time.perf_counter() - start) * 1000, 1),
+        'problems': list(protocol.problems),
+        'error': None,
+    }
+
+
+def sweep(script, base=None, axes=(), strict=False, jobs=1):
+    """Results of ``run_case`` for every combination, in order; ``jobs`` > 1 spreads them over processes."""
+    cases = list(combinations(base or {}, axes))
+    if jobs <= 1:
+        return [run_case(script, settings, strict) for settings in cases]
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(run_case, [script] * len(cases), cases, [strict] * len(cases)))
+
+
+def failed(result):
+    return bool(result['error'] or result['problems'])
+
+
+def format_table(results, axes):
+    names = [name for names, _ in axes for name in names]
+    lines = ['     robot  tips  pauses  cmds  host ms  {}'.format('  '.join(names))]
+    for result in results:
+        values = '  '.join('{!r:.30}'.format(result['settings'].get(name)) for name in names)
+        if result['error']:
+            lines.append('{:>10}  {:>4}  {:>6}  {:>4}  {:>7.1f}  {}'.format('-', '-', '-', '-', result['host_ms'], values))
+            lines.append('    ERROR: {}'.format(result['error'].splitlines()[0]))
+            continue
+        lines.append('{:>10}  {:>4}  {:>6}  {:>4}  {:>7.1f}  {}'.format(
+            format_duration(result['total_seconds']), result['tips'], result['pauses'], result['commands'],
+            result['host_ms'], values))
+        for problem in result['problems']:
+            lines.append('    WARNING: {}'.format(problem))
+    lines.append('{} runs, {} failed, {:.0f} ms host'.format(
+        len(results), sum(1 for result in results if failed(result)), sum(result['host_ms'] for result in results)))
+    return '\n'.join(lines)
+
+
+def format_csv(results):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for result in results:
+        writer.writerow(dict(result, settings=json.dumps(result['settings']), problems='; '.join(result['problems'])))
+    return out.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('script', help='protocol script to sweep')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a CUSTOMIZE setting of the script for every run')
+    parser.add_argument('--vary', action='append', metavar='NAME[,NAME]=VALUES',
+                        help='run every value of a setting; several names take a tuple of values per entry')
+    parser.add_argument('--strict', action='store_true',
+                        help='raise where the robot would stop, e.g. when the tips run out, instead of carrying on')
+    parser.add_argument('--jobs', type=int, default=1, help='processes to run the combinations in')
+    parser.add_argument('--format', choices=('table', 'json', 'csv'), default='table', help='report format')
+    parser.add_argument('--output', metavar='PATH', help='write the report to PATH instead of printing it')
+    args = parser.parse_args(argv)
+    axes = parse_axes(args.vary)
+    results = sweep(args.script, parse_settings(args.set), axes, args.strict, args.jobs)
+    if args.format == 'json':
+        text = json.dumps(results, indent=2) + '\n'
+    elif args.format == 'csv':
+        text = format_csv(results)
+    else:
+        text = format_table(results, axes) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text, end='')
+    return 1 if any(failed(result) for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Wall-clock model for OT-2 commands.
+
+``SimClock`` walks a command stream and assigns a ``start`` and ``duration``
+(seconds) to each command. It keeps the state that durations depend on:
+where the head is and what every temperature module is ramping towards.
+The constants on ``TimingModel`` are deliberately simple averages measured
+against an OT-2 with GEN1 pipettes; change them on an instance to explore
+other hardware.
+"""
+
+import math
+
+AMBIENT_TEMPERATURE = 25.0
+
+
+class TimingModel:
+    xy_speed = 400.0  # mm/s, default gantry speed
+    z_speed = 125.0  # mm/s
+    move_overhead = 0.2  # s, acceleration and command latency per move
+    plunger_overhead = 0.15  # s, per aspirate/dispense stroke
+    pick_up_tip = 3.0  # s, press and retract, excluding the move to the rack
+    drop_tip = 1.5  # s, eject, excluding the move to the trash
+    touch_tip = 1.5  # s, four-sided touch
+    blow_out = 0.8  # s, plunger to blow-out position and back
+    magnet = 3.0  # s, engage or disengage
+    home = 10.0  # s
+    heating_rate = 3.5 / 60  # degC/s
+    cooling_rate = 3.0 / 60  # degC/s
+    operator_wait = 0.0  # s charged for every protocol.pause
+
+    def ramp_rate(self, start, target):
+        return self.heating_rate if target > start else self.cooling_rate
+
+
+class _Ramp:
+    def __init__(self, start_time, start_temp, target):
+        self.start_time = start_time
+        self.start_temp = start_temp
+        self.target = target
+
+    def temperature_at(self, now, model):
+        rate = model.ramp_rate(self.start_temp, self.target)
+        travelled = rate * max(0.0, now - self.start_time)
+        if abs(self.target - self.start_temp) <= travelled:
+            return self.target
+        return self.start_temp + math.copysign(travelled, self.target - self.start_temp)
+
+    def done_at(self, model):
+        rate = model.ramp_rate(self.start_temp, self.target)
+        return self.start_time + abs(self.target - self.start_temp) / rate
+
+
+class SimClock:
+    """Assigns start times and durations to commands as they are issued."""
+
+    def __init__(self, model=None):
+        self.model = model or TimingModel()
+        self.now = 0.0
+        self._ramps = {}
+
+    # | --------- temperature modules --------- |
+    def temperature(self, module):
+        ramp = self._ramps.get(module)
+        if ramp is None:
+            return AMBIENT_TEMPERATURE
+        return ramp.temperature_at(self.now, self.model)
+
+    def _start_ramp(self, module, target):
+        self._ramps[module] = _Ramp(self.now, self.temperature(module), target)
+
+    def _ramp_remaining(self, module):
+        ramp = self._ramps.get(module)
+        if ramp is None:
+            return 0.0
+        return max(0.0, ramp.done_at(self.model) - self.now)
+
+    # | --------- commands --------- |
+    def duration(self, command):
+        """Seconds the robot is busy with ``command``; may update module state."""
+        m = self.model
+        name = command['name']
+        if name == 'move_to':
+            x0, y0, z0, x1, y1, z1, safe_z = command['path']
+            xy = math.hypot(x1 - x0, y1 - y0)
+            z = max(0.0, safe_z - z0) + max(0.0, safe_z - z1)
+            return m.move_overhead + xy / m.xy_speed + z / m.z_speed
+        if name in ('aspirate', 'dispense', 'air_gap'):
+            return m.plunger_overhead + command['volume'] / command['flow_rate']
+        if name == 'mix':
+            stroke = command['volume'] / command['aspirate_rate'] + command['volume'] / command['dispense_rate']
+            return command['repetitions'] * (stroke + 2 * m.plunger_overhead)
+        if name == 'blow_out':
+            return m.blow_out
+        if name == 'touch_tip':
+            return m.touch_tip
+        if name == 'pick_up_tip':
+            return m.pick_up_tip
+        if name in ('drop_tip', 'return_tip'):
+            return m.drop_tip
+        if name == 'delay':
+            return command['seconds']
+        if name == 'pause':
+            return m.operator_wait
+        if name in ('engage', 'disengage'):
+            return m.magnet
+        if name == 'home':
+            return m.home
+        if name == 'set_temperature':
+            self._start_ramp(command['module'], command['celsius'])
+            return self._ramp_remaining(command['module'])
+        if name == 'start_set_temperature':
+            self._start_ramp(command['module'], command['celsius'])
+            return 0.0
+        if name == 'await_temperature':
+            return self._ramp_remaining(command['module'])
+        if name == 'deactivate':
+            self._start_ramp(command['module'], AMBIENT_TEMPERATURE)
+            return 0.0
+        return 0.0
+
+    def advance(self, command):
+        command['start'] = self.now
+        command['duration'] = self.duration(command)
+        self.now += command['duration']
+        return command
+
+
+def retime(commands, model=None):
+    """Re-estimate a recorded command stream, e.g. with a different ``TimingModel``."""
+    clock = SimClock(model)
+    for command in commands:
+        clock.advance(command)
+    return clock.now
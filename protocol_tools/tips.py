@@ -0,0 +1,115 @@
+"""Predicted tip use of a protocol script with and without its tip policy.
+
+Runs the script headless twice, with ``reuse_tips`` off and on, and prints the
+fresh tips each phase takes and the run time saved by reusing tips. With
+``--budget`` it runs the script once and prints the fresh tips every stage
+takes per pipette, and where the run stops for fresh tip racks.
+
+    python -m protocol_tools.tips digestion_scripts/SP3_digestion.py \\
+        --set number_of_samples=4 --set "sample_concentrations=[2.0, 2.0, 2.0, 2.0]"
+"""
+
+import argparse
+import json
+
+from .estimator import format_duration, parse_settings, summarize
+from .profiler import SETUP_STAGE, STAGE_PREFIX
+from .recorder import simulate
+
+SETTING = 'reuse_tips'
+REFILL_PREFIX = 'Replace the empty'  # pauses for fresh tip racks, from the scripts or the recorder
+
+
+def compare(script, settings=None):
+    """Summaries of ``script`` with the tip policy off and on, or ``None`` for "on" if it has no policy."""
+    settings = dict(settings or {})
+    if not _has_policy(script):
+        return summarize(simulate(script, settings)), None
+    return (summarize(simulate(script, dict(settings, **{SETTING: False}))),
+            summarize(simulate(script, dict(settings, **{SETTING: True}))))
+
+
+def _has_policy(script):
+    with open(script) as f:
+        return '{} ='.format(SETTING) in f.read()
+
+
+def _steps(summary):
+    """Tips per phase, with the tip-rack refill pauses folded into the phase they interrupt."""
+    steps = []
+    for phase in summary['phases']:
+        if steps and phase['label'].startswith(REFILL_PREFIX):
+            steps[-1] = (steps[-1][0], steps[-1][1] + phase['tips'])
+        else:
+            steps.append((phase['label'], phase['tips']))
+    return steps
+
+
+def budget(script, settings=None):
+    """Fresh tips per pipette of every stage of ``script`` (``[(stage, {pipette: tips})]``) and the tip-rack
+    refill pauses (``[(stage, msg)]``)."""
+    stages = []
+    refills = []
+    for command in simulate(script, dict(settings or {})).commands:
+        msg = command.get('msg') or ''
+        if command['name'] == 'comment' and msg.startswith(STAGE_PREFIX):
+            stages.append((msg[len(STAGE_PREFIX):], {}))
+        elif not stages:
+            stages.append((SETUP_STAGE, {}))
+        tips = stages[-1][1]
+        if command['name'] == 'pick_up_tip' and not command.get('reused'):
+            tips[command['instrument']] = tips.get(command['instrument'], 0) + 1
+        elif command['name'] == 'pause' and REFILL_PREFIX in msg:
+            refills.append((stages[-1][0], msg[msg.index(REFILL_PREFIX):]))
+    return stages, refills
+
+
+def format_budget(stages, refills):
+    pipettes = sorted({pipette for _, tips in stages for pipette in tips})
+    lines = ['  '.join('{:>11}'.format(pipette) for pipette in pipettes) + '  stage']
+    for stage, tips in stages:
+        lines.append('  '.join('{:>11}'.format(tips.get(pipette, '')) for pipette in pipettes) + '  ' + stage[:60])
+    lines.append('  '.join('{:>11}'.format(sum(tips.get(pipette, 0) for _, tips in stages)) for pipette in pipettes)
+                 + '  total')
+    for stage, msg in refills:
+        lines.append('{}: {}'.format(stage, msg))
+    return '\n'.join(lines)
+
+
+def format_comparison(fresh, reused):
+    if reused is None:
+        return 'No {} setting; {} tips, {}'.format(SETTING, fresh['tips'], format_duration(fresh['total_seconds']))
+    lines = ['     fresh  reused  phase']
+    for i, ((label, before), (_, after)) in enumerate(zip(_steps(fresh), _steps(reused))):
+        lines.append('{:>2}  {:>5}  {:>6}  {}'.format(i, before, after, label[:60]))
+    saved = fresh['total_seconds'] - reused['total_seconds']
+    lines.append('Tips {} -> {} ({} saved), run time {} -> {} ({} saved)'.format(
+        fresh['tips'], reused['tips'], fresh['tips'] - reused['tips'], format_duration(fresh['total_seconds']),
+        format_duration(reused['total_seconds']), format_duration(saved)))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('script', help='protocol script to compare')
+    parser.add_argument('--set', action='append', metavar='NAME=VALUE',
+                        help='override a CUSTOMIZE setting of the script')
+    parser.add_argument('--json', action='store_true', help='print both summaries as JSON')
+    parser.add_argument('--budget', action='store_true', help='print the tips of every stage per pipette instead')
+    args = parser.parse_args(argv)
+    if args.budget:
+        stages, refills = budget(args.script, parse_settings(args.set))
+        if args.json:
+            print(json.dumps({'stages': stages, 'refills': refills}, indent=2))
+        else:
+            print(format_budget(stages, refills))
+        return
+    fresh, reused = compare(args.script, parse_settings(args.set))
+    if args.json:
+        print(json.dumps({'fresh': fresh, 'reused': reused}, indent=2))
+    else:
+        print(format_comparison(fresh, reused))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from protocol_tools import bca
+from protocol_tools.recorder import RecordingContext, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BCA = os.path.join(ROOT, 'misc_scripts', 'BCA_protocol.py')
+SP3 = os.path.join(ROOT, 'digestion_scripts', 'SP3_digestion.py')
+
+
+def response(concentration):
+    """A562 of a BCA well: a blank of 0.1 and a curve that flattens towards the top standard."""
+    return 0.1 + 2.8 / (1 + (1900 / concentration) ** 1.1) if concentration > 0 else 0.1
+
+
+def measured_plate(tmp_path, samples, settings=None):
+    """Plate map of a BCA run with ``samples`` (ug/mL) and the export of a reader that measured it."""
+    plate_map = str(tmp_path / 'plate_map.csv')
+    protocol = RecordingContext(strict=True)
+    protocol.simulating = False
+    simulate(BCA, dict(settings or {}, num_samples=len(samples), plate_map_file=plate_map), protocol=protocol)
+    rows = bca.read_plate_map(plate_map)
+    names = {'sample {}'.format(i + 1): concentration for i, concentration in enumerate(samples)}
+    wells = {row['well']: response(row['concentration'] if row['kind'] == 'standard' else names[row['name']])
+             for row in rows}
+    export = str(tmp_path / 'export.txt')
+    with open(export, 'w') as f:
+        f.write('Plate 1\nAbsorbance 562 nm\n\n\t' + '\t'.join(str(column) for column in range(1, 13)) + '\n')
+        for row in 'ABCDEFGH':
+            f.write(row + '\t' + '\t'.join('{:.4f}'.format(wells[row + str(column)]) if row + str(column) in wells
+                                           else '' for column in range(1, 13)) + '\n')
+        f.write('\nEnd of plate\n')
+    return export, plate_map
+
+
+def test_grid_and_list_exports_read_the_same(tmp_path):
+    export, _ = measured_plate(tmp_path, [800])
+    grid = bca.read_absorbance(export)
+    listed = tmp_path / 'list.csv'
+    # readers that list the wells often pad the column, as in A01
+    listed.write_text('Well,A562\n' + ''.join('{}{:02d},{}\n'.format(well[0], int(well[1:]), value)
+                                              for well, value in grid.items()))
+    assert len(grid) == 30 and grid['D4'] == pytest.approx(response(800), abs=1e-4)
+    assert bca.read_absorbance(str(listed)) == grid
+
+
+def test_one_replicate_far_off_the_others_is_set_aside():
+    assert bca.flag_outliers([0.50, 0.51, 0.80]) == [2]
+    assert bca.flag_outliers([0.50, 0.51, 0.52]) == []
+    assert bca.flag_outliers([0.50, 0.80]) == []
+    # near the blank a small absolute spread is not an outlier
+    assert bca.flag_outliers([0.010, 0.012, 0.025]) == []
+
+
+@pytest.mark.parametrize('model, params', [
+    ('linear', [0.05, 0.001]),
+    ('quadratic', [0.02, 0.0012, -2e-7]),
+    ('4pl', [0.0, 1.2, 1500.0, 3.0]),
+])
+def test_curves_recover_their_parameters_and_invert(model, params):
+    concentrations = [2000, 1500, 1000, 750, 500, 250, 125, 25, 0] * 3
+    truth = bca.Curve(model, params, [1, 2], [0.0, 1.0])
+    curve = bca.fit_curve(concentrations, [truth.absorbance(x) for x in concentrations], model)
+    assert curve.params == pytest.approx(params, rel=1e-3, abs=1e-6)
+    assert curve.r_squared == pytest.approx(1.0)
+    assert curve.concentration(curve.absorbance(600)) == pytest.approx(600)
+
+
+def test_samples_are_quantified_and_written_as_a_manifest(tmp_path):
+    export, plate_map = measured_plate(tmp_path, [300, 1200, 1800, 3500])
+    results = bca.analyze([(bca.read_absorbance(export), bca.read_plate_map(plate_map))], '4pl', dilution=10)
+    concentrations = [sample['concentration'] for sample in results[0]['samples']]
+    assert concentrations[:3] == pytest.approx([3.0, 12.0, 18.0], rel=0.01)
+    # past the top standard there is no concentration to trust
+    assert concentrations[3] is None and 'above the top standard' in results[0]['samples'][3]['note']
+
+    rows = bca.manifest_rows(results, replicates=2, names=['liver', 'heart', 'brain', 'lung'])
+    assert rows[0] == {'sample': 'liver', 'concentration': '3.00', 'replicates': 2}
+    manifest = str(tmp_path / 'samples.csv')
+    bca.write_manifest(manifest, rows[:3])
+    protocol = simulate(SP3, {'sample_manifest': manifest})
+    assert any(c['name'] == 'pause' and 'liver in A1, heart in B1, brain in C1' in c['msg']
+               for c in protocol.commands)
+
+
+def test_a_sample_off_the_curve_stops_the_digestion(tmp_path):
+    export, plate_map = measured_plate(tmp_path, [1200, 3500])
+    main_args = ['--plate', export, plate_map, '--dilution', '10', '--output', str(tmp_path / 'samples.csv')]
+    bca.main(main_args)
+    with pytest.raises(Exception, match="Manifest line 3: concentration '' is not a valid number"):
+        simulate(SP3, {'sample_manifest': str(tmp_path / 'samples.csv')})
+
+
+def test_an_outlying_standard_does_not_bend_the_curve(tmp_path):
+    export, plate_map = measured_plate(tmp_path, [1000])
+    absorbance = bca.read_absorbance(export)
+    absorbance['B1'] *= 1.5
+    results = bca.analyze([(absorbance, bca.read_plate_map(plate_map))], '4pl', dilution=10)
+    assert results[0]['outliers'] == [('standard 1', 'B1', pytest.approx(1.5 * response(2000), abs=1e-3))]
+    assert results[0]['samples'][0]['concentration'] == pytest.approx(10.0, rel=0.01)
+
+
+@pytest.mark.parametrize('volume', [200, 100, 135])
+def test_working_reagent_fills_the_tip_on_every_trip(volume):
+    protocol = simulate(BCA, {'num_samples': 5, 'volume_WR': volume})
+    commands = [c for c in protocol.commands if c.get('instrument') == 'p300_single']
+    dispensed = {}
+    for c in commands:
+        if c['name'] == 'dispense':
+            dispensed[c['location']] = dispensed.get(c['location'], 0) + c['volume']
+    # 27 standards and 15 samples
+    assert len(dispensed) == 42 and all(abs(ul - volume) < 0.01 for ul in dispensed.values())
+    assert sum(c['name'] == 'aspirate' for c in commands) == -(-42 * volume // 300)
+    assert sum(c['name'] == 'pick_up_tip' for c in commands) == 1
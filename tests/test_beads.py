@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from protocol_tools.recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLEANUP = os.path.join(ROOT, 'digestion_scripts', 'SP3_peptide_cleanup.py')
+
+
+def elution(protocol):
+    """Commands of the eluate transfers of the first batch."""
+    commands = protocol.commands
+    start = next(i for i, c in enumerate(commands) if c['name'] == 'comment' and c['msg'].endswith('eluate transfer'))
+    end = next(i for i, c in enumerate(commands) if i > start and c['name'] == 'disengage')
+    return commands[start:end]
+
+
+def test_single_hop_elution_moves_each_eluate_once_from_above_the_pellet():
+    settings = {'number_of_samples': 3, 'replicates': 2, 'elution_bottom_mm': 1.5, 'elution_settle_min': 5}
+    two_hops = simulate(CLEANUP, settings)
+    one_hop = simulate(CLEANUP, dict(settings, single_hop_elution=True))
+    commands = elution(one_hop)
+    aspirates = [c for c in commands if c['name'] == 'aspirate']
+    assert not one_hop.problems
+    assert sum(c['name'] == 'pick_up_tip' for c in commands) == 6
+    assert sum(c['name'] == 'pick_up_tip' for c in elution(two_hops)) == 12
+    assert {c['flow_rate'] for c in aspirates} == {25}
+    assert all(c['location'].startswith('7:') and c['location'].endswith('bottom+1.5') for c in aspirates)
+    # straight into the eluate tubes after the sample tubes
+    assert [c['location'] for c in commands if c['name'] == 'dispense'] == [
+        '4:{} bottom+1'.format(well) for well in ('D1', 'A2', 'B2', 'C2', 'D2', 'A3')]
+    assert any(c['name'] == 'delay' and c['seconds'] == 300 for c in one_hop.commands)
+    assert one_hop.elapsed < two_hops.elapsed
+
+
+def test_the_8_channel_only_takes_columns_that_line_up():
+    settings = {'number_of_samples': 4, 'replicates': 2, 'use_p300_multi': True, 'volume_of_beads': 30.0,
+                'single_hop_elution': True}
+    plate = elution(simulate(CLEANUP, dict(settings, elution_plate=True)))
+    tubes = elution(simulate(CLEANUP, settings))
+    assert [c['instrument'] for c in plate if c['name'] == 'pick_up_tip'] == ['p300_multi']
+    assert [c['instrument'] for c in tubes if c['name'] == 'pick_up_tip'] == ['p300_single'] * 8
+
+
+def test_single_hop_batches_use_the_whole_mag_plate():
+    settings = {'number_of_samples': 5, 'replicates': 10, 'elution_plate': True}
+    assert sum(c['name'] == 'pause' and c['msg'].startswith('Batch 2') for c in simulate(CLEANUP, settings).commands)
+    assert not any(c['name'] == 'pause' and c['msg'].startswith('Batch 2')
+                   for c in simulate(CLEANUP, dict(settings, single_hop_elution=True)).commands)
+    with pytest.raises(Exception, match='elution_bottom_mm has to be 0.5 to 5 mm'):
+        simulate(CLEANUP, dict(settings, single_hop_elution=True, elution_bottom_mm=0.2))
+
+
+def test_parked_tips_are_never_handed_out_as_fresh_ones():
+    settings = {'number_of_samples': 6, 'replicates': 2, 'reuse_tips': True}
+    picked = [(c['instrument'], c['tip'], c['reused']) for c in simulate(CLEANUP, settings).commands
+              if c['name'] == 'pick_up_tip']
+    fresh = [(instrument, tip) for instrument, tip, reused in picked if not reused]
+    assert any(reused for _, _, reused in picked)
+    assert len(fresh) == len(set(fresh))
+
+
+def test_a_sample_whose_supernatants_overfill_the_waste_tubes_is_rejected_up_front():
+    settings = {'number_of_samples': 2, 'replicates': 50, 'elution_plate': True, 'single_hop_elution': True}
+    assert not simulate(CLEANUP, settings).problems
+    with pytest.raises(Exception, match='a sample can have at most 49 replicates') as error:
+        simulate(CLEANUP, dict(settings, volume_of_ACN=1500.0))
+    assert 'waste tubes' in str(error.value)
@@ -0,0 +1,15 @@
+import pytest
+
+from protocol_tools import benchmark
+
+BASELINE = benchmark.load_baseline()
+CASES = list(benchmark.cases())
+
+
+@pytest.mark.parametrize('name,script,settings', CASES, ids=[case[0] for case in CASES])
+def test_not_slower_than_baseline(name, script, settings):
+    if name not in BASELINE:
+        pytest.skip('no baseline recorded; run python -m protocol_tools.benchmark --update')
+    result = benchmark.measure(script, settings)
+    slower = benchmark.regression(result, BASELINE[name])
+    assert slower is None, '{} is {:.0f} s slower than the tolerated baseline'.format(name, slower)
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from protocol_tools.bundle import bundle, main
+from protocol_tools.recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ('NoSP3_digestion', 'SP3_digestion', 'SP3_peptide_cleanup')
+
+
+@pytest.mark.parametrize('script', SCRIPTS)
+def test_bundled_script_runs_like_the_source(script, tmp_path):
+    source = os.path.join(ROOT, 'digestion_scripts', script + '.py')
+    bundled = tmp_path / (script + '.py')
+    bundled.write_text(bundle(source))
+    assert 'protocol_lib' not in bundled.read_text().replace('# | --------- protocol_lib/', '')
+    assert simulate(str(bundled)).commands == simulate(source).commands
+
+
+def test_a_script_that_fails_to_bundle_leaves_no_build(tmp_path):
+    broken = tmp_path / 'broken.py'
+    broken.write_text('def run(protocol):\n    protocol.comment(\n')
+    out = tmp_path / 'build'
+    with pytest.raises(SyntaxError):
+        main([str(broken), '--out', str(out)])
+    with pytest.raises(FileNotFoundError):
+        main([str(tmp_path / 'missing.py'), '--out', str(out)])
+    assert not list(out.iterdir())
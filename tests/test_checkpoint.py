@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from protocol_lib.checkpoint import Checkpoint
+from protocol_tools.recorder import RecordingContext, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIQUID = ('aspirate', 'dispense', 'mix')
+
+
+class Abort(Exception):
+    pass
+
+
+def run(script, settings):
+    protocol = RecordingContext(strict=True)
+    protocol.simulating = False
+    try:
+        simulate(os.path.join(ROOT, 'digestion_scripts', script), settings, protocol=protocol)
+    except Abort:
+        pass
+    return protocol
+
+
+def liquid(protocol):
+    return sorted((c['name'], c.get('location'), round(c.get('volume') or 0, 3)) for c in protocol.commands if c['name'] in LIQUID)
+
+
+def fresh_tips(protocol):
+    return [c['tip'] for c in protocol.commands if c['name'] == 'pick_up_tip' and not c['reused']]
+
+
+@pytest.mark.parametrize('script, settings, steps', [
+    ('NoSP3_digestion.py', {'replicates': 3}, 5),
+    # aborted while the second batch is normalized, during the IAA incubation of the first
+    ('NoSP3_digestion.py', {'number_of_samples': 2, 'sample_concentrations': [2.0, 4.0], 'replicates': 3,
+                            'stagger_batch_size': 4}, 18),
+    ('SP3_digestion.py', {'number_of_samples': 2, 'sample_concentrations': [2.0, 4.0], 'replicates': 2}, 9),
+    ('SP3_digestion.py', {'number_of_samples': 2, 'sample_concentrations': [2.0, 4.0], 'replicates': 2,
+                          'reuse_tips': True}, 40),
+    ('SP3_peptide_cleanup.py', {'number_of_samples': 11, 'replicates': 1, 'reuse_tips': True}, 200),
+    ('SP3_peptide_cleanup.py', {'number_of_samples': 11, 'replicates': 1, 'use_p1000': True,
+                                'volume_of_beads': 30.0}, 120),
+    ('SP3_peptide_cleanup.py', {'number_of_samples': 4, 'replicates': 2, 'reagent_volumes': {'ACN': 15, 'DMSO': 5}}, 30),
+])
+def test_resumed_run_finishes_the_aborted_one(script, settings, steps, tmp_path, monkeypatch):
+    path = str(tmp_path / 'checkpoint.json')
+    settings = dict(settings, checkpoint_file=path)
+    full = run(script, settings)
+
+    complete = Checkpoint.complete
+    saved = []
+
+    def complete_then_abort(checkpoint):
+        complete(checkpoint)
+        saved.append(1)
+        if len(saved) == steps:
+            raise Abort()
+
+    monkeypatch.setattr(Checkpoint, 'complete', complete_then_abort)
+    aborted = run(script, settings)
+    monkeypatch.setattr(Checkpoint, 'complete', complete)
+    with open(path) as f:
+        assert len(json.load(f)['done']) == steps
+    resumed = run(script, dict(settings, resume=True))
+
+    # every transfer and mix happens once, and the tips the two runs take are those of one run
+    assert sorted(liquid(aborted) + liquid(resumed)) == liquid(full)
+    assert sorted(fresh_tips(aborted) + fresh_tips(resumed)) == sorted(fresh_tips(full))
+    assert not resumed.problems
+
+
+def test_nothing_is_saved_while_simulating(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    simulate(os.path.join(ROOT, 'digestion_scripts', 'NoSP3_digestion.py'), {'checkpoint_file': path, 'resume': True})
+    assert not os.path.exists(path)
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from protocol_tools.deck import optimize
+from protocol_tools.recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {name: os.path.join(ROOT, 'digestion_scripts', name + '.py')
+           for name in ('NoSP3_digestion', 'SP3_digestion', 'SP3_peptide_cleanup')}
+
+
+def test_layout_is_checked_with_the_other_inputs():
+    layout = {'mag_deck': 8, 'ethanol80': 'A1', 'tiprack_300': 1, 'tip_rack': 3}
+    with pytest.raises(Exception) as error:
+        simulate(SCRIPTS['SP3_digestion'], {'deck_layout': layout})
+    assert str(error.value).splitlines() == [
+        'deck_layout has no entry named tip_rack; it takes tiprack_50, tiprack_50_2, tiprack_300, tuberack_2mL, '
+        'tuberack_15ml_50ml, tiprack_300_2, mag_deck, reservoir, waste_reservoir, temp_mod, tiprack_left, ABC, '
+        'ethanol100, ethanol80, waste_1, waste_2.',
+        'deck_layout: mag_deck has to go in one of slots 1, 3, 4, 6, 7, 9, 10.',
+        'deck_layout: ethanol80 is a 50 mL tube and has to go in one of A3, B3, A4, B4 of the 15mL_50mL tube rack.',
+        'deck_layout: tiprack_50 and tiprack_300 are both in slot 1.',
+        'deck_layout: mag_deck and reservoir are both in slot 8.',
+        'deck_layout: ABC and ethanol80 are both in A1.',
+    ]
+
+
+@pytest.mark.parametrize('script', sorted(SCRIPTS))
+def test_proposed_layout_runs_and_travels_less(script):
+    result = optimize(SCRIPTS[script], restarts=1)
+    assert result['after']['travel_seconds'] < result['before']['travel_seconds']
+    assert result['after']['total_seconds'] < result['before']['total_seconds']
+    protocol = simulate(SCRIPTS[script], {'deck_layout': result['deck_layout']}, strict=True)
+    assert round(protocol.elapsed, 1) == result['after']['total_seconds']
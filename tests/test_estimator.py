@@ -0,0 +1,12 @@
+import pytest
+
+from protocol_tools.estimator import parse_settings
+
+
+def test_set_values_are_literals_not_code():
+    assert parse_settings(['sample_concentrations=[2.0, 2.5]', "starting_tip_p50='B1'"]) == {
+        'sample_concentrations': [2.0, 2.5], 'starting_tip_p50': 'B1'}
+    with pytest.raises(ValueError, match='Python literal'):
+        parse_settings(["number_of_samples=__import__('os').getpid()"])
+    with pytest.raises(ValueError, match='Python literal'):
+        parse_settings(['sample_concentrations=[2.0]*8'])
@@ -0,0 +1,18 @@
+import pytest
+
+from protocol_tools import golden
+
+
+@pytest.mark.parametrize('case', list(golden.CASES))
+def test_trace_matches_the_golden(case):
+    report = golden.compare(case)
+    assert not report, '\n'.join(report + ['accept a deliberate change with python -m protocol_tools.golden --update'])
+
+
+def test_a_change_reports_its_commands_tips_and_run_time(monkeypatch):
+    script, settings = golden.CASES['bca-n3']
+    monkeypatch.setitem(golden.CASES, 'bca-n3', (script, dict(settings, num_samples=4)))
+    report = golden.compare('bca-n3')
+    assert report[0].startswith('bca-n3: commands ')
+    assert 'tips 13 -> 14 (+1)' in report[0] and 'run time' in report[0]
+    assert any(line.startswith('+') and 'sample 4' in line for line in report)
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from protocol_lib.liquid import LiquidLevels
+from protocol_tools.recorder import RecordingContext, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLEANUP = os.path.join(ROOT, 'digestion_scripts', 'SP3_peptide_cleanup.py')
+
+
+def tube_rack():
+    protocol = RecordingContext()
+    rack = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', 5)
+    return protocol, rack
+
+
+def heights(protocol, tube):
+    return [c['location'] for c in protocol.commands if c['name'] == 'aspirate' and c['location'].startswith(str(tube))]
+
+
+def test_height_follows_the_cone_then_the_cylinder():
+    protocol, rack = tube_rack()
+    levels = LiquidLevels(protocol)
+    tube = rack['A3']
+    assert levels.height(tube, 0) == 0
+    assert levels.height(tube, 45000) < levels.height(tube, 50000) < tube.depth
+    cone = levels.cone_mm[tube.max_volume]
+    radius = tube.diameter / 2
+    # 10 mL above the cone rises by 10 mL over the tube's cross-section
+    cone_volume = 3.14159265 * radius ** 2 * cone / 3
+    assert levels.height(tube, cone_volume + 10000) == pytest.approx(cone + 10000 / (3.14159265 * radius ** 2))
+    assert levels.height(tube, cone_volume / 8) == pytest.approx(cone / 2)
+
+
+def test_draws_follow_the_level_down_and_untracked_tubes_stay_at_the_bottom():
+    protocol, rack = tube_rack()
+    levels = LiquidLevels(protocol, [(rack['A3'], 45, 'ACN')])
+    locations = [levels.draw(rack['A3'], 1000) for _ in range(5)]
+    offsets = [location.offset for location in locations]
+    assert offsets == sorted(offsets, reverse=True)
+    assert offsets[0] == pytest.approx(levels.height(rack['A3'], 44000) - levels.submerge_mm)
+    assert levels.draw(rack['A1'], 1000) is rack['A1']
+
+
+def test_a_tube_is_topped_up_before_it_runs_low():
+    protocol, rack = tube_rack()
+    levels = LiquidLevels(protocol, [(rack['A1'], 5, 'DMSO')])
+    for _ in range(5):
+        location = levels.draw(rack['A1'], 1000)
+        assert location.offset >= levels.bottom_mm
+    assert [c['msg'] for c in protocol.commands if c['name'] == 'pause'] == [
+        'Top up the DMSO in A1 of the 15mL_50mL tube rack located in slot 5 to 5 mL; 1.0 mL is left.']
+
+
+def test_a_tube_cannot_be_loaded_past_its_volume():
+    protocol, rack = tube_rack()
+    with pytest.raises(Exception, match='holds at most 15 mL'):
+        LiquidLevels(protocol, [(rack['A1'], 20, 'DMSO')])
+
+
+def test_scripts_aspirate_below_the_surface_and_finish_faster():
+    settings = {'number_of_samples': 6, 'replicates': 2}
+    bottom = simulate(CLEANUP, settings)
+    tracked = simulate(CLEANUP, dict(settings, reagent_volumes={'ACN': 20, 'DMSO': 10}))
+    acn = heights(tracked, bottom.loaded_labwares[5]['A3'])
+    assert set(heights(bottom, bottom.loaded_labwares[5]['A3'])) == {'5:A3 bottom+1'}
+    assert len(set(acn)) > 10
+    assert any(c['name'] == 'pause' and c['msg'].startswith('Top up the ACN') for c in tracked.commands)
+    assert not tracked.problems
+    assert tracked.elapsed < bottom.elapsed
+
+
+def test_unknown_reagents_are_reported():
+    with pytest.raises(Exception, match='reagent_volumes names ethanol80; it takes ACN and DMSO'):
+        simulate(CLEANUP, {'reagent_volumes': {'ethanol80': 45}})
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from protocol_tools.recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {name: os.path.join(ROOT, 'digestion_scripts', name + '.py')
+           for name in ('NoSP3_digestion', 'SP3_digestion', 'SP3_peptide_cleanup')}
+
+MANIFEST = 'sample,concentration,replicates,position\nliver,2.0,3,B2\nheart,4.5,2,\nbrain,1.2,4,A1\n'
+
+
+@pytest.mark.parametrize('script', ['NoSP3_digestion', 'SP3_digestion'])
+def test_manifest_sets_tubes_and_replicates(script, tmp_path):
+    path = tmp_path / 'samples.csv'
+    path.write_text(MANIFEST)
+    protocol = simulate(SCRIPTS[script], {'sample_manifest': str(path)})
+    loading = [c['msg'] for c in protocol.commands if c['name'] == 'pause' and 'sample tubes are' in c['msg']]
+    assert loading == ['Ensure the sample tubes are in the 2ml tube rack located in slot 4: '
+                       'liver in B2, heart in B1, brain in A1.']
+    assert not any('skipped' in problem for problem in protocol.problems)
+
+
+def test_cleanup_manifest_batches_by_digests():
+    manifest = 'sample\treplicates\n' + ''.join('s{}\t{}\n'.format(i, reps) for i, reps in enumerate([2, 3, 1, 4, 2, 2, 3]))
+    protocol = simulate(SCRIPTS['SP3_peptide_cleanup'], {'sample_manifest': manifest})
+    batches = [c['msg'] for c in protocol.commands if c['name'] == 'pause' and c['msg'].startswith('Batch')]
+    assert len(batches) == 1 and 'load s6 into the first 1 positions' in batches[0]
+
+
+def test_manifest_errors_are_reported_together():
+    manifest = 'sample\tconcentration\treplicates\tposition\nx\t0.5\t3\tA6\ny\tabc\t0\tB2\nz\t2\t3\tB2\n'
+    with pytest.raises(Exception) as error:
+        simulate(SCRIPTS['SP3_digestion'], {'sample_manifest': manifest})
+    assert str(error.value).splitlines() == [
+        'Manifest line 2: concentration 0.5 is outside 1.0 to 20.0.',
+        "Manifest line 3: concentration 'abc' is not a valid number.",
+        'Manifest line 3: replicates 0 is outside 1 to 24.',
+        'Manifest line 2: position A6 is not one of the sample positions A1 to D5 of the 2ml tube rack.',
+        'Manifest line 4: position B2 is already taken by line 3.',
+    ]
@@ -0,0 +1,56 @@
+import csv
+import os
+
+import pytest
+
+from protocol_tools.recorder import RecordingContext, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BCA = os.path.join(ROOT, 'misc_scripts', 'BCA_protocol.py')
+
+
+def run(settings, simulating=True):
+    protocol = RecordingContext(strict=True)
+    protocol.simulating = simulating
+    simulate(BCA, settings, protocol=protocol)
+    return protocol
+
+
+def test_a_full_plate_is_mapped_standards_first(tmp_path):
+    path = str(tmp_path / 'plate.csv')
+    run({'num_samples': 23, 'plate_map_file': path}, simulating=False)
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 96
+    assert rows[0] == {'well': 'A1', 'kind': 'standard', 'name': 'standard 1', 'concentration': '2000'}
+    assert rows[26]['name'] == 'standard 9' and rows[26]['concentration'] == '0'
+    assert rows[27] == {'well': 'D4', 'kind': 'sample', 'name': 'sample 1', 'concentration': ''}
+    assert rows[-1]['well'] == 'H12' and rows[-1]['name'] == 'sample 23'
+
+
+def test_the_plate_map_goes_to_the_run_log_but_no_file_while_simulating(tmp_path):
+    path = str(tmp_path / 'plate.csv')
+    protocol = run({'plate_map_file': path})
+    comments = [c['msg'] for c in protocol.commands if c['name'] == 'comment' and c['msg'].startswith('Plate map')]
+    assert comments[0] == 'Plate map: standard 1 (2000 ug/mL) in A1, B1, C1.'
+    assert comments[-1] == 'Plate map: sample 3 in B5, C5, D5.'
+    assert not os.path.exists(path)
+
+
+def test_samples_past_the_first_rack_come_from_a_second_one():
+    protocol = run({'num_samples': 23})
+    sources = {c['location'].split()[0] for c in protocol.commands if c['name'] == 'aspirate'
+               and c['instrument'] == 'p50_single'}
+    assert '6:A1' in sources and '6:H1' not in sources
+    assert any(c['name'] == 'pause' and 'second 2ml tube rack' in c['msg'] for c in protocol.commands)
+
+
+def test_small_working_reagent_volumes_are_multi_dispensed():
+    protocol = run({'num_samples': 23, 'volume_WR': 100})
+    single = [c for c in protocol.commands if c['name'] == 'aspirate' and c['instrument'] == 'p300_single']
+    assert len(single) < 96 / 2 + 1
+
+
+def test_more_wells_than_the_plate_holds_are_refused():
+    with pytest.raises(Exception, match='the plate has 96'):
+        run({'num_samples': 24})
@@ -0,0 +1,32 @@
+import csv
+import io
+import os
+
+from protocol_tools.estimator import summarize
+from protocol_tools.profiler import FIELDS, format_csv, profile
+from protocol_tools.recorder import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SP3 = os.path.join(ROOT, 'digestion_scripts', 'SP3_digestion.py')
+
+
+def test_stages_split_the_run_and_add_up():
+    report = profile(SP3)
+    names = [stage['stage'] for stage in report['stages']]
+    assert names[:3] == ['protein normalization', 'DTT reduction', 'IAA alkylation']
+    assert names[3:5] == ['sample loading', 'bead addition']
+    assert ['80% ethanol wash 1', '80% ethanol wash supernatant 1', '80% ethanol wash 2'] == names[7:10]
+    assert names[-1] == 'trypsin addition'
+
+    summary = summarize(simulate(SP3))
+    assert abs(sum(stage['sim_seconds'] for stage in report['stages']) - summary['total_seconds']) < 1
+    assert sum(stage['fresh_tips'] for stage in report['stages']) == summary['tips']
+    assert sum(stage['aspirates'] for stage in report['stages']) == sum(phase['trips'] for phase in summary['phases'])
+
+
+def test_csv_report_has_one_row_per_stage():
+    report = profile(os.path.join(ROOT, 'digestion_scripts', 'SP3_peptide_cleanup.py'), {'number_of_samples': 12})
+    rows = list(csv.DictReader(io.StringIO(format_csv(report))))
+    assert list(rows[0]) == FIELDS
+    assert [row['stage'] for row in rows] == [stage['stage'] for stage in report['stages']]
+    assert 'ACN binding 2' in [row['stage'] for row in rows]
@@ -0,0 +1,71 @@
+import os
+
+from protocol_lib.reagents import ReagentPlan
+from protocol_tools.recorder import RecordingContext, simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOSP3 = os.path.join(ROOT, 'digestion_scripts', 'NoSP3_digestion.py')
+SP3 = os.path.join(ROOT, 'digestion_scripts', 'SP3_digestion.py')
+CLEANUP = os.path.join(ROOT, 'digestion_scripts', 'SP3_peptide_cleanup.py')
+
+
+def pauses(protocol):
+    return [c['msg'] for c in protocol.commands if c['name'] == 'pause']
+
+
+def test_volumes_include_what_the_tube_keeps():
+    protocol = RecordingContext()
+    tubes = protocol.load_labware('opentrons_24_tuberack_nest_2ml_snapcap', 4)
+    bulk = protocol.load_labware('opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical', 5)
+    plan = ReagentPlan(protocol)
+    plan.add('DTT', tubes['A6'], 10 * 12, 'the 2ml tube rack')
+    plan.add('ABC', bulk['A3'], 9000, 'the 15mL_50mL tube rack')
+    plan.add('ABC', bulk['A3'], 1234, 'the 15mL_50mL tube rack')
+    plan.add('beads', tubes['D6'], 20 * 100, 'the 2ml tube rack')
+    assert [plan.amount(name) for name in ('DTT', 'ABC', 'beads')] == ['140 uL', '10.8 mL', '2.1 mL']
+    assert plan.describe('beads').endswith('(more than the tube holds; top it up as it runs low)')
+    assert plan.prompt('DTT', 'Load the DTT.') == 'Load the DTT. Load at least 140 uL.'
+    assert plan.prompt('ABC', 'Open cap on ABC tube.', volume=False) == 'Open cap on ABC tube.'
+
+
+def test_preloading_asks_for_every_reagent_once():
+    settings = {'number_of_samples': 2, 'sample_concentrations': [2.0, 4.0], 'replicates': 2}
+    staged = simulate(NOSP3, settings)
+    preloaded = simulate(NOSP3, dict(settings, preload_reagents=True))
+    assert len(pauses(preloaded)) == len(pauses(staged)) - 1
+    # (50 + 75) uL of ABC for each replicate and the 0.5 mL the tube keeps
+    assert pauses(preloaded)[0] == (
+        'Ensure to change starting tip position for p50 and p300. Load 750 uL ABC in A3 of the 15mL_50mL tube rack '
+        'located in slot 5; 60 uL DTT in A6 of the 2ml tube rack located in slot 4, and open the caps of the reagent '
+        'tubes. Have ready 60 uL IAA in B6 of the 2ml tube rack located in slot 4; 60 uL trypsin in C6 of the 2ml '
+        'tube rack located in slot 4; the run asks for each when it is added.')
+    assert not any('DTT' in msg for msg in pauses(preloaded)[1:])
+    # the IAA is light-sensitive and made just before use, so it is only loaded when it goes in
+    assert [msg for msg in pauses(preloaded)[1:] if 'IAA' in msg] == [
+        'Ensure IAA has been loaded into B6 of the 2ml tube rack located in slot 4 prior to resuming protocol. '
+        'Load at least 60 uL.']
+    # the trypsin is still asked for when it goes in, in the pause that has the caps opened
+    assert pauses(preloaded)[-1].startswith('Ensure trypsin has been loaded into C6')
+    assert pauses(preloaded)[-1].endswith('Open caps on sample tubes on the temperature module.')
+
+
+def test_the_8_channel_columns_draw_from_the_reservoir():
+    settings = {'number_of_samples': 4, 'sample_concentrations': [2.0] * 4, 'replicates': 3,
+                'preload_reagents': True}
+    single = pauses(simulate(SP3, settings))[0]
+    multi = pauses(simulate(SP3, dict(settings, use_p300_multi=True, volume_of_DTT=30.0, volume_of_IAA=30.0,
+                                      volume_of_beads=30.0, volume_of_trypsin=30.0)))[0]
+    # 12 wells take 3 mL of 80% ethanol each from the tube; with the 8-channel only the 4 outside the full column do
+    assert '36.5 mL 80% ethanol' in single and '12.5 mL 80% ethanol' in multi
+    assert 'beads in D6' in multi and 'Ensure 100 percent ethanol' not in ' '.join(pauses(simulate(SP3, settings)))
+
+
+def test_cleanup_batches_are_topped_up_to_the_planned_volumes():
+    protocol = simulate(CLEANUP, {'number_of_samples': 12, 'replicates': 2, 'preload_reagents': True})
+    first, *rest = pauses(protocol)
+    assert first.startswith('Load 140 uL beads in A6') and '28.1 mL ACN in A3' in first
+    # the rest only ask for tip racks and the next batch
+    batch = [msg for msg in rest if 'tip racks' not in msg]
+    assert len(batch) == 1 and batch[0].startswith('Batch 2 of 2')
+    assert 'top up beads to 140 uL, ACN to 28.1 mL, 2% DMSO to 1.5 mL' in batch[0]
+    assert not protocol.problems
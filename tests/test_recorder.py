@@ -0,0 +1,84 @@
+import pytest
+
+from protocol_tools.recorder import OutOfTipsError, RecordingContext
+
+
+def deck(strict=False):
+    protocol = RecordingContext(strict=strict)
+    tips = protocol.load_labware('opentrons_96_tiprack_300ul', 1)
+    plate = protocol.load_labware('nest_96_wellplate_2ml_deep', 2)
+    p300 = protocol.load_instrument('p300_single', 'right', tip_racks=[tips])
+    return protocol, tips, plate, p300
+
+
+def names(protocol, *skipped):
+    return [c['name'] for c in protocol.commands if c['name'] not in ('move_to',) + skipped]
+
+
+def test_transfer_splits_volumes_the_pipette_cannot_take_at_once():
+    protocol, _, plate, p300 = deck()
+    p300.transfer(400, plate['A1'], plate['A2'], air_gap=10, blow_out=True)
+    assert names(protocol) == ['pick_up_tip'] + ['aspirate', 'air_gap', 'dispense', 'blow_out'] * 2 + ['drop_tip']
+    assert [c['volume'] for c in protocol.commands if c['name'] == 'dispense'] == [210, 210]
+    assert not protocol.problems
+
+
+def test_transfer_takes_a_new_tip_for_every_well_when_asked():
+    protocol, _, plate, p300 = deck()
+    p300.transfer(50, plate['A1'], plate.wells()[1:4], new_tip='always', mix_after=(3, 40))
+    assert names(protocol).count('pick_up_tip') == names(protocol).count('drop_tip') == 3
+    assert [c['tip'] for c in protocol.commands if c['name'] == 'pick_up_tip'] == ['1:A1', '1:B1', '1:C1']
+    assert names(protocol).count('mix') == 3
+
+
+def test_distribute_fills_the_tip_and_blows_out_the_disposal_volume():
+    protocol, _, plate, p300 = deck()
+    p300.distribute(50, plate['A1'], plate.wells()[1:7])
+    # 270 uL fit next to the 30 uL disposal volume: five wells, then the sixth
+    assert [c['volume'] for c in protocol.commands if c['name'] == 'aspirate'] == [280, 80]
+    assert names(protocol).count('dispense') == 6
+    assert names(protocol).count('blow_out') == 2
+
+
+def test_source_and_destination_lists_have_to_match():
+    protocol, _, plate, p300 = deck()
+    with pytest.raises(RuntimeError, match='3 sources for 2 destinations'):
+        p300.transfer(50, plate.wells()[:3], plate.wells()[3:5])
+    assert not protocol.commands
+
+
+def test_returned_tips_are_handed_out_again():
+    protocol, tips, plate, p300 = deck()
+    p300.pick_up_tip()
+    p300.return_tip()
+    p300.pick_up_tip()
+    assert [c['tip'] for c in protocol.commands if c['name'] == 'pick_up_tip'] == ['1:A1', '1:A1']
+    p300.drop_tip()
+    p300.pick_up_tip()
+    assert protocol.commands[-1]['tip'] == '1:B1'
+    assert not tips['A1'].has_tip
+
+
+def test_running_out_of_tips():
+    protocol, tips, plate, p300 = deck()
+    for well in tips.wells():
+        well.has_tip = False
+    p300.pick_up_tip()
+    assert protocol.problems == ['p300_single ran out of tips; assuming the racks are refilled']
+    assert protocol.commands[-1]['tip'] == '1:A1'
+
+    protocol, tips, plate, p300 = deck(strict=True)
+    for well in tips.wells():
+        well.has_tip = False
+    with pytest.raises(OutOfTipsError):
+        p300.pick_up_tip()
+
+
+def test_every_command_is_timed_on_the_simulated_clock():
+    protocol, _, plate, p300 = deck()
+    p300.transfer(100, plate['A1'], plate['B1'])
+    protocol.delay(minutes=2)
+    assert protocol.commands[0]['start'] == 0.0
+    for before, after in zip(protocol.commands, protocol.commands[1:]):
+        assert after['start'] == pytest.approx(before['start'] + before['duration'])
+    assert protocol.elapsed == pytest.approx(protocol.commands[-1]['start'] + 120)
@@ -0,0 +1,126 @@
+import os
+
+import pytest
+
+from protocol_lib.schedule import MOVE_SECONDS, TIP_SECONDS, ProtocolClock, Task, run_tasks, transfer_seconds
+from protocol_tools.recorder import simulate
+
+NOSP3 = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'digestion_scripts', 'NoSP3_digestion.py')
+SP3 = os.path.join(os.path.dirname(NOSP3), 'SP3_digestion.py')
+
+
+class FakeRobot:
+    """Just the clock, delays and comments ``run_tasks`` uses."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.log = []
+
+    def work(self, name, seconds):
+        self.log.append(name)
+        self.now += seconds
+
+    def delay(self, seconds, msg=None):
+        self.log.append(('delay', seconds, msg))
+        self.now += seconds
+
+    def comment(self, msg):
+        self.log.append(msg)
+
+
+def test_work_fills_waits_and_respects_gaps():
+    robot = FakeRobot()
+    incubation = Task('incubation', wait=100, msg='Incubating.')
+    first = Task('first', lambda: robot.work('first', 30), 30)
+    second = Task('second', lambda: robot.work('second', 30), 30, after=[first], gap=20)
+    third = Task('third', lambda: robot.work('third', 10), 10)
+    after_incubation = Task('after', lambda: robot.work('after', 10), 10, after=[incubation])
+
+    path = run_tasks(robot, [incubation, first, second, third, after_incubation], report='the test')
+
+    assert robot.log[:6] == ['first', 'third', ('delay', 10, 'Incubating.'), 'second', ('delay', 20, 'Incubating.'),
+                             'after']
+    assert robot.now == 110
+    assert [task.name for task in path] == ['incubation', 'after']
+    assert robot.log[-1] == 'Critical path of the test: 1.8 of 1.8 min, incubation > after.'
+
+
+def test_tasks_waiting_on_unscheduled_work_are_an_error():
+    robot = FakeRobot()
+    try:
+        run_tasks(robot, [Task('orphan', lambda: None, after=[Task('elsewhere', lambda: None)])])
+    except ValueError as e:
+        assert 'orphan' in str(e)
+    else:
+        raise AssertionError('run_tasks ran a task whose dependency never ran')
+
+
+def test_the_schedule_follows_the_planned_durations_not_the_time_taken():
+    robot = FakeRobot()
+    clock = ProtocolClock(robot)
+    robot.work('setup', 50)
+    assert clock.now() == 0
+    incubation = Task('incubation', wait=100, msg='Incubating.')
+    work = Task('work', lambda: robot.work('work', 45), 30)
+    run_tasks(robot, [incubation, work], clock=clock)
+    # the robot, the App and the estimator all wait out the rest of the incubation by the plan
+    assert robot.log[1:] == ['work', ('delay', 70, 'Incubating.')]
+    assert clock.now() == 100
+
+
+def test_planned_transfers_count_the_strokes_and_tips():
+    class Pipette:
+        class flow_rate:
+            aspirate = 25.0
+            dispense = 50.0
+    # two trips of 50 uL, there and back each time
+    assert transfer_seconds(Pipette, 50, 2, tips=0) == pytest.approx(4 * MOVE_SECONDS + 2 * (50 / 25 + 50 / 50))
+    # to the rack, the source, the destination and the trash, with a mix of 3 x 25 uL
+    assert transfer_seconds(Pipette, 50, mix=(3, 25)) == pytest.approx(
+        TIP_SECONDS + 4 * MOVE_SECONDS + 3 + 3 * (25 / 25 + 25 / 50))
+
+
+def test_staggered_batches_are_prepared_while_the_one_before_incubates():
+    settings = {'number_of_samples': 4, 'sample_concentrations': [2.0, 3.0, 4.0, 5.0], 'replicates': 7}
+    protocol = simulate(NOSP3, dict(settings, stagger_batch_size=10))
+    commands = protocol.commands
+    assert not protocol.problems
+    assert [c['celsius'] for c in commands if c['name'] == 'start_set_temperature'] == [55, 22] * 3
+    # the second batch, in columns 4-6, gets its protein and DTT between the IAA of the first and the next heating
+    iaa = next(i for i, c in enumerate(commands) if c['name'] == 'set_temperature')
+    heating = [i for i, c in enumerate(commands) if c['name'] == 'start_set_temperature' and c['celsius'] == 55][1]
+    batch_2 = [i for i, c in enumerate(commands) if c['name'] == 'dispense' and c['location'].startswith('10:A4')]
+    # ABC, protein and DTT
+    assert min(batch_2) > iaa and len([i for i in batch_2 if i < heating]) == 3
+    assert 'Critical path of the IAA incubation: 30.0 of 30.0 min' in ' '.join(
+        c['msg'] for c in commands if c['name'] == 'comment')
+    # a third batch takes the place of the first
+    assert any(c['name'] == 'pause' and c['msg'].startswith('Move the batch 1 tubes (A1 to B3) to the shaker')
+               and 'put 8 empty tubes, caps open, in their place for batch 3' in c['msg'] for c in commands)
+
+
+def test_more_than_a_block_of_digests_needs_batches():
+    settings = {'number_of_samples': 2, 'sample_concentrations': [2.0, 2.0], 'replicates': 13}
+    with pytest.raises(Exception, match='set stagger_batch_size'):
+        simulate(NOSP3, settings)
+    with pytest.raises(Exception, match='stagger_batch_size takes 1 to 12'):
+        simulate(NOSP3, dict(settings, stagger_batch_size=13))
+
+
+def test_beads_only_go_in_during_the_iaa_incubation_when_asked():
+    settings = {'number_of_samples': 2, 'sample_concentrations': [2.0, 2.0], 'replicates': 2}
+
+    def stages(protocol):
+        return [c['msg'] for c in protocol.commands if c['name'] == 'comment' and c['msg'].startswith(('Stage', 'Critical'))]
+
+    default = simulate(SP3, settings)
+    early = simulate(SP3, dict(settings, beads_during_iaa=True))
+    assert stages(default)[2:5] == ['Stage: IAA alkylation', 'Stage: sample loading', 'Stage: bead addition']
+    # the beads are mixed into the samples, not the samples onto the beads
+    bead_mixes = [c for c in default.commands if c['name'] == 'mix' and c['instrument'] == 'p50_single'
+                  and c['location'].startswith('7:')]
+    assert len(bead_mixes) == 4
+    assert stages(early)[2:4] == ['Stage: IAA alkylation', 'Critical path of the IAA incubation: 30.0 of 30.0 min, '
+                                  'IAA incubation.']
+    assert 'Stage: bead addition' not in stages(early)
+    assert early.elapsed < default.elapsed
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from protocol_tools import sweep
+from protocol_tools.recorder import RecordingContext
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SP3 = os.path.join(ROOT, 'digestion_scripts', 'SP3_digestion.py')
+BCA = os.path.join(ROOT, 'misc_scripts', 'BCA_protocol.py')
+
+
+def test_every_combination_of_the_axes_runs():
+    axes = sweep.parse_axes(['number_of_samples,sample_concentrations=[(1, [2.0]), (2, [2.0, 2.0])]',
+                             'replicates=[1, 3]'])
+    settings = list(sweep.combinations({'reuse_tips': True}, axes))
+    assert len(settings) == 4
+    assert settings[3] == {'reuse_tips': True, 'number_of_samples': 2, 'sample_concentrations': [2.0, 2.0],
+                           'replicates': 3}
+
+
+def test_a_grouped_axis_needs_a_value_per_name():
+    with pytest.raises(ValueError, match='a tuple of 2 values'):
+        sweep.parse_axes(['number_of_samples,sample_concentrations=[1, 2]'])
+
+
+def test_values_are_literals_not_code():
+    with pytest.raises(ValueError, match='Python literal'):
+        sweep.parse_axes(['replicates=[n for n in range(3)]'])
+
+
+def test_refused_settings_are_reported_not_raised():
+    results = sweep.sweep(SP3, {'number_of_samples': 1, 'sample_concentrations': [2.0]},
+                          sweep.parse_axes(['replicates=[3, 25]']))
+    assert results[0]['error'] is None and results[0]['tips'] > 0 and not sweep.failed(results[0])
+    assert 'cannot exceed the number of slots' in results[1]['error'] and sweep.failed(results[1])
+
+
+def test_the_exit_status_fails_a_ci_run(tmp_path):
+    assert sweep.main([BCA, '--vary', 'num_samples=[1, 23]']) == 0
+    assert sweep.main([BCA, '--vary', 'num_samples=[23, 24]', '--format', 'csv',
+                       '--output', str(tmp_path / 'sweep.csv')]) == 1
+    rows = (tmp_path / 'sweep.csv').read_text().splitlines()
+    assert rows[0].startswith('settings,total_seconds') and len(rows) == 3
+    assert 'the plate has 96' in rows[2]
+
+
+def test_the_recorder_checks_mixes_like_the_robot():
+    protocol = RecordingContext()
+    rack = protocol.load_labware('opentrons_96_tiprack_300ul', 1)
+    plate = protocol.load_labware('nest_96_wellplate_2ml_deep', 2)
+    pipette = protocol.load_instrument('p300_single', 'right', tip_racks=[rack])
+    pipette.mix(3, 100, plate['A1'])
+    pipette.pick_up_tip()
+    pipette.mix(3, 500, plate['A1'])
+    assert protocol.problems == ['p300_single mixed without a tip',
+                                 'p300_single mixed 500 uL, more than its 300 uL capacity']
+
+
+def test_labware_rows_and_columns_are_copies():
+    plate = RecordingContext().load_labware('nest_96_wellplate_2ml_deep', 2)
+    plate.columns()[0].clear()
+    assert [well.well_name for well in plate.columns()[0]] == ['{}1'.format(row) for row in 'ABCDEFGH']
+    assert plate.rows_by_name()['B'][1].well_name == 'B2'
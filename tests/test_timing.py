@@ -0,0 +1,61 @@
+import pytest
+
+from protocol_tools.timing import SimClock, TimingModel, retime
+
+
+def test_liquid_handling_durations():
+    clock = SimClock()
+    # plunger overhead plus volume over flow rate
+    assert clock.duration({'name': 'aspirate', 'volume': 150, 'flow_rate': 150}) == pytest.approx(1.15)
+    # each repetition is an aspirate and a dispense stroke
+    assert clock.duration({'name': 'mix', 'repetitions': 3, 'volume': 100, 'aspirate_rate': 150,
+                           'dispense_rate': 300}) == pytest.approx(3 * (100 / 150 + 100 / 300 + 0.3))
+    assert clock.duration({'name': 'pick_up_tip'}) == 3.0
+    assert clock.duration({'name': 'return_tip'}) == clock.duration({'name': 'drop_tip'}) == 1.5
+    assert clock.duration({'name': 'delay', 'seconds': 90}) == 90
+    assert clock.duration({'name': 'comment', 'msg': 'nothing to do'}) == 0.0
+
+
+def test_moves_go_up_to_the_safe_height_and_across():
+    clock = SimClock()
+    # 50 mm across, 10 mm up to the safe height and 10 mm back down
+    move = {'name': 'move_to', 'path': (0.0, 0.0, 10.0, 30.0, 40.0, 10.0, 20.0)}
+    assert clock.duration(move) == pytest.approx(0.2 + 50 / 400 + 20 / 125)
+
+
+def test_set_temperature_waits_for_the_ramp():
+    clock = SimClock()
+    clock.advance({'name': 'set_temperature', 'module': 1, 'celsius': 4})
+    assert clock.now == pytest.approx(21 / (3.0 / 60))
+    assert clock.temperature(1) == 4
+    clock.advance({'name': 'set_temperature', 'module': 1, 'celsius': 95})
+    assert clock.now == pytest.approx(21 / (3.0 / 60) + 91 / (3.5 / 60))
+
+
+def test_a_ramp_started_early_runs_during_other_commands():
+    clock = SimClock()
+    clock.advance({'name': 'start_set_temperature', 'module': 3, 'celsius': 4})
+    assert clock.now == 0.0
+    clock.advance({'name': 'delay', 'seconds': 100})
+    assert clock.temperature(3) == pytest.approx(20.0)
+    clock.advance({'name': 'await_temperature', 'module': 3, 'celsius': 4})
+    assert clock.now == pytest.approx(420.0)
+    clock.advance({'name': 'deactivate', 'module': 3})
+    clock.advance({'name': 'delay', 'seconds': 60})
+    assert clock.temperature(3) == pytest.approx(7.5)
+
+
+def test_commands_are_timestamped_back_to_back_and_can_be_retimed():
+    commands = [{'name': 'pick_up_tip'}, {'name': 'aspirate', 'volume': 50, 'flow_rate': 25},
+                {'name': 'pause', 'msg': 'load tubes'}, {'name': 'drop_tip'}]
+    clock = SimClock()
+    for command in commands:
+        clock.advance(command)
+    assert [c['start'] for c in commands] == pytest.approx([0.0, 3.0, 5.15, 5.15])
+    assert clock.now == pytest.approx(6.65)
+
+    model = TimingModel()
+    model.pick_up_tip = 5.0
+    model.operator_wait = 60.0
+    assert retime(commands, model) == pytest.approx(6.65 + 2.0 + 60.0)
+    assert commands[-1]['start'] == pytest.approx(67.15)
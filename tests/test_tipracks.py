@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+from protocol_tools.recorder import RecordingContext, simulate
+from protocol_tools.tips import budget
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(script, settings, simulating=True):
+    protocol = RecordingContext(strict=True)
+    protocol.simulating = simulating
+    simulate(os.path.join(ROOT, 'digestion_scripts', script), settings, protocol=protocol)
+    return protocol
+
+
+def refills(protocol):
+    return [c['msg'] for c in protocol.commands if c['name'] == 'pause' and 'Replace the empty' in (c['msg'] or '')]
+
+
+def fresh_tips(protocol, instrument):
+    return [c['tip'] for c in protocol.commands
+            if c['name'] == 'pick_up_tip' and c['instrument'] == instrument and not c['reused']]
+
+
+@pytest.mark.parametrize('script, settings, refilled', [
+    ('NoSP3_digestion.py', {'number_of_samples': 8, 'sample_concentrations': [2.0] * 8, 'replicates': 3}, True),
+    ('SP3_digestion.py', {'number_of_samples': 4, 'sample_concentrations': [2.0] * 4, 'replicates': 3}, True),
+    ('SP3_digestion.py', {'number_of_samples': 4, 'sample_concentrations': [2.0] * 4, 'replicates': 3,
+                          'batch_reagent_additions': True}, True),
+    ('SP3_digestion.py', {'number_of_samples': 4, 'sample_concentrations': [2.0] * 4, 'replicates': 3,
+                          'reuse_tips': True}, False),
+    ('SP3_digestion.py', {'number_of_samples': 6, 'sample_concentrations': [2.0] * 6, 'replicates': 3,
+                          'use_p1000': True, 'volume_of_DTT': 30.0, 'volume_of_IAA': 30.0, 'volume_of_beads': 30.0,
+                          'volume_of_trypsin': 30.0}, True),
+    ('SP3_peptide_cleanup.py', {'number_of_samples': 6, 'replicates': 2}, True),
+    ('SP3_peptide_cleanup.py', {'number_of_samples': 6, 'replicates': 2, 'reuse_tips': True}, False),
+    ('SP3_peptide_cleanup.py', {'number_of_samples': 24, 'replicates': 2}, True),
+])
+def test_racks_are_refilled_before_a_stage_runs_out(script, settings, refilled):
+    # strict: a pipette that runs out of tips raises
+    protocol = run(script, settings)
+    assert bool(refills(protocol)) == refilled
+    assert not any('rest of this step' in msg for msg in refills(protocol))
+
+
+def test_a_step_larger_than_the_racks_asks_again_part_way():
+    protocol = run('SP3_peptide_cleanup.py', {'number_of_samples': 24, 'replicates': 2, 'elution_plate': True})
+    assert any('rest of this step' in msg for msg in refills(protocol))
+
+
+def test_refills_join_the_pause_the_stage_starts_with():
+    msgs = refills(run('NoSP3_digestion.py', {'number_of_samples': 8, 'sample_concentrations': [2.0] * 8, 'replicates': 3}))
+    assert len(msgs) == 1
+    assert msgs[0].startswith('Ensure trypsin has been loaded')
+
+
+def test_the_next_run_starts_where_the_last_one_left_off(tmp_path):
+    path = str(tmp_path / 'tips.json')
+    settings = {'replicates': 3, 'starting_tip_p50': 'C1', 'tip_inventory_file': path}
+    first = run('NoSP3_digestion.py', settings, simulating=False)
+    with open(path) as f:
+        used = json.load(f)
+    second = run('NoSP3_digestion.py', dict(settings, starting_tip_p50='A1'), simulating=False)
+
+    p50 = fresh_tips(first, 'p50_single')
+    assert p50[0] == '1:C1'
+    assert sorted(used['1']) == sorted(['A1', 'B1'] + [tip.split(':')[1] for tip in p50])
+    # the second run goes on from the tip after the last one the first run took, in the same rack
+    assert not set(fresh_tips(second, 'p50_single')) & set(p50)
+    with open(path) as f:
+        assert len(json.load(f)['1']) == 2 + 2 * len(p50)
+
+
+def test_nothing_is_kept_while_simulating(tmp_path):
+    path = str(tmp_path / 'tips.json')
+    run('NoSP3_digestion.py', {'replicates': 3, 'tip_inventory_file': path})
+    assert not os.path.exists(path)
+
+
+def test_budget_counts_the_tips_of_every_stage_per_pipette():
+    settings = {'number_of_samples': 4, 'sample_concentrations': [2.0] * 4, 'replicates': 3}
+    stages, refill_pauses = budget(os.path.join(ROOT, 'digestion_scripts', 'SP3_digestion.py'), settings)
+    tips = dict(stages)
+    assert tips['DTT reduction'] == {'p50_single': 12}
+    assert tips['sample loading'] == {'p300_single': 12}
+    assert [stage for stage, _ in refill_pauses] == ['ABC resuspension']
+    total = sum(count for _, counts in stages for count in counts.values())
+    assert total == len([c for c in run('SP3_digestion.py', settings).commands
+                         if c['name'] == 'pick_up_tip' and not c['reused']])